@@ -0,0 +1,520 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark suite of the Notion SDK
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file measures the block builders (10^3 to 10^6 blocks), the markdown
+    parser (large and pathological inputs), the JSON encoding of `append_blocks`
+    payloads and the directory walking of `upload_all_files()` against a local
+    fake of Dropbox. Inputs are generated with a fixed seed, so every run
+    measures the same corpora.
+
+    Every run also checks the import time of the modules used by short-lived
+    processes against a budget (with `python -X importtime`), and that they do
+    not import heavy optional dependencies such as `rich` or `dropbox`.
+
+    Results are saved as JSON (with the commit, Python version and machine) to
+    compare them between commits. `--compare` reports every benchmark slower
+    than the threshold and exits with an error code.
+
+    Example
+    -------
+    $ python benchmarks.py --output before.json
+    $ git checkout my-branch
+    $ python benchmarks.py --output after.json --compare before.json
+    $ python benchmarks.py --imports
+   """
+
+from typing import Callable, NamedTuple
+import argparse
+import atexit
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import blocks
+from helpers import add_annotations
+from markdown_parser import markdown_to_notion
+
+RESULTS_VERSION = 1
+
+# Words used to generate text
+_WORDS = (
+    "notion", "block", "page", "database", "report", "python", "sync", "upload",
+    "the", "a", "of", "and", "with", "for", "data", "value", "item", "task",
+    "résumé", "naïve", "東京", "😀", "über", "café"
+)
+
+class Benchmark(NamedTuple):
+    """
+    Registered benchmark.
+
+    - `name`    : Unique name, e.g. `builders[10000]`.
+    - `setup`   : Function returning the function to time (setup is not timed).
+    - `items`   : Number of items processed per call, to report throughput.
+    - `unit`    : Name of the items (e.g. `blocks`).
+    - `size`    : Size of the input, used to skip large benchmarks.
+    """
+    name    : str
+    setup   : Callable[[], Callable[[], None]]
+    items   : int
+    unit    : str
+    size    : int
+
+BENCHMARKS = []
+
+def benchmark(
+    name    : str,
+    items   : int   = 1,
+    unit    : str   = "calls",
+    size    : int   = 0) -> Callable:
+    """
+    Decorator registering a setup function as a benchmark.
+    """
+    def register(setup : Callable) -> Callable:
+        BENCHMARKS.append(Benchmark(name, setup, items, unit, size))
+        return setup
+    return register
+
+#*********************
+#* GENERATED CORPORA
+#*********************
+def _sentence(generator : random.Random, words : int) -> str:
+    return " ".join(generator.choice(_WORDS) for _ in range(words))
+
+def generate_blocks(
+    count   : int,
+    seed    : int   = 0) -> list:
+    """
+    Build `count` blocks with a realistic mix of block types and annotations.
+    """
+    generator   = random.Random(seed)
+    bold        = add_annotations(bold = True)
+    notion_blocks = []
+    for index in range(count):
+        kind = index % 10
+        text = _sentence(generator, 3 + index % 12)
+        if kind < 4:
+            notion_blocks.append(blocks.paragraph(text))
+        elif kind == 4:
+            notion_blocks.append(blocks.heading(1 + index % 3, text, annotations = bold))
+        elif kind == 5:
+            notion_blocks.append(blocks.to_do(index % 2 == 0, text))
+        elif kind == 6:
+            notion_blocks.append(blocks.bulleted_list_item(text))
+        elif kind == 7:
+            notion_blocks.append(blocks.code('python', f"print({text!r})"))
+        elif kind == 8:
+            notion_blocks.append(blocks.callout(icon_type = 'emoji', icon_str = "💡", content = text))
+        else:
+            block_toggle = blocks.toggle(text)
+            blocks.add_children(block_toggle, blocks.paragraph(_sentence(generator, 8)))
+            notion_blocks.append(block_toggle)
+    return notion_blocks
+
+def generate_markdown(
+    lines   : int,
+    seed    : int   = 0) -> str:
+    """
+    Generate a markdown document using every notation supported by the parser.
+    """
+    generator = random.Random(seed)
+    prefixes  = ("", "", "", "# ", "## ", "### ", "[] ", "> ", "+ ", "' ")
+    result    = []
+    for index in range(lines):
+        words = [generator.choice(_WORDS) for _ in range(4 + index % 16)]
+        for position in range(0, len(words), 5):
+            words[position] = generator.choice(("**{}**", "_{}_", "~{}~", "`{}`", "{}")).format(words[position])
+        result.append(prefixes[index % len(prefixes)] + " ".join(words))
+    return "\n".join(result)
+
+#*************
+#* BENCHMARKS
+#*************
+def _builders(count : int) -> Callable:
+    @benchmark(f"builders[{count}]", items = count, unit = "blocks", size = count)
+    def setup():
+        return lambda: generate_blocks(count)
+
+for _count in (10**3, 10**4, 10**5, 10**6):
+    _builders(_count)
+
+@benchmark("markdown[large]", items = 20000, unit = "lines", size = 20000)
+def _markdown_large():
+    text = generate_markdown(20000)
+    return lambda: markdown_to_notion(text)
+
+@benchmark("markdown[long_line]", items = 1, unit = "lines", size = 10000)
+def _markdown_long_line():
+    # A single paragraph of 200k characters with many delimiters
+    text = " ".join(f"**w{index}** , _x_ text" for index in range(10000))
+    return lambda: markdown_to_notion(text)
+
+@benchmark("markdown[delimiters]", items = 2000, unit = "lines", size = 2000)
+def _markdown_delimiters():
+    # Lines made almost only of delimiters
+    text = "\n".join("**_~`" * 20 + "#" * 3 + "[]" + ">" * 5 for _ in range(2000))
+    return lambda: markdown_to_notion(text)
+
+@benchmark("markdown[commas]", items = 5000, unit = "lines", size = 5000)
+def _markdown_commas():
+    text = "\n".join(", ".join(f"**{word}**," for word in _WORDS) for _ in range(5000))
+    return lambda: markdown_to_notion(text)
+
+def _row_columns(
+    count   : int) -> tuple:
+    """
+    Columns of `count` database rows and their property types.
+    """
+    generator   = random.Random(0)
+    first_day   = datetime.date(2024, 1, 1)
+    columns = {
+        "Name"  : [_sentence(generator, 3) for _ in range(count)],
+        "Score" : [generator.random() * 100 for _ in range(count)],
+        "Stage" : [generator.choice(("todo", "doing", "done", None)) for _ in range(count)],
+        "Due"   : [first_day + datetime.timedelta(days = index % 365) for index in range(count)],
+        "Done"  : [index % 2 == 0 for index in range(count)],
+    }
+    types = {"Name": 'title', "Score": 'number', "Stage": 'select', "Due": 'date', "Done": 'checkbox'}
+    return columns, types
+
+@benchmark("pages[per_row]", items = 100000, unit = "rows", size = 100000)
+def _pages_per_row():
+    import pages
+    columns, _ = _row_columns(100000)
+    return lambda: [
+        pages.page("database", {
+            "Name"  : pages.title(name),
+            "Score" : pages.number(score),
+            "Stage" : pages.select(stage),
+            "Due"   : pages.date(due),
+            "Done"  : pages.checkbox(done)
+        })
+        for name, score, stage, due, done in zip(*columns.values())
+    ]
+
+@benchmark("pages[columns]", items = 100000, unit = "rows", size = 100000)
+def _pages_columns():
+    import pages
+    columns, types = _row_columns(100000)
+    return lambda: list(pages.rows_from_columns("database", columns, types))
+
+@benchmark("json[append_blocks]", items = 10000, unit = "blocks", size = 10000)
+def _json_append_blocks():
+    notion_blocks = generate_blocks(10000)
+    payloads      = [blocks.append_blocks(notion_blocks[start:start + 100]) for start in range(0, len(notion_blocks), 100)]
+    return lambda: [json.dumps(payload) for payload in payloads]
+
+@benchmark("json[payload_size]", items = 10000, unit = "blocks", size = 10000)
+def _json_payload_size():
+    from payload_size import PayloadSizer
+    notion_blocks = generate_blocks(10000)
+    payloads      = [notion_blocks[start:start + 100] for start in range(0, len(notion_blocks), 100)]
+    return lambda: [PayloadSizer().children_payload_size(payload) for payload in payloads]
+
+class _FakeSharedLink():
+    def __init__(self, url : str) -> None:
+        self.url = url
+
+class FakeDropbox():
+    """
+    Local fake of the `dropbox.Dropbox` methods used by `DropboxClient`.
+    """
+    def __init__(self) -> None:
+        self.uploaded = 0
+
+    def files_create_folder_v2(self, path, autorename = False):
+        return None
+
+    def files_upload(self, f, path, mode = None, mute = False):
+        self.uploaded += len(f)
+
+    def sharing_create_shared_link_with_settings(self, path):
+        return _FakeSharedLink(f"https://www.dropbox.com/s/{abs(hash(path)):x}/{os.path.basename(path)}")
+
+@benchmark("dropbox[upload_all_files]", items = 2000, unit = "files", size = 2000)
+def _dropbox_walk():
+    from dropbox_sdk import DropboxClient, _load_dropbox
+    try:
+        _load_dropbox()
+    except ImportError as exc:
+        raise _Skip(f"the Dropbox SDK cannot be imported ({exc})")
+
+    directory = tempfile.mkdtemp(prefix = "notion-benchmark-")
+    atexit.register(shutil.rmtree, directory, ignore_errors = True)
+    generator = random.Random(0)
+    for index in range(2000):
+        folder = os.path.join(directory, f"folder_{index % 20}", f"sub_{index % 7}")
+        os.makedirs(folder, exist_ok = True)
+        extension = ('.json', '.txt', '.png', '.log', '.md')[index % 5]
+        with open(os.path.join(folder, f"file_{index}{extension}"), 'w') as file:
+            file.write(_sentence(generator, 50))
+
+    client      = object.__new__(DropboxClient)
+    client.dbx  = FakeDropbox()
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.upload_all_files(dropbox_dir = '', local_dir = directory, folder_dir = 'benchmark')
+    return run
+
+class _Skip(Exception):
+    """
+    Raised by a setup function when the benchmark cannot run.
+    """
+
+#**************
+#* IMPORT TIME
+#**************
+# Modules used by short-lived processes (e.g. serverless handlers) and their
+# cumulative import time budget in milliseconds
+IMPORT_BUDGETS = {
+    'helpers'           : 30,
+    'blocks'            : 60,
+    'markdown_parser'   : 80,
+    'dropbox_sdk'       : 60,
+}
+
+# Heavy optional dependencies that must only be imported when used
+LAZY_IMPORTS = ('rich', 'dropbox', 'ctypes', 'notion_client', 'httpx', 'requests')
+
+def import_time(
+    module  : str,
+    runs    : int   = 5) -> tuple:
+    """
+    Measure the import of a module in new interpreters with `python -X importtime`.
+
+    Returns
+    -------
+    Tuple with the list of cumulative import times (in seconds) of every run
+    and the set of all the modules imported.
+    """
+    directory   = os.path.dirname(os.path.abspath(__file__))
+    times       = []
+    imported    = set()
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+            capture_output = True, text = True, cwd = directory
+        )
+        if process.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{process.stderr.strip().splitlines()[-1]}")
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            imported.add(name)
+            if name == module and cumulative.strip().isdigit():
+                times.append(int(cumulative) / 1e6)
+    return times, imported
+
+def check_imports(
+    budgets     : dict  = None,
+    scale       : float = 1.0) -> tuple:
+    """
+    Check that every module is imported within its budget and without
+    importing the heavy optional dependencies of `LAZY_IMPORTS`.
+
+    Parameters
+    ----------
+    - `budgets` : Dictionary `{module: milliseconds}`. `IMPORT_BUDGETS` by default.
+    - `scale`   : Factor applied to every budget (e.g. `2` on slow machines).
+
+    Returns
+    -------
+    Tuple with the results (in the format of `run_benchmark()`) by name and the
+    list of problems found.
+    """
+    budgets  = budgets if budgets is not None else IMPORT_BUDGETS
+    results  = {}
+    problems = []
+    for module, budget in budgets.items():
+        times, imported = import_time(module)
+        median          = statistics.median(times)
+        results[f"import[{module}]"] = {
+            'times'     : times,
+            'min'       : min(times),
+            'median'    : median,
+            'mean'      : statistics.fmean(times),
+            'stdev'     : statistics.stdev(times) if len(times) > 1 else 0.0,
+            'items'     : 1,
+            'unit'      : "imports",
+            'per_second': 1 / median if median else None
+        }
+        heavy   = sorted(name for name in imported if name.split('.')[0] in LAZY_IMPORTS)
+        status  = "ok"
+        if median * 1e3 > budget * scale:
+            status = "OVER BUDGET"
+            problems.append(f"{module} takes {median * 1e3:.1f} ms to import (budget {budget * scale:.0f} ms)")
+        if heavy:
+            status = "HEAVY IMPORTS"
+            problems.append(f"{module} imports {', '.join(heavy)}")
+        print(f"{'import[' + module + ']':<28} {median * 1e3:>12.3f} ms  budget {budget * scale:>6.0f} ms  {status}", flush = True)
+    return results, problems
+
+#**********
+#* RUNNER
+#**********
+def run_benchmark(
+    bench   : Benchmark,
+    repeat  : int   = 5,
+    warmup  : int   = 1) -> dict:
+    """
+    Time a benchmark `repeat` times after `warmup` untimed runs.
+
+    Returns
+    -------
+    Dictionary with the times in seconds and their statistics.
+    """
+    function = bench.setup()
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    median = statistics.median(times)
+    return {
+        'times'     : times,
+        'min'       : min(times),
+        'median'    : median,
+        'mean'      : statistics.fmean(times),
+        'stdev'     : statistics.stdev(times) if len(times) > 1 else 0.0,
+        'items'     : bench.items,
+        'unit'      : bench.unit,
+        'per_second': bench.items / median if median else None
+    }
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output = True, text = True,
+            cwd = os.path.dirname(os.path.abspath(__file__)), check = True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(
+    selected    : list,
+    repeat      : int   = 5,
+    warmup      : int   = 1) -> dict:
+    """
+    Run benchmarks and return the results document saved as JSON.
+    """
+    results = {}
+    for bench in selected:
+        try:
+            result = run_benchmark(bench, repeat, warmup)
+        except _Skip as exc:
+            print(f"{bench.name:<28} skipped: {exc}")
+            continue
+        results[bench.name] = result
+        print(f"{bench.name:<28} {result['median'] * 1e3:>12.3f} ms  {result['per_second']:>14,.0f} {bench.unit}/s  (±{result['stdev'] * 1e3:.3f} ms)", flush = True)
+
+    return {
+        'version'   : RESULTS_VERSION,
+        'created'   : datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit'    : _commit(),
+        'python'    : sys.version.split()[0],
+        'machine'   : {'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count()},
+        'repeat'    : repeat,
+        'results'   : results
+    }
+
+def compare(
+    new         : dict,
+    old         : dict,
+    threshold   : float = 0.10) -> list:
+    """
+    Compare the medians of two results documents.
+
+    Parameters
+    ----------
+    - `new`         : Current results.
+    - `old`         : Baseline results.
+    - `threshold`   : Relative slowdown considered a regression (0.10 = 10% slower).
+
+    Returns
+    -------
+    List with the names of the regressed benchmarks.
+    """
+    regressions = []
+    print(f"\nCompared to {old.get('commit') or 'baseline'} ({old.get('created')})")
+    for name, result in new['results'].items():
+        baseline = old.get('results', {}).get(name)
+        if baseline is None:
+            print(f"{name:<28} {'new':>10}")
+            continue
+        ratio   = result['median'] / baseline['median']
+        status  = ""
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = "faster"
+        print(f"{name:<28} {ratio:>9.2f}x  {status}")
+    return regressions
+
+def main(
+    argv    : list  = None) -> int:
+    parser = argparse.ArgumentParser(description = "Run the Notion SDK benchmark suite.")
+    parser.add_argument('--output', help = "Save the results to this JSON file.")
+    parser.add_argument('--compare', help = "Compare with the results of this JSON file.")
+    parser.add_argument('--threshold', type = float, default = 0.10, help = "Relative slowdown reported as regression.")
+    parser.add_argument('--filter', default = "", help = "Only run benchmarks whose name contains this text.")
+    parser.add_argument('--max-size', type = int, default = 10**5, help = "Skip benchmarks with larger inputs (use 1000000 for all).")
+    parser.add_argument('--repeat', type = int, default = 5, help = "Timed runs per benchmark.")
+    parser.add_argument('--list', action = 'store_true', help = "List the benchmarks and exit.")
+    parser.add_argument('--imports', action = 'store_true', help = "Only check the import time budgets.")
+    parser.add_argument('--budget-scale', type = float, default = 1.0, help = "Factor applied to every import time budget.")
+    args = parser.parse_args(argv)
+
+    selected = [bench for bench in BENCHMARKS if args.filter in bench.name and bench.size <= args.max_size]
+    if args.list:
+        for bench in BENCHMARKS:
+            print(bench.name)
+        return 0
+
+    document = run_suite([] if args.imports else selected, repeat = max(1, args.repeat))
+    imports, problems = check_imports(scale = args.budget_scale)
+    document['results'].update(imports)
+    for problem in problems:
+        print(f"Import budget exceeded: {problem}")
+
+    if args.output:
+        with open(args.output, 'w', encoding = 'utf-8') as file:
+            json.dump(document, file, indent = 2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding = 'utf-8') as file:
+            baseline = json.load(file)
+        if compare(document, baseline, args.threshold):
+            return 1
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
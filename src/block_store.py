@@ -0,0 +1,471 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compact binary files of Notion block trees with lazy, memory-mapped loading
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file stores block trees (or any JSON-like value) in a binary format
+    meant to hand large trees between the stages of a pipeline:
+
+    - Every string (keys like `type` or `annotations`, values like `default`,
+    and text) is stored once in a string table and referenced by its index.
+    - Lists and dictionaries are tables of fixed-size entries. Numbers, booleans,
+    `None` and strings are stored inside the entry; nested lists and dictionaries
+    are stored as the offset of their table. Identical small tables (e.g. the
+    annotations of most text objects) are stored once.
+
+    `BlockStore` maps the file with `mmap` and decodes nothing when opened. Its
+    items are lazy views (`LazyList`, `LazyDict`) that only decode the parts of
+    the tree that are accessed, so a stage can read a few blocks of a file of
+    hundreds of MB almost instantly and without loading the rest in memory.
+    `decode()` converts a view (or `load()` the whole file) to Python objects.
+
+    File layout (little endian)
+    ---------------------------
+    - Header: magic `NBLK`, version (u16), flags (u16), root entry (u8 tag and
+    8 bytes payload), string table offset (u64), number of strings (u64).
+    - Containers: number of entries (u32) followed by the entries. List entries
+    are a tag (u8) and a payload (8 bytes). Dictionary entries are the string
+    index of the key (u32), a tag and a payload.
+    - String table: offsets of every string (u64, one more than strings) in the
+    UTF-8 data that follows them.
+
+    Example
+    -------
+    >>> dump(notion_blocks, "blocks.nblk")
+    >>> with BlockStore("blocks.nblk") as store:
+    ...     print(len(store), store[1000]['type'])
+    ...     block = store[1000].decode()
+   """
+
+from collections.abc import Mapping, Sequence
+import mmap
+import os
+import struct
+
+MAGIC   = b"NBLK"
+VERSION = 1
+
+# Entry tags
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STRING, _LIST, _DICT, _BIG_INT = range(9)
+
+_HEADER         = struct.Struct("<4sHHBqQQ")
+_COUNT          = struct.Struct("<I")
+_LIST_ENTRY     = struct.Struct("<Bq")
+_DICT_ENTRY     = struct.Struct("<IBq")
+_OFFSET         = struct.Struct("<Q")
+_INT64          = struct.Struct("<q")
+_FLOAT64        = struct.Struct("<d")
+_INT64_RANGE    = range(-2**63, 2**63)
+
+# Identical containers up to this size (e.g. annotations) are stored once
+_MAX_SHARED_SIZE = 256
+
+#*************
+#* WRITING
+#*************
+class _Writer():
+    """
+    Write values to a binary file, containers after their content.
+    """
+
+    def __init__(
+        self,
+        file) -> None:
+        self.file       = file
+        self.position   = _HEADER.size
+        self.strings    = {}    # string -> index
+        self.tables     = {}    # encoded small container -> offset
+
+    def _string(
+        self,
+        value   : str) -> int:
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def entry(
+        self,
+        value) -> tuple:
+        """
+        Tag and payload of a value, writing its table first if it is a container.
+        """
+        if value is None:
+            return _NONE, 0
+        if value is True:
+            return _TRUE, 0
+        if value is False:
+            return _FALSE, 0
+        if isinstance(value, str):
+            return _STRING, self._string(value)
+        if isinstance(value, int):
+            if value in _INT64_RANGE:
+                return _INT, value
+            return _BIG_INT, self._string(str(value))
+        if isinstance(value, float):
+            return _FLOAT, _INT64.unpack(_FLOAT64.pack(value))[0]
+        if isinstance(value, Mapping):
+            entries = []
+            for key, item in value.items():
+                if not isinstance(key, str):
+                    raise TypeError(f"Dictionary keys must be strings, not {type(key).__name__}")
+                entries.extend((self._string(key), *self.entry(item)))
+            return _DICT, self._write(len(value), f"<I{'IBq' * len(value)}", entries)
+        if isinstance(value, (list, tuple)):
+            entries = []
+            for item in value:
+                entries.extend(self.entry(item))
+            return _LIST, self._write(len(value), f"<I{'Bq' * len(value)}", entries)
+        raise TypeError(f"Object of type {type(value).__name__} cannot be stored")
+
+    def _write(
+        self,
+        count   : int,
+        fmt     : str,
+        entries : list) -> int:
+        data    = struct.pack(fmt, count, *entries)
+        small   = len(data) <= _MAX_SHARED_SIZE
+        if small and data in self.tables:
+            return self.tables[data]
+        offset          = self.position
+        self.file.write(data)
+        self.position   += len(data)
+        if small:
+            self.tables[data] = offset
+        return offset
+
+    def finish(
+        self,
+        root    : tuple) -> None:
+        """
+        Write the string table and the header.
+        """
+        encoded = [string.encode('utf-8', 'surrogatepass') for string in self.strings]
+        offsets = [0]
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+        table_offset = self.position
+        self.file.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        self.file.write(b"".join(encoded))
+        self.file.seek(0)
+        self.file.write(_HEADER.pack(MAGIC, VERSION, 0, root[0], root[1], table_offset, len(encoded)))
+
+def dump(
+    value,
+    path    : str) -> None:
+    """
+    Write a block tree (or any value made of dictionaries, lists, strings,
+    numbers, booleans and `None`) to a binary file.
+
+    Parameters
+    ----------
+    - `value`   : Value to store, e.g. a list of Notion blocks.
+    - `path`    : Path of the file. It is replaced only if the whole value is written.
+    """
+    temporary = f"{path}.tmp"
+    try:
+        with open(temporary, 'wb') as file:
+            file.write(b"\0" * _HEADER.size)
+            writer  = _Writer(file)
+            root    = writer.entry(value)
+            writer.finish(root)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+#*************
+#* READING
+#*************
+class LazyList(Sequence):
+    """
+    Read-only view of a stored list. Items are decoded when accessed. It is
+    equal to lists (and other `LazyList`) with equal items.
+    """
+    __slots__ = ('_store', '_offset', '_count')
+
+    def __init__(
+        self,
+        store   : 'BlockStore',
+        offset  : int) -> None:
+        self._store     = store
+        self._offset    = offset + _COUNT.size
+        self._count     = _COUNT.unpack_from(store._buffer, offset)[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(
+        self,
+        index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("LazyList index out of range")
+        tag, payload = _LIST_ENTRY.unpack_from(self._store._buffer, self._offset + index * _LIST_ENTRY.size)
+        return self._store._lazy(tag, payload)
+
+    def __iter__(self):
+        store   = self._store
+        end     = self._offset + self._count * _LIST_ENTRY.size
+        for tag, payload in _LIST_ENTRY.iter_unpack(store._buffer[self._offset:end]):
+            yield store._lazy(tag, payload)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (list, LazyList)):
+            return NotImplemented
+        return self._count == len(other) and all(item == other_item for item, other_item in zip(self, other))
+
+    __hash__ = None
+
+    def decode(self) -> list:
+        """
+        Decode the list and everything inside it to Python objects.
+        """
+        return self._store._decode_list(self._offset - _COUNT.size)
+
+    def __repr__(self) -> str:
+        return f"LazyList({self._count} items)"
+
+class LazyDict(Mapping):
+    """
+    Read-only view of a stored dictionary. Values are decoded when accessed.
+    """
+    __slots__ = ('_store', '_offset', '_entries')
+
+    def __init__(
+        self,
+        store   : 'BlockStore',
+        offset  : int) -> None:
+        self._store     = store
+        self._offset    = offset
+        count           = _COUNT.unpack_from(store._buffer, offset)[0]
+        start           = offset + _COUNT.size
+        string          = store._string
+        self._entries   = {
+            string(key): (tag, payload)
+            for key, tag, payload in _DICT_ENTRY.iter_unpack(store._buffer[start:start + count * _DICT_ENTRY.size])
+        }
+
+    def __getitem__(
+        self,
+        key : str):
+        tag, payload = self._entries[key]
+        return self._store._lazy(tag, payload)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(
+        self,
+        key) -> bool:
+        return key in self._entries
+
+    def decode(self) -> dict:
+        """
+        Decode the dictionary and everything inside it to Python objects.
+        """
+        return self._store._decode_dict(self._offset)
+
+    def __repr__(self) -> str:
+        return f"LazyDict({list(self._entries)})"
+
+class BlockStore(Sequence):
+    """
+    Memory-mapped binary file written with `dump()`. Nothing is decoded when
+    the file is opened. If the stored value is a list (e.g. a list of blocks),
+    the store behaves as a lazy list of its items.
+
+    Parameters
+    ----------
+    - `path`    : Path of the file.
+
+    Attributes
+    ----------
+    - `root`    : Stored value, as a lazy view if it is a list or a dictionary.
+    """
+
+    def __init__(
+        self,
+        path    : str) -> None:
+        self.path = path
+        with open(path, 'rb') as file:
+            self._buffer = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        if len(self._buffer) < _HEADER.size:
+            self._buffer.close()
+            raise ValueError(f"{path} is not a block store file")
+        magic, version, _, tag, payload, table_offset, count = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self._buffer.close()
+            raise ValueError(f"{path} is not a block store file of version {VERSION}")
+        self._table     = table_offset
+        self._data      = table_offset + (count + 1) * _OFFSET.size
+        self._strings   = [None] * count
+        self.root       = self._lazy(tag, payload)
+
+    def __enter__(self) -> 'BlockStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._buffer.close()
+
+    def _string(
+        self,
+        index   : int) -> str:
+        string = self._strings[index]
+        if string is None:
+            start, end  = struct.unpack_from("<QQ", self._buffer, self._table + index * _OFFSET.size)
+            string      = self._buffer[self._data + start:self._data + end].decode('utf-8', 'surrogatepass')
+            self._strings[index] = string
+        return string
+
+    def _scalar(
+        self,
+        tag     : int,
+        payload : int):
+        if tag == _STRING:
+            return self._string(payload)
+        if tag == _INT:
+            return payload
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _FLOAT:
+            return _FLOAT64.unpack(_INT64.pack(payload))[0]
+        if tag == _BIG_INT:
+            return int(self._string(payload))
+        raise ValueError(f"Unknown tag {tag} in {self.path}")
+
+    def _lazy(
+        self,
+        tag     : int,
+        payload : int):
+        if tag == _DICT:
+            return LazyDict(self, payload)
+        if tag == _LIST:
+            return LazyList(self, payload)
+        return self._scalar(tag, payload)
+
+    def _value(
+        self,
+        tag     : int,
+        payload : int):
+        if tag == _DICT:
+            return self._decode_dict(payload)
+        if tag == _LIST:
+            return self._decode_list(payload)
+        return self._scalar(tag, payload)
+
+    def _decode_dict(
+        self,
+        offset  : int) -> dict:
+        count   = _COUNT.unpack_from(self._buffer, offset)[0]
+        start   = offset + _COUNT.size
+        string  = self._string
+        value   = self._value
+        return {
+            string(key): value(tag, payload)
+            for key, tag, payload in _DICT_ENTRY.iter_unpack(self._buffer[start:start + count * _DICT_ENTRY.size])
+        }
+
+    def _decode_list(
+        self,
+        offset  : int) -> list:
+        count   = _COUNT.unpack_from(self._buffer, offset)[0]
+        start   = offset + _COUNT.size
+        value   = self._value
+        return [
+            value(tag, payload)
+            for tag, payload in _LIST_ENTRY.iter_unpack(self._buffer[start:start + count * _LIST_ENTRY.size])
+        ]
+
+    def load(self):
+        """
+        Decode the whole stored value to Python objects.
+        """
+        return self.root.decode() if isinstance(self.root, (LazyList, LazyDict)) else self.root
+
+    def __len__(self) -> int:
+        return len(self.root)
+
+    def __getitem__(
+        self,
+        index):
+        return self.root[index]
+
+    def __iter__(self):
+        return iter(self.root)
+
+def load(
+    path    : str):
+    """
+    Read a whole file written with `dump()` as Python objects.
+    """
+    with BlockStore(path) as store:
+        return store.load()
+
+
+if __name__ == "__main__":
+    #**************************************
+    #* BENCHMARK AGAINST JSON FILES
+    #**************************************
+    import json
+    import os
+    import sys
+    import tempfile
+    import time
+
+    from benchmarks import generate_blocks
+
+    count       = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    blocks_list = generate_blocks(count)
+    directory   = tempfile.mkdtemp()
+    json_path   = os.path.join(directory, "blocks.json")
+    store_path  = os.path.join(directory, "blocks.nblk")
+
+    start = time.perf_counter()
+    with open(json_path, 'w', encoding = 'utf-8') as file:
+        json.dump(blocks_list, file)
+    json_write = time.perf_counter() - start
+    start = time.perf_counter()
+    dump(blocks_list, store_path)
+    store_write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(json_path, encoding = 'utf-8') as file:
+        block = json.load(file)[count // 2]['type']
+    json_access = time.perf_counter() - start
+    start = time.perf_counter()
+    with BlockStore(store_path) as store:
+        block = store[count // 2]['type']
+        store_access = time.perf_counter() - start
+        start = time.perf_counter()
+        assert store.load() == blocks_list
+        store_load = time.perf_counter() - start
+
+    print(f"{count} blocks")
+    print(f"File size      JSON {os.path.getsize(json_path) / 2**20:8.1f} MiB   store {os.path.getsize(store_path) / 2**20:8.1f} MiB")
+    print(f"Write          JSON {json_write:8.3f} s     store {store_write:8.3f} s")
+    print(f"Read one block JSON {json_access:8.3f} s     store {store_access * 1e3:8.3f} ms")
+    print(f"Load all                           store {store_load:8.3f} s")
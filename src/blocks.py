@@ -18,33 +18,73 @@
     structure, add children blocks to parent blocks and append blocks.  
    """
 
-from rich import print_json
-import json
+from typing import Iterator
 
 from helpers import (
-    add_icon, add_rich_text
+    MAX_RICH_TEXT_ITEMS, add_icon, add_rich_text, coalesce_rich_text,
+    iter_text_chunks, split_rich_text
 )
+from inspector import inspect_block
+from instrumentation import instrumented
+
+# Coding languages supported by code blocks
+SUPPORTED_LANGUAGES = frozenset(["abap", "arduino", "bash", "basic", "c", "clojure", "coffeescript", "c++", "c#", "css", "dart", "diff", "docker", "elixir", "elm", "erlang", "flow", "fortran", "f#", "gherkin", "glsl", "go", "graphql", "groovy", "haskell", "html", "java", "javascript", "json", "julia", "kotlin", "latex", "less", "lisp", "livescript", "lua", "makefile", "markdown", "markup", "matlab", "mermaid", "nix", "objective-c", "ocaml", "pascal", "perl", "php", "plain text", "powershell", "prolog", "protobuf", "python", "r", "reason", "ruby", "rust", "sass", "scala", "scheme", "scss", "shell", "sql", "swift", "typescript", "vb.net", "verilog", "vhdl", "visual basic", "webassembly", "xml", "yaml", "java/c/c++/c#"])
+
+# Notion blocks that support children objects
+SUPPORT_CHILDREN = frozenset([
+    'paragraph', 
+    'bulleted_list_item', 
+    'numbered_list_item', 
+    'toggle', 
+    'to_do', 
+    'quote', 
+    'callout', 
+    'synced_block', 
+    'template', 
+    'column_list', 
+    'column', 
+    'child_page', 
+    'child_database', 
+    'table'
+])
+
+# Keys of a block object with rich text arrays
+RICH_TEXT_KEYS = ('text', 'rich_text', 'caption')
 
 #*****************************
 #* NOTION SDK FUNCTIONALITIES
 #*****************************
 def print_block(
-    notion_block    : dict) -> dict:
+    notion_block    : dict,
+    max_depth       : int   = None,
+    max_children    : int   = None,
+    max_text        : int   = None) -> None:
     """
     Print with indents a dictionary Notion block for readability purposes.
+    The block is written while walking it, so large blocks can be limited.
 
     Parameters
     ----------
     - `notion_block`    : Notion block to view structure.
-    """
-    print(f"Printing {notion_block['type']} Notion block")
-    print_json(json.dumps(notion_block, indent=2))
+    - `max_depth`       : Maximum number of nested children levels to show, or `None`.
+    - `max_children`    : Maximum number of items shown per list, or `None`.
+    - `max_text`        : Maximum number of characters shown per string, or `None`.
+    """
+    print(f"Printing {notion_block.get('type', 'unknown')} Notion block")
+    inspect_block(
+        notion_block,
+        max_depth       = max_depth,
+        max_children    = max_children,
+        max_text        = max_text
+    )
 
 def add_children(
     parent          : dict,
     children        : dict) -> dict:
     """
     Adds children object to dictionary containing a Notion block.
+    The parent block is modified in place. Use `tree.Node.with_children()` to
+    reuse blocks or build variants of a tree without copying it.
 
     Parameters
     ----------
@@ -55,28 +95,8 @@ def add_children(
     -------
     Dictionary with Notion format to be used as children
     """
-    # List of Notion blocks that support children objects
-    support_children = [
-        'paragraph', 
-        'bulleted_list_item', 
-        'numbered_list_item', 
-        'toggle', 
-        'to_do', 
-        'quote', 
-        'callout', 
-        'synced_block', 
-        'template', 
-        'column', 
-        'child_page', 
-        'child_database', 
-        'header_1', 
-        'header_2', 
-        'header_3', 
-        'table'
-    ]
-
     # Check if parent block type can support children
-    if parent['type'] in support_children:
+    if parent['type'] in SUPPORT_CHILDREN:
         # Create 'children' key and add block
         if 'children' not in parent[parent['type']]:
             parent[parent['type']]['children'] = [children]
@@ -84,6 +104,7 @@ def add_children(
         else:
             parent[parent['type']]['children'].append(children)
 
+@instrumented("blocks.append_blocks")
 def append_blocks(
     blocks  : list) -> dict:
     """
@@ -107,7 +128,7 @@ def append_rich_text(
     notion_block: dict,
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> None:
+    annotations : dict  = None) -> None:
     """
     Append rich text object to dictionary Notion block.
     Mainly used for the Notion markdown parser.
@@ -117,26 +138,81 @@ def append_rich_text(
     - `notion_block`: Dictionary with Notion block information.
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
+
+    Notes
+    -----
+    Empty content is ignored, and content with the same annotations and link as
+    the last text object of the block is merged into it. Long content is split
+    in text objects of up to 2000 characters.
+    """
+    if not content:
+        return
+    block_type  = notion_block['type']
+    rich_text   = notion_block[block_type]['text']
+    for new_text in split_rich_text(content, href, annotations):
+        if rich_text:
+            merged = coalesce_rich_text([rich_text[-1], new_text])
+            if len(merged) == 1:
+                rich_text[-1] = merged[0]
+                continue
+        rich_text.append(new_text)
+    if len(rich_text) > MAX_RICH_TEXT_ITEMS:
+        print(f"Text of {len(rich_text)} text objects exceeds the maximum of {MAX_RICH_TEXT_ITEMS} of a {block_type} block")
+
+def normalize_rich_text(
+    notion_blocks   : list) -> list:
+    """
+    Coalesce the rich text of a list of Notion blocks and all their children
+    with `helpers.coalesce_rich_text()`: adjacent text objects with the same
+    annotations and link are merged and empty ones are dropped.
+
+    Parameters
+    ----------
+    - `notion_blocks`: List of Notion blocks. They are modified in place.
 
     Returns
     -------
-    Dictionary with the paragraph block.
-    """
-    block_type = notion_block['type']
-    notion_block[block_type]['text'].append(
-        add_rich_text(content, href, annotations)
-    )
+    The same list of Notion blocks.
+    """
+    stack = list(notion_blocks)
+    while stack:
+        notion_block    = stack.pop()
+        block_type      = notion_block.get('type')
+        content         = notion_block.get(block_type)
+        if not isinstance(content, dict):
+            continue
+        for key in RICH_TEXT_KEYS:
+            if key in content:
+                content[key] = coalesce_rich_text(content[key])
+        if block_type == 'table_row':
+            content['cells'] = [coalesce_rich_text(cell) for cell in content['cells']]
+        stack.extend(content.get('children', ()))
+    return notion_blocks
 
 
 #**************************
 #* SUPPORTED NOTION BLOCKS
 #**************************
+def _block_text(
+    block_type  : str,
+    content     : str,
+    href        : str   = None,
+    annotations : dict  = None) -> list:
+    """
+    Rich text of a block, reporting text that needs more text objects than
+    Notion accepts in a single block.
+    """
+    rich_text = split_rich_text(content, href, annotations)
+    if len(rich_text) > MAX_RICH_TEXT_ITEMS:
+        advice = "Use code_blocks() to split it in several blocks" if block_type == 'code' else "Split it in several blocks"
+        print(f"Text of {len(rich_text)} text objects exceeds the maximum of {MAX_RICH_TEXT_ITEMS} of a {block_type} block. {advice}")
+    return rich_text
 
 def paragraph(
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create paragraph Notion block.
 
@@ -144,7 +220,7 @@ def paragraph(
     ----------
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -154,10 +230,7 @@ def paragraph(
                 "object": "block",
                 "type": "paragraph",
                 "paragraph":{
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ]
+                    "text": _block_text('paragraph', content, href, annotations)
                 }
             }
 
@@ -165,7 +238,7 @@ def heading(
     heading_num : int,
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create heading Notion block.
 
@@ -174,7 +247,7 @@ def heading(
     - `heading_num` : Either 1, 2 or 3.
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -184,10 +257,7 @@ def heading(
                 "object": "block",
                 "type": f"heading_{heading_num}",
                 f"heading_{heading_num}":{
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ]
+                    "text": _block_text('heading', content, href, annotations)
                 }
             } 
 
@@ -196,7 +266,7 @@ def callout(
     icon_str    : str   = "💡",
     content     : str   = None,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create callout Notion block.
     Please note that it is not possible to change the color of the entire callout block
@@ -208,7 +278,7 @@ def callout(
     - `icon_str`    : Emoji string or external link.
     - `content`     : Text for the block.
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text.
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -218,9 +288,7 @@ def callout(
                 "object": "block",
                 "type": "callout",
                 "callout": {
-                    "text": [
-                        add_rich_text(content, href, annotations)
-                    ],
+                    "text": _block_text('callout', content, href, annotations),
                     "icon" : add_icon(icon_type, icon_str)
                 }
             }
@@ -228,7 +296,7 @@ def callout(
 def quote(
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create quote Notion block.
 
@@ -236,7 +304,7 @@ def quote(
     ----------
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -246,17 +314,14 @@ def quote(
                 "object": "block",
                 "type": "quote",
                 "quote":{
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ]
+                    "text": _block_text('quote', content, href, annotations)
                 }
             } 
 
 def bulleted_list_item(
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create bulleted list item Notion block.
 
@@ -264,7 +329,7 @@ def bulleted_list_item(
     ----------
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -274,17 +339,14 @@ def bulleted_list_item(
                 "object": "block",
                 "type": "bulleted_list_item",
                 "bulleted_list_item":{
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ]
+                    "text": _block_text('bulleted_list_item', content, href, annotations)
                 }
             }
 
 def numbered_list_item(
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create bulleted list item Notion block.
 
@@ -292,7 +354,7 @@ def numbered_list_item(
     ----------
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -302,10 +364,7 @@ def numbered_list_item(
                 "object": "block",
                 "type": "numbered_list_item",
                 "numbered_list_item":{
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ]
+                    "text": _block_text('numbered_list_item', content, href, annotations)
                 }
             } 
 
@@ -313,7 +372,7 @@ def to_do(
     checked     : bool,
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create paragraph Notion block.
 
@@ -322,7 +381,7 @@ def to_do(
     - `checked`     : Either True or False.
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -332,10 +391,7 @@ def to_do(
                 "object": "block",
                 "type": "to_do",
                 "to_do":{
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ],
+                    "text": _block_text('to_do', content, href, annotations),
                     "checked" : checked
                 }
             }  
@@ -343,7 +399,7 @@ def to_do(
 def toggle(
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create toggle Notion block.
 
@@ -351,7 +407,7 @@ def toggle(
     ----------
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -361,10 +417,7 @@ def toggle(
                 "object": "block",
                 "type": "toggle",
                 "toggle":{
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ]
+                    "text": _block_text('toggle', content, href, annotations)
                 }
             }
 
@@ -372,27 +425,26 @@ def code(
     language    : str,
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
-    Create code Notion block.
+    Create code Notion block. Text longer than 100 text objects of 2000
+    characters is reported: use `code_blocks()` for long text (logs, files...).
 
     Parameters
     ----------
     - `language`    : Coding language in code block.
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
     Dictionary with the code block.
     """
-    supported_languages = ["abap", "arduino", "bash", "basic", "c", "clojure", "coffeescript", "c++", "c#", "css", "dart", "diff", "docker", "elixir", "elm", "erlang", "flow", "fortran", "f#", "gherkin", "glsl", "go", "graphql", "groovy", "haskell", "html", "java", "javascript", "json", "julia", "kotlin", "latex", "less", "lisp", "livescript", "lua", "makefile", "markdown", "markup", "matlab", "mermaid", "nix", "objective-c", "ocaml", "pascal", "perl", "php", "plain text", "powershell", "prolog", "protobuf", "python", "r", "reason", "ruby", "rust", "sass", "scala", "scheme", "scss", "shell", "sql", "swift", "typescript", "vb.net", "verilog", "vhdl", "visual basic", "webassembly", "xml", "yaml", "java/c/c++/c#"]
-    
     # If given language is not in supported, raise error.
     try:
-        if not language in supported_languages:
-            raise AttributeError(f"Language is not supported. Supported languages are: \n{supported_languages}")
+        if not language in SUPPORTED_LANGUAGES:
+            raise AttributeError(f"Language is not supported. Supported languages are: \n{sorted(SUPPORTED_LANGUAGES)}")
     except AttributeError as exc:
         print(exc)
     
@@ -400,27 +452,100 @@ def code(
                 "object": "block",
                 "type": "code",
                 "code":{
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ],
+                    "text": _block_text('code', content, href, annotations),
                     "language": language
                 }
             } 
 
-# TODO: Implement
+def code_blocks(
+    language    : str,
+    source,
+    annotations : dict  = None) -> Iterator[dict]:
+    """
+    Create as many code Notion blocks as needed for a long text (logs, stack
+    traces...). Every block has up to 100 text objects of up to 2000 characters,
+    the maximum accepted by Notion.
+
+    Parameters
+    ----------
+    - `language`    : Coding language in code blocks.
+    - `source`      : String, file object or bytes-like object (e.g. `mmap`) with
+    the code. Files and buffers are read in pieces while blocks are created.
+    - `annotations` : All annotations that apply to the rich text, or `None`.
+
+    Returns
+    -------
+    Iterator of code blocks.
+    """
+    if not language in SUPPORTED_LANGUAGES:
+        print(f"Language is not supported. Supported languages are: \n{sorted(SUPPORTED_LANGUAGES)}")
+
+    rich_text = []
+    for chunk in iter_text_chunks(source):
+        rich_text.append(add_rich_text(chunk, None, annotations))
+        if len(rich_text) == MAX_RICH_TEXT_ITEMS:
+            yield _code_block(language, rich_text)
+            rich_text = []
+    if rich_text:
+        yield _code_block(language, rich_text)
+
+def _code_block(
+    language    : str,
+    rich_text   : list) -> dict:
+    return  {
+                "object": "block",
+                "type": "code",
+                "code":{
+                    "text": rich_text,
+                    "language": language
+                }
+            }
+
 def child_page(
-    ) -> dict:
+    title   : str) -> dict:
     """
+    Create child page Notion block.
+    Please note that the Notion API returns this block when a page contains
+    other pages. To create a new page use `pages.page()` and `pages.create_pages()`.
+
+    Parameters
+    ----------
+    - `title`   : Title of the page.
+
+    Returns
+    -------
+    Dictionary with the child page block.
     """
-    pass
+    return  {
+                "object": "block",
+                "type": "child_page",
+                "child_page": {
+                    "title": title
+                }
+            }
 
-# TODO: Implement
 def child_database(
-    ) -> dict:
+    title   : str) -> dict:
     """
+    Create child database Notion block.
+    Please note that the Notion API returns this block when a page contains
+    an inline database. Databases are created through `notion.databases.create`.
+
+    Parameters
+    ----------
+    - `title`   : Title of the database.
+
+    Returns
+    -------
+    Dictionary with the child database block.
     """
-    pass
+    return  {
+                "object": "block",
+                "type": "child_database",
+                "child_database": {
+                    "title": title
+                }
+            }
 
 def embed(
     url : str) -> dict:
@@ -509,7 +634,7 @@ def file(
     caption     : str,
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create a file Notion block.
 
@@ -519,7 +644,7 @@ def file(
     - `caption`     : Caption of the file block.
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -533,12 +658,9 @@ def file(
                     "external": {
                         "url": url
                     },
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ],
-                },
-                "caption" : caption
+                    "text": _block_text('file', content, href, annotations),
+                    "caption": _block_text('file', caption)
+                }
             }
 
 def pdf(
@@ -570,7 +692,7 @@ def bookmark(
     caption     : str,
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create a bookmark Notion block.
 
@@ -580,7 +702,7 @@ def bookmark(
     - `caption`     : Caption of the bookmark file block.
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
 
     Returns
     -------
@@ -594,12 +716,9 @@ def bookmark(
                     "external": {
                         "url": url
                     },
-                    "text":
-                    [
-                        add_rich_text(content, href, annotations)
-                    ],
-                },
-                "caption" : caption
+                    "text": _block_text('bookmark', content, href, annotations),
+                    "caption": _block_text('bookmark', caption)
+                }
             } 
 
 def equation(
@@ -669,13 +788,6 @@ def columns(
     """
     pass
 
-#?: Should be implemented? They are only returned as a response and cannot be created via de API.
-def child_database(
-    ) -> dict:
-    """
-    """
-    pass
-
 # TODO: Implement
 def template(
     ) -> dict:
@@ -690,23 +802,99 @@ def link_to_page(
     """
     pass
 
-# TODO: Implement
 def synced_block(
-    ) -> dict:
-    """
+    children    : list  = None,
+    synced_from : str   = None) -> dict:
     """
-    pass
+    Create synced Notion block. An original synced block contains the blocks to
+    synchronize. A reference only points to the ID of an original synced block,
+    and Notion shows its content.
+
+    Parameters
+    ----------
+    - `children`    : List of Notion blocks of an original synced block.
+    - `synced_from` : ID of the original synced block for references, or `None`
+    to create an original synced block.
+
+    Returns
+    -------
+    Dictionary with the synced block.
+    """
+    if synced_from is not None:
+        if children:
+            print("Synced block references cannot have children. Ignoring children")
+        return  {
+                    "object": "block",
+                    "type": "synced_block",
+                    "synced_block": {
+                        "synced_from": {
+                            "block_id": synced_from
+                        }
+                    }
+                }
+
+    return  {
+                "object": "block",
+                "type": "synced_block",
+                "synced_block": {
+                    "synced_from": None,
+                    "children": children if children is not None else []
+                }
+            }
 
-# TODO: Implement
 def table(
-    ) -> dict:
+    table_width         : int,
+    rows                : list,
+    has_column_header   : bool  = False,
+    has_row_header      : bool  = False) -> dict:
     """
+    Create table Notion block.
+    Notion requires tables to be created with at least one row and accepts up
+    to 100 rows per request. For larger tables use `tables.from_columns()`.
+
+    Parameters
+    ----------
+    - `table_width`         : Number of columns. Cannot be changed after creation.
+    - `rows`                : List of `table_row` Notion blocks.
+    - `has_column_header`   : Whether the first row is the header of the table.
+    - `has_row_header`      : Whether the first column is the header of every row.
+
+    Returns
+    -------
+    Dictionary with the table block.
     """
-    pass
+    return  {
+                "object": "block",
+                "type": "table",
+                "table": {
+                    "table_width": table_width,
+                    "has_column_header": has_column_header,
+                    "has_row_header": has_row_header,
+                    "children": rows
+                }
+            }
 
-# TODO: Implement
 def table_row(
-    ) -> dict:
+    cells   : list) -> dict:
     """
+    Create table row Notion block.
+
+    Parameters
+    ----------
+    - `cells`   : List with the content of every cell. Each cell is either a string
+    or a list of rich text objects created with `helpers.add_rich_text()`.
+
+    Returns
+    -------
+    Dictionary with the table row block.
     """
-    pass
+    return  {
+                "object": "block",
+                "type": "table_row",
+                "table_row": {
+                    "cells": [
+                        split_rich_text(cell) if isinstance(cell, str) else cell
+                        for cell in cells
+                    ]
+                }
+            }
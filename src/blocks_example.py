@@ -31,9 +31,6 @@ from dropbox_sdk import DropboxClient
 import datetime
 import os
 
-from rich import print_json
-import json
-
 def main():
 
   notion = Client(auth = NOTION_TOKEN)
@@ -0,0 +1,477 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Shared Notion and Dropbox clients for several integrations
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file includes a registry of tenants (one per workspace, each with its
+    own Notion integration token and, optionally, Dropbox app token) to run the
+    jobs of all of them from the same process:
+
+    - Clients are created once per token and reused. Every Notion client shares
+    the same `httpx` transport and every Dropbox client the same `requests`
+    session, so keep-alive connections to each host are pooled between tenants
+    and jobs do not pay a new TLS handshake. Do not close the clients of a
+    tenant: only `ClientPool.close()` closes the shared connections.
+    - Every Notion token has its own `RateLimiter` (Notion limits each
+    integration separately).
+    - Jobs are queued per tenant and dispatched round robin to the worker
+    threads, taking the next tenant whose rate limiter has a token. A tenant
+    never runs more than `tenant_concurrency` jobs at once, so a busy tenant
+    (or one being throttled) does not hold every worker and starve the others.
+    Throttled and server errors are retried with the backoff policies of
+    `scheduler.py` without blocking a worker while waiting.
+
+    Tokens are added with `add_tenant()` or read from the `NOTION_TOKENS` and
+    `DROPBOX_TOKENS` dictionaries of `secrets.py` with `from_secrets()`.
+
+    Example
+    -------
+    >>> with ClientPool.from_secrets() as pool:
+    ...     future = pool.submit('work', lambda tenant: tenant.notion.pages.retrieve(page_id))
+    ...     page   = future.result()
+   """
+
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable
+import threading
+import time
+
+import instrumentation
+from scheduler import DEFAULT_POLICIES, RateLimiter, retry_delay
+
+class Tenant():
+    """
+    Tokens, clients and rate limiter of one workspace. Clients are created on
+    first use with the connections shared by the pool.
+
+    Attributes
+    ----------
+    - `name`            : Name of the tenant.
+    - `limiter`         : Rate limiter of its Notion token.
+    - `requests`        : Number of jobs finished.
+    """
+
+    def __init__(
+        self,
+        pool            : 'ClientPool',
+        name            : str,
+        notion_token    : str,
+        dropbox_token   : str,
+        limiter         : RateLimiter) -> None:
+        self.name           = name
+        self.limiter        = limiter
+        self.requests       = 0
+        self._pool          = pool
+        self._notion_token  = notion_token
+        self._dropbox_token = dropbox_token
+        self._notion        = None
+        self._dropbox       = None
+        self._in_flight     = 0
+        self._lock          = threading.Lock()
+
+    @property
+    def notion(self):
+        """
+        Notion `Client` of the tenant. Do not close it.
+        """
+        with self._lock:
+            if self._notion is None:
+                if self._notion_token is None:
+                    raise ValueError(f"Tenant {self.name} has no Notion token")
+                self._notion = self._pool._create_notion(self._notion_token)
+            return self._notion
+
+    @property
+    def dropbox(self):
+        """
+        `DropboxClient` of the tenant. Do not close its `dbx` client: the
+        `requests` session is shared with the other tenants.
+        """
+        with self._lock:
+            if self._dropbox is None:
+                if self._dropbox_token is None:
+                    raise ValueError(f"Tenant {self.name} has no Dropbox token")
+                self._dropbox = self._pool._create_dropbox(self._dropbox_token)
+            return self._dropbox
+
+class _SharedTransport():
+    """
+    `httpx` transport of one Notion client over the transport shared by the
+    pool. Closing the client (e.g. `with tenant.notion:`) does not close the
+    connections of the other tenants.
+    """
+
+    def __init__(self, transport) -> None:
+        self._transport = transport
+
+    def handle_request(self, request):
+        return self._transport.handle_request(request)
+
+    def __enter__(self) -> "_SharedTransport":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+class _Job():
+    """
+    Queued call of a function with a tenant.
+    """
+    __slots__ = ('function', 'args', 'kwargs', 'endpoint_class', 'rate_limited', 'future', 'attempt', 'not_before')
+
+    def __init__(
+        self,
+        function        : Callable,
+        args            : tuple,
+        kwargs          : dict,
+        endpoint_class  : str,
+        rate_limited    : bool) -> None:
+        self.function       = function
+        self.args           = args
+        self.kwargs         = kwargs
+        self.endpoint_class = endpoint_class
+        self.rate_limited   = rate_limited
+        self.future         = Future()
+        self.attempt        = 0
+        self.not_before     = 0.0
+
+class ClientPool():
+    """
+    Registry of tenants sharing HTTP connections and worker threads.
+
+    Parameters
+    ----------
+    - `workers`             : Number of worker threads running jobs.
+    - `tenant_concurrency`  : Maximum number of jobs of the same tenant running at once.
+    - `max_connections`     : Maximum number of pooled connections per host.
+    - `rate`                : Requests per second of every Notion token.
+    - `burst`               : Burst of the rate limiter of every Notion token.
+    - `policies`            : Backoff policies per endpoint class. Defaults to `DEFAULT_POLICIES`.
+    """
+
+    def __init__(
+        self,
+        workers             : int   = 4,
+        tenant_concurrency  : int   = 2,
+        max_connections     : int   = 10,
+        rate                : float = 3.0,
+        burst               : int   = 3,
+        policies            : dict  = None) -> None:
+        self.tenant_concurrency = tenant_concurrency
+        self.max_connections    = max_connections
+        self.rate               = rate
+        self.burst              = burst
+        self.policies           = policies or DEFAULT_POLICIES
+
+        self._tenants           = {}        # name -> Tenant
+        self._limiters          = {}        # Notion token -> RateLimiter
+        self._queues            = {}        # name -> deque of _Job
+        self._ready             = deque()   # names with queued jobs, in round robin order
+        self._unfinished        = 0
+        self._closed            = False
+        self._condition         = threading.Condition()
+        self._transport         = None      # httpx transport shared by Notion clients
+        self._session           = None      # requests session shared by Dropbox clients
+        self._connections_lock  = threading.Lock()
+        self._workers           = [
+            threading.Thread(target = self._worker, name = f"notion-pool-{i}", daemon = True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @classmethod
+    def from_secrets(
+        cls,
+        **options) -> 'ClientPool':
+        """
+        Create a pool with a tenant per name of the `NOTION_TOKENS` and
+        `DROPBOX_TOKENS` dictionaries of `secrets.py`. `NOTION_TOKEN` and
+        `DROPBOX_TOKEN` are added as the `default` tenant if present.
+        """
+        import secrets
+
+        notion_tokens   = dict(getattr(secrets, 'NOTION_TOKENS', {}))
+        dropbox_tokens  = dict(getattr(secrets, 'DROPBOX_TOKENS', {}))
+        if getattr(secrets, 'NOTION_TOKEN', None):
+            notion_tokens.setdefault('default', secrets.NOTION_TOKEN)
+        if getattr(secrets, 'DROPBOX_TOKEN', None):
+            dropbox_tokens.setdefault('default', secrets.DROPBOX_TOKEN)
+
+        pool = cls(**options)
+        for name in {**notion_tokens, **dropbox_tokens}:
+            pool.add_tenant(name, notion_tokens.get(name), dropbox_tokens.get(name))
+        return pool
+
+    def __enter__(self) -> 'ClientPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add_tenant(
+        self,
+        name            : str,
+        notion_token    : str   = None,
+        dropbox_token   : str   = None) -> Tenant:
+        """
+        Register a tenant. Tenants using the same Notion token share its rate limiter.
+
+        Parameters
+        ----------
+        - `name`            : Name used to submit jobs.
+        - `notion_token`    : Notion integration token.
+        - `dropbox_token`   : Dropbox app token.
+
+        Returns
+        -------
+        The new tenant.
+        """
+        with self._condition:
+            if name in self._tenants:
+                raise ValueError(f"Tenant {name} already exists")
+            limiter = self._limiters.get(notion_token)
+            if limiter is None:
+                limiter = RateLimiter(rate = self.rate, burst = self.burst)
+                self._limiters[notion_token] = limiter
+            tenant = Tenant(self, name, notion_token, dropbox_token, limiter)
+            self._tenants[name] = tenant
+            return tenant
+
+    def tenant(
+        self,
+        name    : str) -> Tenant:
+        """
+        Tenant registered with `name`.
+        """
+        return self._tenants[name]
+
+    def notion(
+        self,
+        name    : str):
+        """
+        Shared Notion `Client` of a tenant, e.g. for `RetryScheduler(pool.notion(name),
+        limiter = pool.tenant(name).limiter)`. Do not close it.
+        """
+        return self._tenants[name].notion
+
+    def dropbox(
+        self,
+        name    : str):
+        """
+        Shared `DropboxClient` of a tenant. Do not close it.
+        """
+        return self._tenants[name].dropbox
+
+    #****************************
+    #* SHARED CONNECTIONS
+    #****************************
+    def _create_notion(
+        self,
+        token   : str):
+        import httpx
+        from notion_client import Client
+
+        with self._connections_lock:
+            if self._transport is None:
+                self._transport = httpx.HTTPTransport(
+                    limits = httpx.Limits(
+                        max_connections             = self.max_connections,
+                        max_keepalive_connections   = self.max_connections
+                    )
+                )
+        # Every client has its own headers (authorization) over the same connections
+        return Client(auth = token, client = httpx.Client(transport = _SharedTransport(self._transport)))
+
+    def _create_dropbox(
+        self,
+        token   : str):
+        from dropbox_sdk import DropboxClient, _load_dropbox
+
+        with self._connections_lock:
+            if self._session is None:
+                self._session = _load_dropbox().create_session(max_connections = self.max_connections)
+        return DropboxClient(token, session = self._session)
+
+    #****************************
+    #* FAIR SCHEDULING
+    #****************************
+    def submit(
+        self,
+        name            : str,
+        function        : Callable,
+        *args,
+        endpoint_class  : str   = 'default',
+        rate_limited    : bool  = True,
+        **kwargs) -> Future:
+        """
+        Queue a job of a tenant.
+
+        Parameters
+        ----------
+        - `name`            : Name of the tenant.
+        - `function`        : Called as `function(tenant, *args, **kwargs)`. It should
+        send a single Notion request, as it takes one token of the rate limiter.
+        - `endpoint_class`  : Key of the backoff policy used to retry it.
+        - `rate_limited`    : Whether to wait for the tenant rate limiter (`False` for
+        Dropbox jobs).
+
+        Returns
+        -------
+        Future with the value returned by `function`. Cancelling it before the job
+        starts drops the job.
+        """
+        job = _Job(function, args, kwargs, endpoint_class, rate_limited)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("ClientPool is closed")
+            if name not in self._tenants:
+                raise KeyError(f"Unknown tenant {name}")
+            self._queue(name, job)
+            self._unfinished += 1
+            self._condition.notify()
+        return job.future
+
+    def _queue(
+        self,
+        name    : str,
+        job     : _Job,
+        first   : bool = False) -> None:
+        """
+        Add a job to the queue of a tenant. Must be called holding the condition lock.
+        """
+        queue = self._queues.get(name)
+        if queue is None:
+            queue = self._queues[name] = deque()
+            self._ready.append(name)
+        if first:
+            queue.appendleft(job)
+        else:
+            queue.append(job)
+
+    def _next_job(self) -> tuple:
+        """
+        Take the first job of the next tenant in round robin order that can run.
+        Must be called holding the condition lock.
+
+        Returns
+        -------
+        Tuple `(tenant, job, wait)`. If no job can run, `tenant` and `job` are
+        `None` and `wait` are the seconds until one may run (`None` if no job is queued).
+        """
+        now     = time.monotonic()
+        wait    = None
+        for _ in range(len(self._ready)):
+            name = self._ready[0]
+            self._ready.rotate(-1)
+            tenant  = self._tenants[name]
+            queue   = self._queues[name]
+            job     = queue[0]
+            if tenant._in_flight >= self.tenant_concurrency:
+                continue
+            delay = job.not_before - now
+            if delay <= 0 and job.rate_limited:
+                delay = tenant.limiter.try_acquire()
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+
+            queue.popleft()
+            if not queue:
+                del self._queues[name]
+                self._ready.pop()
+            tenant._in_flight += 1
+            return tenant, job, 0.0
+        return None, None, wait
+
+    def _worker(self) -> None:
+        while True:
+            with self._condition:
+                tenant, job, wait = self._next_job()
+                while job is None:
+                    if self._closed and not self._unfinished:
+                        return
+                    self._condition.wait(wait)
+                    tenant, job, wait = self._next_job()
+
+            self._run(tenant, job)
+
+    def _run(
+        self,
+        tenant  : Tenant,
+        job     : _Job) -> None:
+        """
+        Run a job, queueing it again (first in its tenant queue) if it should be
+        retried. Jobs whose future was cancelled while queued are dropped.
+        """
+        retry = False
+        try:
+            # A retried job is already running and cannot be cancelled
+            if job.attempt == 0 and not job.future.set_running_or_notify_cancel():
+                return
+            try:
+                with instrumentation.stage("pool.job", endpoint = job.endpoint_class):
+                    result = job.function(tenant, *job.args, **job.kwargs)
+            except Exception as err:
+                policy                  = self.policies.get(job.endpoint_class, self.policies['default'])
+                retryable, retry_after  = retry_delay(err)
+                if retryable and job.attempt < policy.max_retries:
+                    wait = retry_after if retry_after is not None else policy.delay(job.attempt)
+                    if retry_after is not None:
+                        tenant.limiter.pause(retry_after)
+                    instrumentation.record("scheduler.retry", wait, endpoint = job.endpoint_class)
+                    job.attempt     += 1
+                    job.not_before  = time.monotonic() + wait
+                    retry           = True
+                else:
+                    job.future.set_exception(err)
+            else:
+                job.future.set_result(result)
+        finally:
+            with self._condition:
+                tenant._in_flight -= 1
+                if retry:
+                    self._queue(tenant.name, job, first = True)
+                else:
+                    if not job.future.cancelled():
+                        tenant.requests += 1
+                    self._unfinished -= 1
+                self._condition.notify_all()
+
+    def join(self) -> None:
+        """
+        Block until every queued job has finished.
+        """
+        with self._condition:
+            while self._unfinished:
+                self._condition.wait()
+
+    def close(self) -> None:
+        """
+        Wait for queued jobs, stop the workers and close the shared connections.
+        """
+        self.join()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Synced block deduplication of repeated content across pages
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file finds top-level blocks repeated across a batch of pages (footers,
+    disclaimers, navigation...) by a structural hash of every block. The first
+    occurrence is wrapped in an original synced block and every later copy is
+    replaced by a synced block reference, so the content is sent only once.
+
+    Consecutive repeated blocks are synchronized together when the same run of
+    blocks is repeated, so a three-block footer becomes a single synced block.
+    Content is only deduplicated when the bytes saved are larger than the cost
+    of the synced blocks.
+
+    Only copies on later pages become references: a page is appended before its
+    originals get an ID, so copies repeated inside the page of the original are
+    sent as they are.
+
+    References point to blocks that do not exist yet. `upload_pages()` appends
+    the pages with originals first and fills the references with the IDs
+    returned by Notion before appending the rest of the pages.
+
+    Example
+    -------
+    >>> plan = deduplicate([page_blocks_1, page_blocks_2, page_blocks_3])
+    >>> upload_pages(notion, [page_id_1, page_id_2, page_id_3], plan)
+   """
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+import hashlib
+import json
+
+from blocks import synced_block
+from payload_size import PayloadSizer, split_batches
+from scheduler import MAX_CHILDREN, RateLimiter, call_with_retry
+
+# Blocks that cannot be synchronized
+NOT_SYNCABLE = frozenset(['synced_block', 'child_page', 'child_database'])
+
+# Levels of children Notion accepts in a single append request
+MAX_NESTING = 2
+
+# Length of a block ID, used to measure references
+_ID_LENGTH = 36
+
+class DedupePlan(NamedTuple):
+    """
+    Pages with repeated content replaced by synced blocks.
+
+    Attributes
+    ----------
+    - `pages`       : List of lists of blocks, in the same order as the input pages.
+    - `originals`   : Dictionary `{page index: [(block index, synced_from), ...]}`
+    with the position of every original synced block. `synced_from` is the
+    dictionary shared by all its references, filled with `resolve()`.
+    - `saved_bytes` : Bytes of the pages not sent thanks to the references.
+    - `saved_blocks`: Blocks not created thanks to the references.
+    """
+    pages           : list
+    originals       : dict
+    saved_bytes     : int
+    saved_blocks    : int
+
+    def resolve(
+        self,
+        page_index  : int,
+        block_ids   : list) -> None:
+        """
+        Fill the references to the originals of a page once it is appended.
+
+        Parameters
+        ----------
+        - `page_index`  : Index of the appended page.
+        - `block_ids`   : IDs of the top-level blocks created in the page, in order.
+        """
+        for block_index, synced_from in self.originals.get(page_index, ()):
+            synced_from['block_id'] = block_ids[block_index]
+
+def structural_hash(
+    notion_block    : dict) -> bytes:
+    """
+    Hash of the whole content of a block, independent of the key order.
+
+    Parameters
+    ----------
+    - `notion_block`: Notion block.
+
+    Returns
+    -------
+    16-byte digest. Identical blocks have identical digests.
+    """
+    encoded = json.dumps(notion_block, sort_keys = True, separators = (',', ':'), ensure_ascii = False)
+    return hashlib.blake2b(encoded.encode('utf-8', 'surrogatepass'), digest_size = 16).digest()
+
+def _syncable(
+    notion_block    : dict) -> bool:
+    """
+    Whether a block can be a child of an original synced block sent in one request.
+    """
+    stack = [(notion_block, 1)]
+    while stack:
+        block, level = stack.pop()
+        block_type = block.get('type')
+        if block_type in NOT_SYNCABLE:
+            return False
+        content  = block.get(block_type)
+        children = content.get('children') if isinstance(content, dict) else None
+        if children:
+            # The synced block itself takes one level of nesting
+            if level >= MAX_NESTING or len(children) > MAX_CHILDREN:
+                return False
+            stack.extend((child, level + 1) for child in children)
+    return True
+
+def _runs(
+    keys    : list,
+    shared  : set) -> list:
+    """
+    Split the indexes of the blocks of a page in runs of consecutive shared blocks.
+    Blocks that are not shared are returned as runs of `None`.
+    """
+    runs    = []
+    current = []
+    for index, key in enumerate(keys):
+        if key in shared and len(current) < MAX_CHILDREN:
+            current.append(index)
+            continue
+        if current:
+            runs.append(current)
+            current = []
+        if key in shared:
+            current.append(index)
+        else:
+            runs.append(None)
+    if current:
+        runs.append(current)
+    return runs
+
+def deduplicate(
+    pages       : list,
+    min_count   : int           = 2,
+    sizer       : PayloadSizer  = None) -> DedupePlan:
+    """
+    Replace top-level blocks repeated across pages with synced blocks.
+
+    Parameters
+    ----------
+    - `pages`       : List of lists of Notion blocks, one list per page.
+    - `min_count`   : Minimum number of pages with a copy to synchronize a block.
+    - `sizer`       : Sizer (and cache) used to measure the blocks.
+
+    Returns
+    -------
+    A `DedupePlan`. Input blocks are not modified, but they are shared with the
+    plan pages.
+    """
+    sizer       = sizer if sizer is not None else PayloadSizer()
+    reference   = sizer.size(synced_block(synced_from = "0" * _ID_LENGTH))
+    wrapper     = sizer.size(synced_block(children = []))
+
+    # Hash every syncable block and count the copies
+    keys    = [[structural_hash(block) if _syncable(block) else None for block in blocks] for blocks in pages]
+    counts  = Counter(key for page_keys in keys for key in page_keys if key is not None)
+    shared  = {key for key, count in counts.items() if count >= min_count}
+
+    # Group runs of consecutive shared blocks, then count runs and single blocks
+    page_runs   = [_runs(page_keys, shared) for page_keys in keys]
+    run_counts  = Counter(
+        tuple(page_keys[index] for index in run)
+        for page_keys, runs in zip(keys, page_runs) for run in runs if run is not None
+    )
+
+    def unit_size(blocks : list) -> int:
+        return sum(sizer.size(block) for block in blocks) + (len(blocks) - 1) * sizer._item
+
+    def worth(blocks : list, count : int) -> bool:
+        return count >= min_count and (count - 1) * (unit_size(blocks) - reference) - wrapper > 0
+
+    # Split repeated runs that are not worth synchronizing into single blocks
+    units = []  # Per page: list of (start, end, key) or None for blocks kept as they are
+    for blocks, page_keys, runs in zip(pages, keys, page_runs):
+        page_units = []
+        for run in runs:
+            if run is None:
+                page_units.append(None)
+                continue
+            run_key = tuple(page_keys[index] for index in run)
+            if len(run) > 1 and worth([blocks[index] for index in run], run_counts[run_key]):
+                page_units.append((run[0], run[-1] + 1, run_key))
+            else:
+                page_units.extend((index, index + 1, (page_keys[index],)) for index in run)
+        units.append(page_units)
+
+    # Copies inside the page of the original are not referenced, so count pages
+    unit_counts = Counter(
+        key for page_units in units
+        for key in {unit[2] for unit in page_units if unit is not None}
+    )
+
+    # Rebuild every page with originals and references
+    sources         = {}    # Unit key -> (page of the original, synced_from shared by its references)
+    originals       = {}
+    new_pages       = []
+    saved_bytes     = 0
+    saved_blocks    = 0
+    for page_index, (blocks, page_units) in enumerate(zip(pages, units)):
+        new_blocks  = []
+        position    = 0
+        for unit in page_units:
+            if unit is None:
+                new_blocks.append(blocks[position])
+                position += 1
+                continue
+            start, end, key = unit
+            position        = end
+            unit_blocks     = blocks[start:end]
+            if not worth(unit_blocks, unit_counts[key]):
+                new_blocks.extend(unit_blocks)
+                continue
+
+            source_page, synced_from = sources.get(key, (None, None))
+            if synced_from is None:
+                synced_from = {'block_id': None}
+                sources[key] = (page_index, synced_from)
+                originals.setdefault(page_index, []).append((len(new_blocks), synced_from))
+                new_blocks.append(synced_block(children = list(unit_blocks)))
+                saved_bytes     -= wrapper
+                saved_blocks    -= 1
+                continue
+            if source_page == page_index:
+                # The original has no ID until the whole page is appended
+                new_blocks.extend(unit_blocks)
+                continue
+
+            block_reference = synced_block(synced_from = "")
+            block_reference['synced_block']['synced_from'] = synced_from
+            new_blocks.append(block_reference)
+            saved_bytes     += unit_size(unit_blocks) - reference
+            saved_blocks    += _count_blocks(unit_blocks) - 1
+        new_pages.append(new_blocks)
+
+    return DedupePlan(new_pages, originals, saved_bytes, saved_blocks)
+
+def _count_blocks(
+    notion_blocks   : list) -> int:
+    """
+    Number of blocks of a list, including nested children.
+    """
+    total = 0
+    stack = list(notion_blocks)
+    while stack:
+        block = stack.pop()
+        total += 1
+        content = block.get(block.get('type'))
+        if isinstance(content, dict) and content.get('children'):
+            stack.extend(content['children'])
+    return total
+
+def upload_pages(
+    notion,
+    parent_ids  : list,
+    plan        : DedupePlan,
+    jobs        : int           = 3,
+    limiter     : RateLimiter   = None) -> list:
+    """
+    Append the pages of a plan, resolving the synced block references.
+    Pages with original synced blocks are appended first, in order, and the
+    rest concurrently.
+
+    Parameters
+    ----------
+    - `notion`      : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `parent_ids`  : IDs of the page or block to append every page to.
+    - `plan`        : Plan created with `deduplicate()`.
+    - `jobs`        : Number of pages appended at the same time.
+    - `limiter`     : Rate limiter shared by all requests. A new `RateLimiter()`
+    is used if `None`.
+
+    Returns
+    -------
+    List with the IDs of the top-level blocks created in every page.
+    """
+    if len(parent_ids) != len(plan.pages):
+        print(f"Expected {len(plan.pages)} parent IDs, got {len(parent_ids)}")
+        return None
+    limiter = limiter if limiter is not None else RateLimiter()
+    sizer   = PayloadSizer()
+
+    def append(page_index : int) -> list:
+        block_ids = []
+        for batch in split_batches(plan.pages[page_index], sizer = sizer):
+            response = call_with_retry(
+                notion.blocks.children.append, parent_ids[page_index],
+                children        = batch,
+                endpoint_class  = 'append',
+                limiter         = limiter
+            )
+            block_ids.extend(block['id'] for block in response['results'])
+        plan.resolve(page_index, block_ids)
+        return block_ids
+
+    results = [None] * len(plan.pages)
+    for page_index in sorted(plan.originals):
+        results[page_index] = append(page_index)
+
+    remaining = [index for index in range(len(plan.pages)) if results[index] is None]
+    with ThreadPoolExecutor(max_workers = jobs, thread_name_prefix = "notion-dedupe") as executor:
+        for page_index, block_ids in zip(remaining, executor.map(append, remaining)):
+            results[page_index] = block_ids
+    return results
+
+
+if __name__ == "__main__":
+    #****************************************
+    #* MEASURE BYTES AND BLOCKS SAVED
+    #****************************************
+    import blocks
+
+    def footer():
+        return [
+            blocks.divider(),
+            blocks.paragraph("This page is generated automatically. Do not edit it by hand."),
+            blocks.callout(icon_type = 'emoji', icon_str = "⚠️", content = "Internal use only. " * 10),
+            blocks.bulleted_list_item("Home"),
+            blocks.bulleted_list_item("Reports"),
+        ]
+
+    pages = [[blocks.heading(1, f"Report {index}"), blocks.paragraph(f"Body of report {index}")] + footer() for index in range(1000)]
+    sizer = PayloadSizer()
+    plan  = deduplicate(pages, sizer = sizer)
+    before = sum(sizer.children_payload_size(page) for page in pages)
+    print(f"Synced blocks      : {sum(len(page_originals) for page_originals in plan.originals.values())} original(s)")
+    print(f"Bytes              : {before} -> {before - plan.saved_bytes} ({plan.saved_bytes / before:.0%} saved)")
+    print(f"Blocks created     : {sum(_count_blocks(page) for page in pages)} -> {sum(_count_blocks(page) for page in plan.pages)}")
@@ -19,18 +19,39 @@
    """
 
 from typing import List
-import dropbox
-from dropbox import exceptions, sharing
 import os
 
+import instrumentation
+
+# Dropbox SDK, imported when the first client is created (see `_load_dropbox()`)
+dropbox = None
+
+def _load_dropbox():
+    """
+    Import the Dropbox SDK on first use, so importing this module stays cheap.
+    """
+    global dropbox
+    if dropbox is None:
+        import dropbox as dropbox_module
+        dropbox = dropbox_module
+    return dropbox
+
 class DropboxClient():
 
-    def __init__(self, APP_TOKEN) -> None:
-        self.dbx = self.__authenticate(APP_TOKEN)   # Dropbox connection
+    def __init__(self, APP_TOKEN, session = None) -> None:
+        """
+        Parameters
+        ----------
+        - `APP_TOKEN`:  Dropbox app token.
+        - `session`:    `requests` session to reuse its connections (e.g. shared
+        by several clients, see `client_pool.py`), or `None` for a new one.
+        """
+        _load_dropbox()
+        self.dbx = self.__authenticate(APP_TOKEN, session)   # Dropbox connection
     
-    def __authenticate(self, APP_TOKEN):
+    def __authenticate(self, APP_TOKEN, session):
         try:
-            return dropbox.Dropbox(APP_TOKEN)
+            return dropbox.Dropbox(APP_TOKEN, session = session)
 
         except dropbox.auth.AuthError as err:
             print(err)
@@ -74,9 +95,52 @@ class DropboxClient():
                 path        = f"{path}",
                 autorename  = autorename
             )
-        except exceptions.ApiError as err:
+        except dropbox.exceptions.ApiError as err:
             print(f"Error creating folder {path}. See error for details:\n{err}")
 
+    def upload_file(
+        self,
+        local_path      : str,
+        dropbox_path    : str) -> str:
+        """
+        Uploads a single local file to a Dropbox path (overwriting it) and
+        returns its raw shared link.
+
+        Parameters
+        ----------
+        - `local_path`:     Path of the local file to upload.
+        - `dropbox_path`:   Path of the file in the user's Dropbox.
+
+        Returns
+        -------
+        Raw shared link URL of the uploaded file or `None` if it failed.
+        """
+        try:
+            print(f"Uploading local file ({local_path}) to ({dropbox_path})")
+            with open(f"{local_path}", 'rb' ) as f:
+                data = f.read()
+            with instrumentation.stage("dropbox.upload", endpoint = "files_upload", nbytes = len(data)):
+                self.dbx.files_upload(f=data, path=dropbox_path, mode=dropbox.files.WriteMode.overwrite, mute=True)
+
+        except dropbox.exceptions.ApiError as err:
+            print(f"Uploading file {local_path} failed with error: {err}")
+
+        # Get file URL
+        try:
+            with instrumentation.stage("dropbox.share", endpoint = "sharing_create_shared_link_with_settings"):
+                shared_link_metadata = self.dbx.sharing_create_shared_link_with_settings(dropbox_path)
+            return self.get_raw_url(shared_link_metadata.url)
+
+        except dropbox.exceptions.ApiError as err:
+            # Check if file share link already exists
+            if err.error.is_shared_link_already_exists():
+                print(f"\tError: Shared link already exists! Returning existing shared link...")
+                shared_link_exists : 'dropbox.sharing.SharedLinkAlreadyExistsMetadata' = err.error.get_shared_link_already_exists()
+                if shared_link_exists.is_metadata():
+                    shared_link_metadata = shared_link_exists.get_metadata()
+                    return self.get_raw_url(shared_link_metadata.url)
+        return None
+
     def upload_all_files(
         self,
         dropbox_dir : str,
@@ -127,39 +191,15 @@ class DropboxClient():
 
                 # Check if file extension is supported
                 if f".{file.split('.')[-1]}" in extension_support:
-                    try:
-                        print(f"Uploading local file ({abs_file}) to ({dropbox_dir}/{folder_dir}/{file})")
-                        with open(f"{abs_file}", 'rb' ) as f:
-                            self.dbx.files_upload(f=f.read(), path=f"{dropbox_dir}/{folder_dir}/{file}", mode=dropbox.files.WriteMode.overwrite, mute=True)
-
-                    except exceptions.ApiError as err:
-                        print(f"Uploading file {file} failed with error: {err}")
-                    
-                    # Get file URL
-                    try:
-                        shared_link_metadata = self.dbx.sharing_create_shared_link_with_settings(f"{dropbox_dir}/{folder_dir}/{file}")
-                        file_url = self.get_raw_url(shared_link_metadata.url)
-                        # Create key in dictionary with file name and raw URL as value
-                        if file not in raw_urls: 
-                            raw_urls[file] = file_url
-                        # If key exists, then just append the raw URL
-                        else:
-                            raw_urls[file].append(file_url)
-
-                    except exceptions.ApiError as err:
-                        # Check if file share link already exists
-                        if err.error.is_shared_link_already_exists():
-                            print(f"\tError: Shared link already exists! Returning existing shared link...")
-                            shared_link_exists : sharing.SharedLinkAlreadyExistsMetadata = err.error.get_shared_link_already_exists()
-                            if shared_link_exists.is_metadata():
-                                shared_link_metadata = shared_link_exists.get_metadata()
-                                file_url = self.get_raw_url(shared_link_metadata.url)
-                                # Create key in dictionary with file name and raw URL as value
-                                if file not in raw_urls: 
-                                    raw_urls[file] = file_url
-                                # If key exists, then just append the raw URL
-                                else:
-                                    raw_urls[file].append(file_url)
+                    file_url = self.upload_file(abs_file, f"{dropbox_dir}/{folder_dir}/{file}")
+                    if file_url is None:
+                        continue
+                    # Create key in dictionary with file name and raw URL as value
+                    if file not in raw_urls: 
+                        raw_urls[file] = file_url
+                    # If key exists, then just append the raw URL
+                    else:
+                        raw_urls[file].append(file_url)
         
         return raw_urls
 
@@ -0,0 +1,680 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Export Notion pages to local markdown or HTML files
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file exports Notion pages, and the pages inside them, to a local
+    directory for backups and static sites:
+
+    - Pages are exported concurrently and the children of every level of a page
+    are fetched in parallel, sharing a rate limiter.
+    - Every block type of `blocks.py` is rendered to markdown, using the notation
+    parsed by `markdown_to_notion()` (`#`, `[]`, `>`, `+`, `'`, `**`, `_`, `~`,
+    `` ` ``) and common markdown for the rest, or to HTML. Output is written to
+    disk while blocks are rendered.
+    - Images, videos, files and PDFs are downloaded in parallel to `media/` and
+    linked with relative paths.
+    - A mirror file (`.export_mirror.json`) keeps the `last_edited_time` of every
+    exported page. Exporting again only fetches and renders pages edited since.
+
+    Renderers also accept blocks created locally with `blocks.py`, e.g.
+    `render_markdown(markdown_to_notion(text))`.
+
+    Example
+    -------
+    >>> result = export_pages(notion, [page_id], "backup", format = 'markdown')
+    $ python exporter.py 4a1ddb9c3d08409e9775d1c49212be19 --output backup --format html
+   """
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, NamedTuple
+from urllib.parse import urlsplit
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import threading
+import urllib.request
+
+from blocks import RICH_TEXT_KEYS
+from pagination import fetch_tree
+from scheduler import RateLimiter, call_with_retry
+
+MIRROR_FILE     = ".export_mirror.json"
+MIRROR_VERSION  = 1
+MEDIA_DIR       = "media"
+
+# Block types whose file or URL is downloaded
+MEDIA_TYPES = ('image', 'video', 'file', 'pdf')
+
+# Extensions of the exported files per format
+EXTENSIONS = {
+    'markdown'  : ".md",
+    'html'      : ".html",
+}
+
+#****************************
+#* RICH TEXT AND PROPERTIES
+#****************************
+def _rich_text(
+    data    : dict) -> list:
+    """
+    Rich text of the data of a block, with the old (`text`) or new (`rich_text`) key.
+    """
+    for key in RICH_TEXT_KEYS[:2]:
+        if key in data:
+            return data[key] or []
+    return []
+
+def plain_text(
+    rich_text   : list) -> str:
+    """
+    Text of a list of rich text objects without format.
+    """
+    return "".join(_content(item) for item in rich_text)
+
+def _content(
+    item    : dict) -> str:
+    if 'plain_text' in item:
+        return item['plain_text']
+    if item.get('type') == 'equation' or 'equation' in item:
+        return item['equation']['expression']
+    return item.get('text', {}).get('content', "")
+
+def _href(
+    item    : dict) -> str:
+    link = item.get('text', {}).get('link')
+    return item.get('href') or (link or {}).get('url')
+
+def page_title(
+    page    : dict) -> str:
+    """
+    Title of a page returned by the Notion API, or `Untitled`.
+    """
+    for value in page.get('properties', {}).values():
+        if value.get('type') == 'title' or 'title' in value:
+            title = plain_text(value.get('title', []))
+            if title:
+                return title
+    return "Untitled"
+
+def _media_url(
+    data    : dict) -> str:
+    """
+    URL of an external or Notion hosted file.
+    """
+    source = data.get(data.get('type', 'external')) or data.get('external') or data.get('file') or {}
+    return source.get('url')
+
+#****************************
+#* RENDERERS
+#****************************
+class MarkdownRenderer():
+    """
+    Render Notion blocks to markdown, one line per block as `markdown_to_notion()`
+    expects. Children are indented two spaces per level.
+
+    Parameters
+    ----------
+    - `link`    : Function returning the URL to write for a media URL (e.g. a
+    local path), or `None` to keep it.
+    - `pages`   : Dictionary `{child page ID: file name}` to link child pages.
+    """
+
+    def __init__(
+        self,
+        link    = None,
+        pages   : dict  = None) -> None:
+        self.link   = link if link is not None else (lambda url: url)
+        self.pages  = pages if pages is not None else {}
+
+    def text(
+        self,
+        rich_text   : list) -> str:
+        parts = []
+        for item in rich_text:
+            content = _content(item)
+            if not content:
+                continue
+            if item.get('type') == 'equation' or 'equation' in item:
+                parts.append(f"${content}$")
+                continue
+            annotations = item.get('annotations') or {}
+            # Delimiters must be next to the text, so spaces are kept outside
+            stripped    = content.strip()
+            if stripped:
+                start   = content[:len(content) - len(content.lstrip())]
+                end     = content[len(content.rstrip()):]
+                if annotations.get('code'):             stripped = f"`{stripped}`"
+                if annotations.get('strikethrough'):    stripped = f"~{stripped}~"
+                if annotations.get('italic'):           stripped = f"_{stripped}_"
+                if annotations.get('bold'):             stripped = f"**{stripped}**"
+                href = _href(item)
+                if href:
+                    stripped = f"[{stripped}]({href})"
+                content = f"{start}{stripped}{end}"
+            parts.append(content)
+        return "".join(parts)
+
+    def render(
+        self,
+        notion_blocks   : list,
+        depth           : int = 0) -> Iterator[str]:
+        """
+        Render a list of blocks.
+
+        Returns
+        -------
+        Iterator of lines with their line break.
+        """
+        indent  = "  " * depth
+        number  = 0
+        for block in notion_blocks:
+            block_type  = block.get('type')
+            data        = block.get(block_type) or {}
+            number      = number + 1 if block_type == 'numbered_list_item' else 0
+            line        = self._line(block, number)
+            if line is not None:
+                for part in line.split("\n"):
+                    yield f"{indent}{part}\n"
+            children = data.get('children')
+            if children and block_type != 'table':
+                yield from self.render(children, depth + (0 if block_type in ('synced_block', 'column_list', 'column') else 1))
+
+    def _line(
+        self,
+        block       : dict,
+        number      : int) -> str:
+        """
+        Markdown of a block without its children, or `None` to write nothing.
+        """
+        block_type  = block.get('type')
+        data        = block.get(block_type) or {}
+        text        = self.text(_rich_text(data))
+        if block_type == 'paragraph':
+            return text
+        # `markdown_to_notion()` keeps the space after the notation in the text
+        text = text.lstrip()
+        if block_type in ('heading_1', 'heading_2', 'heading_3'):
+            return f"{'#' * int(block_type[-1])} {text}"
+        if block_type == 'bulleted_list_item':
+            return f"+ {text}"
+        if block_type == 'numbered_list_item':
+            return f"{number}. {text}"
+        if block_type == 'to_do':
+            return f"[{'x' if data.get('checked') else ''}] {text}"
+        if block_type == 'toggle':
+            return f"> {text}"
+        if block_type == 'quote':
+            return f"' {text}"
+        if block_type == 'callout':
+            icon = (data.get('icon') or {}).get('emoji')
+            return f"' {icon} {text}" if icon else f"' {text}"
+        if block_type == 'code':
+            return f"```{data.get('language', '')}\n{plain_text(_rich_text(data))}\n```"
+        if block_type == 'equation':
+            return f"$${data.get('expression', '')}$$"
+        if block_type == 'divider':
+            return "---"
+        if block_type == 'image':
+            return f"![{plain_text(data.get('caption', []))}]({self.link(_media_url(data))})"
+        if block_type in MEDIA_TYPES or block_type in ('bookmark', 'embed'):
+            url     = data.get('url') or _media_url(data)
+            label   = plain_text(data.get('caption', [])) or text or url
+            return f"[{label}]({self.link(url) if block_type in MEDIA_TYPES else url})"
+        if block_type == 'child_page':
+            return f"[{data.get('title', '')}]({self.pages.get(block.get('id'), '')})"
+        if block_type == 'child_database':
+            return data.get('title', '')
+        if block_type == 'table':
+            return self._table(data)
+        return None
+
+    def _table(
+        self,
+        data    : dict) -> str:
+        rows = [
+            [self.text(cell).replace("|", "\\|") for cell in row.get('table_row', {}).get('cells', [])]
+            for row in data.get('children', [])
+        ]
+        if not rows:
+            return ""
+        width = max(len(row) for row in rows)
+        lines = [f"| {' | '.join(row + [''] * (width - len(row)))} |" for row in rows]
+        lines.insert(1, f"|{'---|' * width}")
+        return "\n".join(lines)
+
+class HtmlRenderer(MarkdownRenderer):
+    """
+    Render Notion blocks to HTML. Consecutive list items are grouped in lists.
+    See `MarkdownRenderer` for the parameters.
+    """
+
+    _tags = {
+        'paragraph'     : "p",
+        'heading_1'     : "h1",
+        'heading_2'     : "h2",
+        'heading_3'     : "h3",
+        'quote'         : "blockquote",
+        'callout'       : "aside",
+    }
+
+    def text(
+        self,
+        rich_text   : list) -> str:
+        parts = []
+        for item in rich_text:
+            content = html.escape(_content(item))
+            if item.get('type') == 'equation' or 'equation' in item:
+                parts.append(f'<span class="equation">{content}</span>')
+                continue
+            annotations = item.get('annotations') or {}
+            for key, tag in (('code', "code"), ('strikethrough', "s"), ('underline', "u"), ('italic', "em"), ('bold', "strong")):
+                if annotations.get(key):
+                    content = f"<{tag}>{content}</{tag}>"
+            href = _href(item)
+            if href:
+                content = f'<a href="{html.escape(href)}">{content}</a>'
+            parts.append(content)
+        return "".join(parts)
+
+    def render(
+        self,
+        notion_blocks   : list,
+        depth           : int = 0) -> Iterator[str]:
+        list_tag = None
+        for block in notion_blocks:
+            block_type  = block.get('type')
+            data        = block.get(block_type) or {}
+            tag         = {'bulleted_list_item': "ul", 'numbered_list_item': "ol", 'to_do': "ul"}.get(block_type)
+            if tag != list_tag:
+                if list_tag:
+                    yield f"</{list_tag}>\n"
+                if tag:
+                    yield f"<{tag}>\n"
+                list_tag = tag
+            yield from self._block(block, depth)
+        if list_tag:
+            yield f"</{list_tag}>\n"
+
+    def _block(
+        self,
+        block       : dict,
+        depth       : int) -> Iterator[str]:
+        block_type  = block.get('type')
+        data        = block.get(block_type) or {}
+        text        = self.text(_rich_text(data))
+        children    = data.get('children') or []
+        if block_type in self._tags:
+            tag = self._tags[block_type]
+            if block_type == 'callout' and (data.get('icon') or {}).get('emoji'):
+                text = f"{data['icon']['emoji']} {text}"
+            yield f"<{tag}>{text}</{tag}>\n"
+            yield from self.render(children, depth + 1)
+        elif block_type in ('bulleted_list_item', 'numbered_list_item', 'to_do'):
+            if block_type == 'to_do':
+                text = f'<input type="checkbox" disabled{" checked" if data.get("checked") else ""}> {text}'
+            yield f"<li>{text}"
+            if children:
+                yield "\n"
+                yield from self.render(children, depth + 1)
+            yield "</li>\n"
+        elif block_type == 'toggle':
+            yield f"<details><summary>{text}</summary>\n"
+            yield from self.render(children, depth + 1)
+            yield "</details>\n"
+        elif block_type == 'code':
+            yield f'<pre><code class="language-{html.escape(data.get("language", ""))}">{html.escape(plain_text(_rich_text(data)))}</code></pre>\n'
+        elif block_type == 'equation':
+            yield f'<div class="equation">{html.escape(data.get("expression", ""))}</div>\n'
+        elif block_type == 'divider':
+            yield "<hr>\n"
+        elif block_type in MEDIA_TYPES or block_type in ('bookmark', 'embed'):
+            url     = data.get('url') or _media_url(data)
+            url     = self.link(url) if block_type in MEDIA_TYPES else url
+            caption = self.text(data.get('caption', []))
+            if block_type == 'image':
+                yield f'<figure><img src="{html.escape(url)}" alt="{html.escape(plain_text(data.get("caption", [])))}">'
+                yield f"<figcaption>{caption}</figcaption></figure>\n" if caption else "</figure>\n"
+            elif block_type == 'video':
+                yield f'<video controls src="{html.escape(url)}"></video>\n'
+            else:
+                yield f'<p><a href="{html.escape(url)}">{caption or text or html.escape(url)}</a></p>\n'
+        elif block_type == 'child_page':
+            yield f'<p><a href="{html.escape(self.pages.get(block.get("id"), ""))}">{html.escape(data.get("title", ""))}</a></p>\n'
+        elif block_type == 'child_database':
+            yield f"<p>{html.escape(data.get('title', ''))}</p>\n"
+        elif block_type == 'table':
+            yield "<table>\n"
+            for count, row in enumerate(children):
+                cell_tag = "th" if count == 0 and data.get('has_column_header') else "td"
+                cells    = "".join(f"<{cell_tag}>{self.text(cell)}</{cell_tag}>" for cell in row.get('table_row', {}).get('cells', []))
+                yield f"<tr>{cells}</tr>\n"
+            yield "</table>\n"
+        elif block_type in ('synced_block', 'column_list', 'column'):
+            yield from self.render(children, depth)
+
+RENDERERS = {
+    'markdown'  : MarkdownRenderer,
+    'html'      : HtmlRenderer,
+}
+
+def render_markdown(
+    notion_blocks   : list) -> str:
+    """
+    Render a list of Notion blocks (with children) to markdown.
+    """
+    return "".join(MarkdownRenderer().render(notion_blocks))
+
+def render_html(
+    notion_blocks   : list) -> str:
+    """
+    Render a list of Notion blocks (with children) to an HTML fragment.
+    """
+    return "".join(HtmlRenderer().render(notion_blocks))
+
+#****************************
+#* EXPORT
+#****************************
+class ExportResult(NamedTuple):
+    """
+    Summary of an export.
+    """
+    exported    : list      # IDs of rendered pages
+    unchanged   : list      # IDs of pages not edited since the last export
+    failed      : dict      # Page ID -> error message
+    media       : int       # Number of downloaded media files
+
+def _child_pages(
+    notion_blocks   : list) -> list:
+    """
+    `child_page` blocks of a fetched tree at any depth (also inside toggles,
+    columns or synced blocks), in document order.
+    """
+    found = []
+    stack = list(reversed(notion_blocks))
+    while stack:
+        block       = stack.pop()
+        block_type  = block.get('type')
+        if block_type == 'child_page':
+            found.append(block)
+        content = block.get(block_type)
+        if isinstance(content, dict) and content.get('children'):
+            stack.extend(reversed(content['children']))
+    return found
+
+def _slug(
+    title   : str) -> str:
+    slug = re.sub(r'[^\w\-]+', '-', title.strip().lower(), flags = re.UNICODE).strip('-')
+    return slug[:60] or "untitled"
+
+def _download(
+    url     : str,
+    path    : str) -> None:
+    """
+    Download a URL to a file, written atomically.
+    """
+    temporary = f"{path}.part"
+    with urllib.request.urlopen(url, timeout = 60) as response, open(temporary, 'wb') as file:
+        shutil.copyfileobj(response, file, 1 << 20)
+    os.replace(temporary, path)
+
+class Exporter():
+    """
+    Export pages and their child pages to a directory. See `export_pages()`.
+    """
+
+    def __init__(
+        self,
+        notion,
+        output_dir      : str,
+        format          : str           = 'markdown',
+        jobs            : int           = 4,
+        limiter         : RateLimiter   = None,
+        download_media  : bool          = True,
+        force           : bool          = False,
+        download                        = _download) -> None:
+        if format not in RENDERERS:
+            raise ValueError(f"Unsupported format {format}. Supported formats are: {sorted(RENDERERS)}")
+        self.notion         = notion
+        self.output_dir     = output_dir
+        self.format         = format
+        self.limiter        = limiter if limiter is not None else RateLimiter()
+        self.download_media = download_media
+        self.force          = force
+        self.download       = download
+
+        self._mirror_path   = os.path.join(output_dir, MIRROR_FILE)
+        self._mirror        = self._load_mirror()
+        self._lock          = threading.Lock()
+        self._media         = {}        # Relative path -> Future of its download
+        self._pages         = ThreadPoolExecutor(max_workers = jobs, thread_name_prefix = "export-page")
+        self._fetcher       = ThreadPoolExecutor(max_workers = jobs, thread_name_prefix = "export-fetch")
+        self._downloader    = ThreadPoolExecutor(max_workers = jobs, thread_name_prefix = "export-media")
+
+    def _load_mirror(self) -> dict:
+        try:
+            with open(self._mirror_path, encoding = 'utf-8') as file:
+                mirror = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if mirror.get('version') != MIRROR_VERSION or mirror.get('format') != self.format:
+            return {}
+        return mirror.get('pages', {})
+
+    def _save_mirror(self) -> None:
+        temporary = f"{self._mirror_path}.tmp"
+        with open(temporary, 'w', encoding = 'utf-8') as file:
+            json.dump({'version': MIRROR_VERSION, 'format': self.format, 'pages': self._mirror}, file, indent = 1)
+        os.replace(temporary, self._mirror_path)
+
+    def fetch_tree(
+        self,
+        page_id     : str) -> list:
+        """
+        Fetch the blocks of a page with their children. See `pagination.fetch_tree()`.
+        """
+        return fetch_tree(self.notion, page_id, self.limiter, self._fetcher)
+
+    def _link_media(
+        self,
+        url     : str) -> str:
+        """
+        Start downloading a media URL (once) and return its path relative to the pages.
+        """
+        if not url or not self.download_media:
+            return url
+        # Notion hosted URLs are signed: the query changes on every request
+        parts       = urlsplit(url)
+        extension   = os.path.splitext(parts.path)[1][:10]
+        name        = hashlib.sha1(f"{parts.netloc}{parts.path}".encode('utf-8')).hexdigest()[:16] + extension
+        relative    = f"{MEDIA_DIR}/{name}"
+        path        = os.path.join(self.output_dir, MEDIA_DIR, name)
+        with self._lock:
+            if relative not in self._media:
+                if os.path.exists(path):
+                    self._media[relative] = None
+                else:
+                    self._media[relative] = self._downloader.submit(self.download, url, path)
+        return relative
+
+    def _file_name(
+        self,
+        page_id : str,
+        title   : str) -> str:
+        return f"{_slug(title)}-{page_id.replace('-', '')[:8]}{EXTENSIONS[self.format]}"
+
+    def export_page(
+        self,
+        page_id : str,
+        result  : ExportResult) -> list:
+        """
+        Export a page if it changed since the last export.
+
+        Returns
+        -------
+        IDs of its child pages.
+        """
+        page    = call_with_retry(self.notion.pages.retrieve, page_id, endpoint_class = 'query', limiter = self.limiter)
+        edited  = page.get('last_edited_time')
+        with self._lock:
+            entry = self._mirror.get(page_id)
+        if (not self.force and entry and entry.get('last_edited_time') == edited
+                and os.path.exists(os.path.join(self.output_dir, entry['file']))):
+            result.unchanged.append(page_id)
+            return entry.get('children', [])
+
+        title           = page_title(page)
+        file_name       = self._file_name(page_id, title)
+        notion_blocks   = self.fetch_tree(page_id)
+        child_pages     = _child_pages(notion_blocks)
+        children        = [block['id'] for block in child_pages]
+        renderer        = RENDERERS[self.format](
+            link    = self._link_media,
+            pages   = {block['id']: self._file_name(block['id'], block['child_page'].get('title', "")) for block in child_pages}
+        )
+
+        path        = os.path.join(self.output_dir, file_name)
+        temporary   = f"{path}.tmp"
+        with open(temporary, 'w', encoding = 'utf-8') as file:
+            if self.format == 'html':
+                file.write(f'<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>{html.escape(title)}</title></head>\n<body>\n<h1>{html.escape(title)}</h1>\n')
+            else:
+                file.write(f"# {title}\n")
+            for part in renderer.render(notion_blocks):
+                file.write(part)
+            if self.format == 'html':
+                file.write("</body>\n</html>\n")
+        os.replace(temporary, path)
+
+        with self._lock:
+            old = self._mirror.get(page_id)
+            if old and old['file'] != file_name and os.path.exists(os.path.join(self.output_dir, old['file'])):
+                os.remove(os.path.join(self.output_dir, old['file']))
+            self._mirror[page_id] = {'last_edited_time': edited, 'file': file_name, 'title': title, 'children': children}
+        result.exported.append(page_id)
+        return children
+
+    def export(
+        self,
+        page_ids    : list) -> ExportResult:
+        """
+        Export pages and, recursively, their child pages.
+        """
+        os.makedirs(os.path.join(self.output_dir, MEDIA_DIR), exist_ok = True)
+        result  = ExportResult([], [], {}, 0)
+        seen    = set(page_ids)
+        pending = {self._pages.submit(self.export_page, page_id, result): page_id for page_id in page_ids}
+        while pending:
+            done, _ = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                page_id = pending.pop(future)
+                try:
+                    children = future.result()
+                except Exception as err:
+                    result.failed[page_id] = str(err)
+                    continue
+                for child_id in children:
+                    if child_id not in seen:
+                        seen.add(child_id)
+                        pending[self._pages.submit(self.export_page, child_id, result)] = child_id
+
+        downloaded = 0
+        for relative, future in list(self._media.items()):
+            if future is None:
+                continue
+            try:
+                future.result()
+                downloaded += 1
+            except Exception as err:
+                result.failed[relative] = str(err)
+        self._save_mirror()
+        return result._replace(media = downloaded)
+
+    def close(self) -> None:
+        for executor in (self._pages, self._fetcher, self._downloader):
+            executor.shutdown()
+
+def export_pages(
+    notion,
+    page_ids        : list,
+    output_dir      : str,
+    format          : str           = 'markdown',
+    jobs            : int           = 4,
+    limiter         : RateLimiter   = None,
+    download_media  : bool          = True,
+    force           : bool          = False) -> ExportResult:
+    """
+    Export Notion pages and their child pages to a directory.
+
+    Parameters
+    ----------
+    - `notion`          : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `page_ids`        : IDs of the pages to export.
+    - `output_dir`      : Directory of the exported files. Created if it does not exist.
+    - `format`          : `markdown` or `html`.
+    - `jobs`            : Number of pages exported, requests sent and files downloaded concurrently.
+    - `limiter`         : Shared rate limiter. A new `RateLimiter()` is used if `None`.
+    - `download_media`  : Whether to download images, videos, files and PDFs to `media/`.
+    - `force`           : Whether to export pages not edited since the last export too.
+
+    Returns
+    -------
+    `ExportResult` with the exported, unchanged and failed pages.
+    """
+    os.makedirs(output_dir, exist_ok = True)
+    exporter = Exporter(notion, output_dir, format, jobs, limiter, download_media, force)
+    try:
+        return exporter.export(page_ids)
+    finally:
+        exporter.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description = "Export Notion pages and their child pages to markdown or HTML files.")
+    parser.add_argument("pages", nargs = '+', help = "IDs of the pages to export")
+    parser.add_argument("--output", default = "notion_export", help = "Output directory")
+    parser.add_argument("--format", choices = sorted(RENDERERS), default = 'markdown', help = "Format of the exported files")
+    parser.add_argument("--jobs", type = int, default = 4, help = "Concurrent pages, requests and downloads")
+    parser.add_argument("--no-media", action = 'store_true', help = "Link media URLs instead of downloading them")
+    parser.add_argument("--force", action = 'store_true', help = "Export pages that did not change too")
+    parser.add_argument("--rate", type = float, default = 3.0, help = "Maximum Notion requests per second")
+    args = parser.parse_args()
+
+    token = os.environ.get('NOTION_TOKEN')
+    if not token:
+        try:
+            from secrets import NOTION_TOKEN as token
+        except ImportError:
+            token = None
+    if not token:
+        print("Set the NOTION_TOKEN environment variable or add it to secrets.py")
+        sys.exit(1)
+
+    from notion_client import Client
+    result = export_pages(
+        Client(auth = token), args.pages, args.output,
+        format          = args.format,
+        jobs            = args.jobs,
+        limiter         = RateLimiter(rate = args.rate, burst = max(1, int(args.rate))),
+        download_media  = not args.no_media,
+        force           = args.force
+    )
+    print(f"Exported {len(result.exported)} pages, {len(result.unchanged)} unchanged, {result.media} media files downloaded")
+    for item, error in result.failed.items():
+        print(f"Failed {item}: {error}")
+    sys.exit(1 if result.failed else 0)
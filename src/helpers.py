@@ -18,8 +18,25 @@
       
    """
 
-from ctypes import Union
+from types import MappingProxyType
+from typing import Iterator
+import codecs
+import unicodedata
 
+# Read-only annotations used when none are provided
+_NO_ANNOTATIONS = MappingProxyType({})
+
+# Maximum number of characters (UTF-16 code units) of the content of a text object accepted by Notion
+MAX_TEXT_LENGTH = 2000
+
+# Maximum number of rich text objects in a single array accepted by Notion
+MAX_RICH_TEXT_ITEMS = 100
+
+# Characters read at once from files when splitting text
+_READ_SIZE = 1 << 16
+
+# Zero width joiner, used in emoji sequences
+_ZWJ = '\u200d'
 
 def get_page_id(
     link : str) -> str:
@@ -47,7 +64,7 @@ def add_cover(
     -------
     Dictionary with cover object.
     """
-    if isinstance(url, None): return None
+    if url is None: return None
     elif isinstance(url, str): return {
         "type": "external",
         "external": {
@@ -94,7 +111,7 @@ def add_icon(
 def add_rich_text(
     content     : str,
     href        : str   = None,
-    annotations : dict  = {}) -> dict:
+    annotations : dict  = None) -> dict:
     """
     Create rich text object to be appended to a Notion dictionary.
 
@@ -102,12 +119,15 @@ def add_rich_text(
     ----------
     - `content`     : Text for the block
     - `href`        : The URL of any link or internal Notion mention in the text, if any.
-    - `annotations` : All annotations that apply to the rich text
+    - `annotations` : All annotations that apply to the rich text, or `None`.
+    The dictionary is only read, so it can be shared between threads and calls.
 
     Returns
     -------
-    Dictionary with the text object for a Notion dictionary.
+    Dictionary with the text object for a Notion dictionary. Every call returns
+    new dictionaries.
     """
+    annotations = annotations if annotations is not None else _NO_ANNOTATIONS
     return {
         "type": "text",
         "text": {
@@ -115,17 +135,255 @@ def add_rich_text(
             "link": href
         },
         "annotations": {
-            "bold": annotations['bold'] if 'bold' in annotations.keys() else False,
-            "italic": annotations['italic'] if 'italic' in annotations.keys() else False,
-            "strikethrough": annotations['strikethrough'] if 'strikethrough' in annotations.keys() else False,
-            "underline": annotations['underline'] if 'underline' in annotations.keys() else False,
-            "code": annotations['code'] if 'code' in annotations.keys() else False,
-            "color": annotations['color'] if 'color' in annotations.keys() else "default"
+            "bold": annotations.get('bold', False),
+            "italic": annotations.get('italic', False),
+            "strikethrough": annotations.get('strikethrough', False),
+            "underline": annotations.get('underline', False),
+            "code": annotations.get('code', False),
+            "color": annotations.get('color', "default")
         },
         "plain_text": content,
         "href": href
     }
 
+def text_length(
+    content : str) -> int:
+    """
+    Length of a string as counted by Notion (UTF-16 code units): characters
+    outside the Basic Multilingual Plane (e.g. most emojis) count as two.
+    """
+    if content.isascii():
+        return len(content)
+    return len(content.encode('utf-16-le', 'surrogatepass')) // 2
+
+def _extends(
+    character   : str) -> bool:
+    """
+    Whether a character belongs to the grapheme cluster of the previous one.
+    """
+    code = ord(character)
+    return (
+        character == _ZWJ
+        or 0xFE00 <= code <= 0xFE0F             # Variation selectors
+        or 0x1F3FB <= code <= 0x1F3FF           # Emoji skin tone modifiers
+        or 0xE0020 <= code <= 0xE007F           # Tags (subdivision flags)
+        or 0xE0100 <= code <= 0xE01EF           # Variation selectors supplement
+        or 0xDC00 <= code <= 0xDFFF             # Low surrogate of a surrogate pair
+        or (code >= 0x300 and unicodedata.category(character) in ('Mn', 'Me', 'Mc'))
+    )
+
+def _is_boundary(
+    text    : str,
+    index   : int) -> bool:
+    """
+    Whether `text` can be split before `index` without breaking a surrogate
+    pair or a grapheme cluster (combining marks, emoji sequences, flags, CRLF).
+    """
+    previous, current = text[index - 1], text[index]
+    if previous.isascii() and current.isascii():
+        return not (previous == '\r' and current == '\n')
+    if previous == _ZWJ or _extends(current):
+        return False
+    # Flags are pairs of regional indicators
+    if 0x1F1E6 <= ord(current) <= 0x1F1FF and 0x1F1E6 <= ord(previous) <= 0x1F1FF:
+        count = 0
+        while index - count - 1 >= 0 and 0x1F1E6 <= ord(text[index - count - 1]) <= 0x1F1FF:
+            count += 1
+        return count % 2 == 0
+    return True
+
+def _cut(
+    text        : str,
+    start       : int,
+    max_length  : int) -> int:
+    """
+    End index of the longest chunk of `text` from `start` with at most
+    `max_length` UTF-16 code units that ends on a grapheme cluster boundary.
+    """
+    end     = min(start + max_length, len(text))
+    excess  = text_length(text[start:end]) - max_length
+    while excess > 0:
+        end    -= max(1, excess // 2)
+        excess  = text_length(text[start:end]) - max_length
+    if end >= len(text):
+        return end
+
+    boundary = end
+    while boundary > start and not _is_boundary(text, boundary):
+        boundary -= 1
+    if boundary > start:
+        return boundary
+    # A single grapheme cluster longer than `max_length`: only keep surrogate pairs
+    if 0xDC00 <= ord(text[end]) <= 0xDFFF and end - 1 > start:
+        end -= 1
+    return end
+
+def _iter_str_chunks(
+    text        : str,
+    max_length  : int) -> Iterator[str]:
+    start = 0
+    while start < len(text):
+        end = _cut(text, start, max_length)
+        yield text[start:end]
+        start = end
+
+def _iter_decoded(
+    source,
+    encoding    : str) -> Iterator[str]:
+    """
+    Read a file object (text or binary) or a bytes-like object (`bytes`, `mmap`...)
+    in pieces of text.
+    """
+    read    = getattr(source, 'read', None)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    if read is None:
+        view = memoryview(source)
+        for start in range(0, len(view), _READ_SIZE):
+            yield decoder.decode(view[start:start + _READ_SIZE])
+        yield decoder.decode(b"", final = True)
+        return
+
+    while True:
+        data = read(_READ_SIZE)
+        if not data:
+            break
+        yield data if isinstance(data, str) else decoder.decode(data)
+    yield decoder.decode(b"", final = True)
+
+def iter_text_chunks(
+    source,
+    max_length  : int   = MAX_TEXT_LENGTH,
+    encoding    : str   = 'utf-8') -> Iterator[str]:
+    """
+    Split text in chunks accepted by Notion text objects, never splitting a
+    surrogate pair or a grapheme cluster (e.g. an emoji sequence or a letter
+    with combining accents).
+
+    Parameters
+    ----------
+    - `source`      : String, file object (text or binary) or bytes-like object
+    (`bytes`, `mmap`...). Files and buffers are read in pieces, so the whole text
+    is never loaded at once.
+    - `max_length`  : Maximum length of every chunk in UTF-16 code units.
+    - `encoding`    : Encoding of binary files and buffers.
+
+    Returns
+    -------
+    Iterator of strings. Joined, they are equal to the source text.
+    """
+    if isinstance(source, str):
+        yield from _iter_str_chunks(source, max_length)
+        return
+
+    pending = ""
+    for text in _iter_decoded(source, encoding):
+        pending += text
+        start    = 0
+        # Keep text after the last chunk: its cluster may continue in the next piece
+        while len(pending) - start > max_length:
+            end = _cut(pending, start, max_length)
+            yield pending[start:end]
+            start = end
+        pending = pending[start:]
+    if pending:
+        yield from _iter_str_chunks(pending, max_length)
+
+def split_rich_text(
+    content     : str,
+    href        : str   = None,
+    annotations : dict  = None,
+    max_length  : int   = MAX_TEXT_LENGTH) -> list:
+    """
+    Create the rich text objects of a text, split in as many text objects as
+    needed to keep every one under the Notion length limit.
+
+    Parameters
+    ----------
+    - `content`     : Text, file object or bytes-like object (see `iter_text_chunks()`),
+    or `None` for no text.
+    - `href`        : The URL of any link or internal Notion mention in the text, if any.
+    - `annotations` : All annotations that apply to the rich text, or `None`.
+    - `max_length`  : Maximum length of every text object in UTF-16 code units.
+
+    Returns
+    -------
+    List of rich text objects (a single one for short text, none for `None`).
+    """
+    if content is None:
+        return []
+    # Fast path: every character counts at most as two code units
+    if isinstance(content, str) and len(content) * 2 <= max_length:
+        return [add_rich_text(content, href, annotations)]
+    return [add_rich_text(chunk, href, annotations) for chunk in iter_text_chunks(content, max_length)]
+
+def _can_merge(
+    previous    : dict,
+    rich_text   : dict) -> bool:
+    """
+    Whether two text objects only differ in their content.
+    """
+    return (
+        previous.get('type') == 'text' and rich_text.get('type') == 'text'
+        and previous.get('annotations') == rich_text.get('annotations')
+        and previous['text'].get('link') == rich_text['text'].get('link')
+        and previous.get('href') == rich_text.get('href')
+    )
+
+def _merge(
+    runs    : list) -> dict:
+    """
+    Text object with the content of all `runs` (compatible text objects).
+    """
+    first = runs[0]
+    if len(runs) == 1:
+        return first
+    content = "".join(run['text']['content'] for run in runs)
+    merged  = {**first, 'text': {**first['text'], 'content': content}}
+    if 'plain_text' in first:
+        merged['plain_text'] = "".join(run.get('plain_text', run['text']['content']) for run in runs)
+    return merged
+
+def coalesce_rich_text(
+    rich_text   : list,
+    max_length  : int   = MAX_TEXT_LENGTH) -> list:
+    """
+    Merge adjacent text objects with the same annotations and link, and drop
+    the ones without content. Mentions and equations are kept as they are.
+
+    Parameters
+    ----------
+    - `rich_text`   : List of rich text objects (e.g. the `text` of a paragraph block).
+    - `max_length`  : Maximum content length of a merged text object.
+
+    Returns
+    -------
+    New list of rich text objects. Input objects are not modified, and the ones
+    that are not merged are reused.
+    """
+    coalesced   = []
+    runs        = []        # Compatible text objects to merge
+    length      = 0
+    for item in rich_text:
+        if item.get('type') == 'text':
+            content = item['text']['content']
+            if not content:
+                continue
+            if runs and _can_merge(runs[-1], item) and length + text_length(content) <= max_length:
+                runs.append(item)
+                length += text_length(content)
+                continue
+        if runs:
+            coalesced.append(_merge(runs))
+        if item.get('type') == 'text':
+            runs    = [item]
+            length  = text_length(item['text']['content'])
+        else:
+            runs    = []
+            coalesced.append(item)
+    if runs:
+        coalesced.append(_merge(runs))
+    return coalesced
+
 def add_annotations(
     bold            : bool  = False,
     italic          : bool  = False,
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Streaming pretty printer for Notion block trees
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file prints Notion blocks (or any JSON-like value) with indents while
+    walking the tree once, writing to the output stream in chunks instead of
+    building the whole string. Large trees can be limited by block depth,
+    number of items shown per list and length of the strings. Output is
+    coloured when the stream is a terminal.
+
+    Without limits, the output is the same JSON as `json.dumps(tree, indent = 2)`.
+
+    Example
+    -------
+    >>> inspect_block(notion_blocks, max_depth = 1, max_children = 10, max_text = 80)
+   """
+
+from itertools import islice
+from json.encoder import encode_basestring
+from typing import TextIO
+import sys
+
+# ANSI colors used when writing to a terminal
+_COLORS = {
+    'key'       : "\033[34m",   # Blue
+    'string'    : "\033[32m",   # Green
+    'number'    : "\033[36m",   # Cyan
+    'constant'  : "\033[35m",   # Magenta (true, false, null)
+    'hidden'    : "\033[2m",    # Dim
+}
+_RESET = "\033[0m"
+
+# Characters buffered before writing to the stream
+_BUFFER_SIZE = 1 << 16
+
+# Returned by `next()` when a list or dict has no more items
+_END = object()
+
+class _Writer():
+    """
+    Buffered writer with optional ANSI colors.
+    """
+    __slots__ = ('stream', 'color', 'parts', 'size')
+
+    def __init__(self, stream : TextIO, color : bool) -> None:
+        self.stream = stream
+        self.color  = color
+        self.parts  = []
+        self.size   = 0
+
+    def write(self, text : str, kind : str = None) -> None:
+        if kind is not None and self.color:
+            text = f"{_COLORS[kind]}{text}{_RESET}"
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= _BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.stream.write("".join(self.parts))
+        self.parts.clear()
+        self.size = 0
+
+class _Hidden():
+    """
+    Placeholder written instead of the items that are not shown.
+    """
+    __slots__ = ('text',)
+
+    def __init__(self, text : str) -> None:
+        self.text = text
+
+def inspect_block(
+    tree,
+    stream          : TextIO    = None,
+    max_depth       : int       = None,
+    max_children    : int       = None,
+    max_text        : int       = None,
+    color           : bool      = None,
+    indent          : int       = 2) -> None:
+    """
+    Print a Notion block, list of blocks or payload with indents.
+
+    Parameters
+    ----------
+    - `tree`            : Value to print.
+    - `stream`          : Output stream. Defaults to `sys.stdout`.
+    - `max_depth`       : Maximum number of nested `children` levels to show, or `None`.
+    For example, `0` hides all children blocks and `1` only shows direct children.
+    - `max_children`    : Maximum number of items shown per list, or `None`.
+    - `max_text`        : Maximum number of characters shown per string, or `None`.
+    - `color`           : Whether to use ANSI colors. Defaults to `True` only if
+    `stream` is a terminal.
+    - `indent`          : Number of spaces per indentation level.
+    """
+    stream = stream if stream is not None else sys.stdout
+    if color is None:
+        isatty = getattr(stream, 'isatty', None)
+        color  = bool(isatty and isatty())
+    writer  = _Writer(stream, color)
+    spaces  = " " * indent
+
+    def write_scalar(value) -> None:
+        if isinstance(value, str):
+            if max_text is not None and len(value) > max_text:
+                writer.write(encode_basestring(value[:max_text]), 'string')
+                writer.write(f" … (+{len(value) - max_text} chars)", 'hidden')
+            else:
+                writer.write(encode_basestring(value), 'string')
+        elif value is None:
+            writer.write("null", 'constant')
+        elif value is True:
+            writer.write("true", 'constant')
+        elif value is False:
+            writer.write("false", 'constant')
+        elif isinstance(value, (int, float)):
+            writer.write(repr(value) if isinstance(value, int) else float.__repr__(value), 'number')
+        elif isinstance(value, _Hidden):
+            writer.write(value.text, 'hidden')
+        else:
+            writer.write(encode_basestring(repr(value)), 'string')
+
+    def items(value : list) -> list:
+        if max_children is None or len(value) <= max_children:
+            return iter(value)
+        hidden = _Hidden(f"… {len(value) - max_children} more items")
+        return iter(list(islice(value, max_children)) + [hidden])
+
+    # Open a container and return its stack frame, or write it if empty/hidden
+    def open_value(value, level : int, depth : int, key = None):
+        if isinstance(value, dict) and value:
+            writer.write("{")
+            return [iter(value.items()), True, level + 1, depth, True]
+        if isinstance(value, list) and value:
+            if key == 'children' and max_depth is not None and depth >= max_depth:
+                writer.write(f"[… {len(value)} children blocks]", 'hidden')
+                return None
+            writer.write("[")
+            return [items(value), False, level + 1, depth + (key == 'children'), True]
+        if isinstance(value, dict):
+            writer.write("{}")
+        elif isinstance(value, list):
+            writer.write("[]")
+        else:
+            write_scalar(value)
+        return None
+
+    frame = open_value(tree, 0, 0)
+    stack = [frame] if frame is not None else []
+
+    # Every frame is [iterator, is_dict, level, block depth, first item]
+    while stack:
+        frame = stack[-1]
+        iterator, is_dict, level, depth, first = frame
+        item = next(iterator, _END)
+        if item is _END:
+            writer.write("\n" + spaces * (level - 1) + ("}" if is_dict else "]"))
+            stack.pop()
+            continue
+
+        writer.write(("\n" if first else ",\n") + spaces * level)
+        frame[4] = False
+        if is_dict:
+            key, value = item
+            writer.write(encode_basestring(str(key)), 'key')
+            writer.write(": ")
+        else:
+            key, value = None, item
+
+        child = open_value(value, level, depth, key)
+        if child is not None:
+            stack.append(child)
+
+    writer.write("\n")
+    writer.flush()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Lightweight instrumentation for Notion and Dropbox sync jobs
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file includes hooks to measure where the time of a sync job goes:
+    markdown parsing, block building, JSON encoding, Dropbox uploads or Notion
+    HTTP calls. Every measured stage records a call counter, a byte counter and
+    a latency histogram, optionally per API endpoint.
+
+    Instrumentation is disabled by default. While disabled, `stage()` returns
+    a shared no-op context manager and `instrumented()` functions only check
+    a module flag before calling the wrapped function.
+
+    Example
+    -------
+    >>> recorder = instrumentation.enable()
+    >>> with instrumentation.stage("build"):
+    ...     notion_blocks = markdown_to_notion(text)
+    >>> print(recorder.to_prometheus())
+   """
+
+from bisect import bisect_left
+from typing import Callable, NamedTuple
+import functools
+import json
+import re
+import threading
+import time
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+# Notion IDs inside API paths are replaced so every endpoint is a single label
+_id_pattern = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+
+_enabled    = False
+# Hooks are replaced (never modified) so `record()` can iterate them without locks
+_hooks      = ()
+_hooks_lock = threading.Lock()
+
+class Measurement(NamedTuple):
+    """
+    Single observation sent to every registered hook.
+
+    - `stage`   : Name of the measured stage (e.g. `markdown_to_notion`).
+    - `endpoint`: API endpoint of the stage, if any.
+    - `seconds` : Elapsed time or `None` for plain counters.
+    - `nbytes`  : Number of bytes processed by the stage.
+    - `count`   : Number of events this measurement represents.
+    """
+    stage       : str
+    endpoint    : str
+    seconds     : float
+    nbytes      : int
+    count       : int
+
+#**************************
+#* HOOKS AND STAGE TIMING
+#**************************
+def is_enabled() -> bool:
+    """
+    Return whether instrumentation is currently enabled.
+    """
+    return _enabled
+
+def add_hook(
+    hook    : Callable[[Measurement], None]) -> None:
+    """
+    Register a callable that receives every `Measurement`.
+
+    Parameters
+    ----------
+    - `hook`: Callable with a single `Measurement` argument.
+    """
+    global _hooks
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks = _hooks + (hook,)
+
+def remove_hook(
+    hook    : Callable[[Measurement], None]) -> None:
+    """
+    Unregister a hook added with `add_hook()`. Unknown hooks are ignored.
+    """
+    global _hooks
+    with _hooks_lock:
+        _hooks = tuple(registered for registered in _hooks if registered is not hook)
+
+def enable(
+    recorder    : "MetricsRecorder" = None) -> "MetricsRecorder":
+    """
+    Enable instrumentation and register a metrics recorder as hook.
+
+    Parameters
+    ----------
+    - `recorder`: Recorder to use. A new `MetricsRecorder` is created if `None`.
+
+    Returns
+    -------
+    The registered `MetricsRecorder`.
+    """
+    global _enabled
+    if recorder is None:
+        recorder = MetricsRecorder()
+    add_hook(recorder)
+    _enabled = True
+    return recorder
+
+def disable() -> None:
+    """
+    Disable instrumentation and unregister all hooks.
+    """
+    global _enabled, _hooks
+    _enabled = False
+    with _hooks_lock:
+        _hooks = ()
+
+def record(
+    stage_name  : str,
+    seconds     : float = None,
+    nbytes      : int   = 0,
+    endpoint    : str   = None,
+    count       : int   = 1) -> None:
+    """
+    Send a measurement to every hook. Does nothing while disabled.
+
+    Parameters
+    ----------
+    - `stage_name`  : Name of the stage.
+    - `seconds`     : Elapsed time of the stage or `None` to only count events.
+    - `nbytes`      : Number of bytes processed.
+    - `endpoint`    : API endpoint, if any.
+    - `count`       : Number of events represented by the measurement.
+    """
+    if not _enabled:
+        return
+    measurement = Measurement(stage_name, endpoint, seconds, nbytes, count)
+    for hook in _hooks:
+        hook(measurement)
+
+class _Stage():
+    """
+    Context manager returned by `stage()` while instrumentation is enabled.
+    """
+    __slots__ = ('name', 'endpoint', 'nbytes', '_start')
+
+    def __init__(self, name : str, endpoint : str, nbytes : int) -> None:
+        self.name       = name
+        self.endpoint   = endpoint
+        self.nbytes     = nbytes
+
+    def add_bytes(self, nbytes : int) -> None:
+        self.nbytes += nbytes
+
+    def __enter__(self) -> "_Stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        record(self.name, time.perf_counter() - self._start, self.nbytes, self.endpoint)
+
+class _NullStage():
+    """
+    Shared no-op context manager returned by `stage()` while disabled.
+    """
+    __slots__ = ()
+
+    def add_bytes(self, nbytes : int) -> None:
+        pass
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+_null_stage = _NullStage()
+
+def stage(
+    name        : str,
+    endpoint    : str   = None,
+    nbytes      : int   = 0):
+    """
+    Context manager to time a stage of a sync job.
+
+    Parameters
+    ----------
+    - `name`        : Name of the stage.
+    - `endpoint`    : API endpoint, if any.
+    - `nbytes`      : Bytes processed by the stage. More can be added inside the
+    `with` block using `add_bytes()`.
+
+    Example
+    -------
+    >>> with stage("dropbox.upload", endpoint="files_upload") as s:
+    ...     s.add_bytes(len(data))
+    """
+    if not _enabled:
+        return _null_stage
+    return _Stage(name, endpoint, nbytes)
+
+def instrumented(
+    name    : str) -> Callable:
+    """
+    Decorator to time every call of a function as stage `name`.
+    While disabled, the only overhead is a flag check.
+
+    Parameters
+    ----------
+    - `name`: Name of the stage.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def encode_json(
+    payload     : dict,
+    **kwargs) -> str:
+    """
+    Serialize a payload with `json.dumps()` recording the `json.encode` stage
+    with the size of the encoded payload.
+
+    Parameters
+    ----------
+    - `payload` : Dictionary to encode (e.g. the result of `blocks.append_blocks()`).
+    - `kwargs`  : Extra arguments for `json.dumps()`.
+
+    Returns
+    -------
+    The JSON string.
+    """
+    if not _enabled:
+        return json.dumps(payload, **kwargs)
+    start   = time.perf_counter()
+    encoded = json.dumps(payload, **kwargs)
+    record("json.encode", time.perf_counter() - start, len(encoded.encode('utf-8')))
+    return encoded
+
+def endpoint_name(
+    method  : str,
+    path    : str) -> str:
+    """
+    Build an endpoint label from an HTTP method and a Notion API path,
+    replacing IDs so that every page or block shares the same label.
+
+    Example
+    -------
+    >>> endpoint_name("PATCH", "blocks/55793819476e42f5b53d5af5b1c24056/children")
+    'PATCH blocks/{id}/children'
+    """
+    return f"{method.upper()} {_id_pattern.sub('{id}', path)}"
+
+def instrument_client(
+    notion) -> None:
+    """
+    Time every HTTP request made by a `notion_client.Client` as the `notion.http`
+    stage, labelled by endpoint. The request body size is recorded as bytes.
+
+    Parameters
+    ----------
+    - `notion`: Notion client created with `Client(auth = NOTION_TOKEN)`.
+    """
+    request = notion.request
+
+    @functools.wraps(request)
+    def timed_request(path, method, query = None, body = None, auth = None):
+        if not _enabled:
+            return request(path, method, query, body, auth)
+        nbytes = len(json.dumps(body).encode('utf-8')) if body else 0
+        with stage("notion.http", endpoint_name(method, path), nbytes):
+            return request(path, method, query, body, auth)
+
+    notion.request = timed_request
+
+#**********************
+#* METRICS AGGREGATION
+#**********************
+class Histogram():
+    """
+    Fixed-bucket latency histogram compatible with Prometheus histograms.
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets : tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets    = buckets
+        self.counts     = [0] * (len(buckets) + 1)     # Last one is +Inf
+        self.sum        = 0.0
+        self.count      = 0
+
+    def observe(self, value : float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum    += value
+        self.count  += 1
+
+    def cumulative(self) -> list:
+        """
+        Return `(upper_bound, cumulative_count)` pairs, ending with `+Inf`.
+        """
+        pairs   = []
+        total   = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+class MetricsRecorder():
+    """
+    Hook that aggregates measurements into counters, byte counters and
+    latency histograms per stage and endpoint. Safe to use from several threads.
+    """
+
+    def __init__(self, buckets : tuple = DEFAULT_BUCKETS, prefix : str = "notion_sdk") -> None:
+        self.buckets    = tuple(buckets)
+        self.prefix     = prefix
+        self.calls      = {}    # (stage, endpoint) -> number of events
+        self.bytes      = {}    # (stage, endpoint) -> number of bytes
+        self.latency    = {}    # (stage, endpoint) -> Histogram
+        self._lock      = threading.Lock()
+
+    def __call__(self, measurement : Measurement) -> None:
+        key = (measurement.stage, measurement.endpoint)
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + measurement.count
+            if measurement.nbytes:
+                self.bytes[key] = self.bytes.get(key, 0) + measurement.nbytes
+            if measurement.seconds is not None:
+                if key not in self.latency:
+                    self.latency[key] = Histogram(self.buckets)
+                self.latency[key].observe(measurement.seconds)
+
+    def reset(self) -> None:
+        """
+        Drop every aggregated metric.
+        """
+        with self._lock:
+            self.calls.clear()
+            self.bytes.clear()
+            self.latency.clear()
+
+    @staticmethod
+    def _labels(key : tuple, extra : str = "") -> str:
+        stage_name, endpoint = key
+        labels = f'stage="{stage_name}"'
+        if endpoint is not None:
+            labels += ',endpoint="{}"'.format(endpoint.replace('\\', '\\\\').replace('"', '\\"'))
+        return "{" + labels + extra + "}"
+
+    def to_prometheus(self) -> str:
+        """
+        Export metrics using the Prometheus text exposition format.
+
+        Returns
+        -------
+        String with `<prefix>_calls_total`, `<prefix>_bytes_total` and
+        `<prefix>_seconds` histogram metrics.
+        """
+        with self._lock:
+            calls   = sorted(self.calls.items(), key = lambda item: str(item[0]))
+            nbytes  = sorted(self.bytes.items(), key = lambda item: str(item[0]))
+            latency = sorted(((key, hist.cumulative(), hist.sum, hist.count) for key, hist in self.latency.items()), key = lambda item: str(item[0]))
+
+        lines = [
+            f"# HELP {self.prefix}_calls_total Number of calls per stage.",
+            f"# TYPE {self.prefix}_calls_total counter"
+        ]
+        lines += [f"{self.prefix}_calls_total{self._labels(key)} {value}" for key, value in calls]
+
+        lines += [
+            f"# HELP {self.prefix}_bytes_total Number of bytes processed per stage.",
+            f"# TYPE {self.prefix}_bytes_total counter"
+        ]
+        lines += [f"{self.prefix}_bytes_total{self._labels(key)} {value}" for key, value in nbytes]
+
+        lines += [
+            f"# HELP {self.prefix}_seconds Latency per stage.",
+            f"# TYPE {self.prefix}_seconds histogram"
+        ]
+        for key, buckets, total, count in latency:
+            for bound, cumulative in buckets:
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                labels = self._labels(key, f',le="{le}"')
+                lines.append(f"{self.prefix}_seconds_bucket{labels} {cumulative}")
+            lines.append(f"{self.prefix}_seconds_sum{self._labels(key)} {total}")
+            lines.append(f"{self.prefix}_seconds_count{self._labels(key)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self) -> str:
+        """
+        Export metrics as JSON lines, one object per stage and endpoint.
+
+        Returns
+        -------
+        String with one JSON object per line including `calls`, `bytes`,
+        `seconds_sum` and the (non cumulative) histogram `buckets`.
+        """
+        timestamp = time.time()
+        with self._lock:
+            keys    = sorted(self.calls.keys() | self.latency.keys(), key = str)
+            lines   = []
+            for key in keys:
+                stage_name, endpoint = key
+                entry = {
+                    "timestamp"     : timestamp,
+                    "stage"         : stage_name,
+                    "endpoint"      : endpoint,
+                    "calls"         : self.calls.get(key, 0),
+                    "bytes"         : self.bytes.get(key, 0),
+                }
+                if key in self.latency:
+                    hist = self.latency[key]
+                    entry["seconds_sum"]    = hist.sum
+                    entry["buckets"]        = {
+                        ("+Inf" if bound == float('inf') else repr(bound)) : count
+                        for bound, count in zip(hist.buckets + (float('inf'),), hist.counts)
+                    }
+                lines.append(json.dumps(entry))
+
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def write(
+        self,
+        path    : str,
+        format  : str = "prometheus") -> None:
+        """
+        Write metrics to a file.
+
+        Parameters
+        ----------
+        - `path`    : Output file. JSON lines are appended, Prometheus text overwrites it.
+        - `format`  : Either `prometheus` or `jsonl`.
+        """
+        if format == "prometheus":
+            with open(path, 'w', encoding = 'utf-8') as f:
+                f.write(self.to_prometheus())
+        elif format == "jsonl":
+            with open(path, 'a', encoding = 'utf-8') as f:
+                f.write(self.to_json_lines())
+        else:
+            print(f"Incorrect format. It should be 'prometheus' or 'jsonl'. Provided {format}")
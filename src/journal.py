@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Write-ahead journal to resume large Notion uploads
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file includes an append-only journal (JSON lines) that records every
+    planned `notion.blocks.children.append` request, the block IDs returned by
+    Notion and a completion marker. If an upload crashes, running it again with
+    the same journal file replays it and continues from the first incomplete
+    request instead of starting over. A record torn by the crash is cut off the
+    file before writing new ones, and a plan interrupted before its `planned`
+    marker is discarded and planned again.
+
+    Completion records are fsync'd in batches of `fsync_every` records. A crash
+    can therefore re-send the last (at most) `fsync_every` requests. Use
+    `fsync_every = 1` to never append a block twice.
+
+    Example
+    -------
+    >>> block_ids = upload_blocks(notion, page_id, notion_blocks, "import.journal")
+   """
+
+from typing import NamedTuple
+import json
+import os
+
+from scheduler import MAX_CHILDREN, RateLimiter, call_with_retry
+
+JOURNAL_VERSION = 1
+
+class BlockRef(NamedTuple):
+    """
+    Reference to a block created by a previous request of the journal.
+
+    - `seq`     : Sequence number of the request that creates the block.
+    - `index`   : Position of the block inside that request children.
+    """
+    seq     : int
+    index   : int
+
+class JournalState(NamedTuple):
+    """
+    State of a journal after replaying it.
+
+    - `plans`   : Dict with sequence number as key and `(parent, children)` as value.
+    - `done`    : Dict with sequence number as key and the list of created block IDs as value.
+    - `finished`: Whether the whole job was marked as finished.
+    - `planned` : Whether all the requests of the job were planned.
+    - `size`    : Bytes of the file up to the last complete record.
+    """
+    plans       : dict
+    done        : dict
+    finished    : bool
+    planned     : bool  = False
+    size        : int   = 0
+
+    def pending(self) -> list:
+        """
+        Sorted sequence numbers of planned requests without completion marker.
+        """
+        return sorted(seq for seq in self.plans if seq not in self.done)
+
+class Journal():
+    """
+    Append-only journal of append requests.
+
+    Parameters
+    ----------
+    - `path`        : Journal file. Created if it does not exist.
+    - `fsync_every` : Number of records written before flushing them to disk.
+    """
+
+    def __init__(
+        self,
+        path        : str,
+        fsync_every : int = 32) -> None:
+        self.path           = path
+        self.fsync_every    = max(1, fsync_every)
+        self.state          = self.replay(path)
+        self._next_seq      = max(self.state.plans, default = -1) + 1
+        self._unsynced      = 0
+        if os.path.exists(path) and os.path.getsize(path) > self.state.size:
+            # Cut the torn record so that new records start on their own line
+            with open(path, 'r+b') as f:
+                f.truncate(self.state.size)
+        self._file          = open(path, 'a', encoding = 'utf-8')
+        if self._next_seq == 0 and not self.state.finished and self._file.tell() == 0:
+            self._write({"op": "begin", "version": JOURNAL_VERSION})
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def replay(
+        path    : str) -> JournalState:
+        """
+        Read a journal file. A truncated last line (crash while writing) is ignored
+        and excluded from `size`.
+
+        Parameters
+        ----------
+        - `path`: Journal file.
+
+        Returns
+        -------
+        A `JournalState` with planned and completed requests.
+        """
+        plans       = {}
+        done        = {}
+        finished    = False
+        planned     = False
+        size        = 0
+        if not os.path.exists(path):
+            return JournalState(plans, done, finished, planned, size)
+
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break   # Partially written record, nothing after it can be trusted
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                size += len(line)
+                op = record.get('op')
+                if op == 'plan':
+                    parent = record['parent']
+                    if isinstance(parent, list):
+                        parent = BlockRef(*parent)
+                    plans[record['seq']] = (parent, record['children'])
+                elif op == 'planned':
+                    planned = True
+                elif op == 'done':
+                    done[record['seq']] = record['ids']
+                elif op == 'end':
+                    finished = True
+
+        # Journals written before the `planned` marker: requests were only sent
+        # after the whole plan was written
+        planned = planned or bool(done) or finished
+        return JournalState(plans, done, finished, planned, size)
+
+    def _write(self, record : dict, sync : bool = False) -> None:
+        self._file.write(json.dumps(record, separators = (',', ':')) + "\n")
+        self._unsynced += 1
+        if sync or self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        """
+        Flush written records and fsync them to disk.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def plan(
+        self,
+        parent      ,
+        children    : list) -> int:
+        """
+        Record a planned append request.
+
+        Parameters
+        ----------
+        - `parent`  : ID of the parent page or block, or a `BlockRef` to a block
+        created by a previous request.
+        - `children`: List of Notion blocks to append.
+
+        Returns
+        -------
+        Sequence number of the request.
+        """
+        seq = self._next_seq
+        self._next_seq += 1
+        self._write({"op": "plan", "seq": seq, "parent": parent, "children": children})
+        self.state.plans[seq] = (parent, children)
+        return seq
+
+    def end_plan(self) -> None:
+        """
+        Mark all the requests of the job as planned and fsync the journal.
+        """
+        self._write({"op": "planned"}, sync = True)
+        self.state = self.state._replace(planned = True)
+
+    def reset(self) -> None:
+        """
+        Discard every record of the journal and start it again.
+        """
+        self._file.truncate(0)
+        self._file.seek(0)
+        self.state      = JournalState({}, {}, False)
+        self._next_seq  = 0
+        self._unsynced  = 0
+        self._write({"op": "begin", "version": JOURNAL_VERSION})
+
+    def complete(
+        self,
+        seq         : int,
+        block_ids   : list) -> None:
+        """
+        Record the block IDs returned for a request, marking it as completed.
+        """
+        self._write({"op": "done", "seq": seq, "ids": block_ids})
+        self.state.done[seq] = block_ids
+
+    def finish(self) -> None:
+        """
+        Mark the whole job as finished and fsync the journal.
+        """
+        self._write({"op": "end"}, sync = True)
+        self.state = self.state._replace(finished = True)
+
+    def resolve(
+        self,
+        parent) -> str:
+        """
+        Get the block ID of a parent, resolving `BlockRef` with completed requests.
+        """
+        if isinstance(parent, BlockRef):
+            return self.state.done[parent.seq][parent.index]
+        return parent
+
+    def close(self) -> None:
+        """
+        Fsync pending records and close the journal file.
+        """
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+def _plan_requests(
+    journal         : Journal,
+    parent_id       : str,
+    notion_blocks   : list) -> None:
+    """
+    Plan the append requests to upload a list of blocks. Top level blocks are
+    split in requests of `MAX_CHILDREN` and children beyond `MAX_CHILDREN` of
+    any top level block are appended afterwards to the created block.
+    """
+    for start in range(0, len(notion_blocks), MAX_CHILDREN):
+        chunk       = []
+        overflow    = []
+        for index, block in enumerate(notion_blocks[start:start + MAX_CHILDREN]):
+            block_type  = block.get('type')
+            children    = block.get(block_type, {}).get('children', []) if block_type else []
+            if len(children) > MAX_CHILDREN:
+                block = {**block, block_type: {**block[block_type], 'children': children[:MAX_CHILDREN]}}
+                overflow.append((index, children[MAX_CHILDREN:]))
+            chunk.append(block)
+
+        seq = journal.plan(parent_id, chunk)
+        for index, children in overflow:
+            for child_start in range(0, len(children), MAX_CHILDREN):
+                journal.plan(BlockRef(seq, index), children[child_start:child_start + MAX_CHILDREN])
+    journal.end_plan()
+
+def upload_blocks(
+    notion,
+    parent_id       : str,
+    notion_blocks   : list,
+    journal_path    : str,
+    limiter         : RateLimiter   = None,
+    fsync_every     : int           = 32) -> list:
+    """
+    Append any number of blocks to a page or block, journaling every request
+    so that the upload can be resumed after a crash.
+
+    If `journal_path` already contains a complete plan, `notion_blocks` is
+    ignored and the upload continues from the first incomplete request. A plan
+    interrupted before being complete is discarded and `notion_blocks` planned
+    again.
+
+    Parameters
+    ----------
+    - `notion`          : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `parent_id`       : ID of the page or block to append the blocks to.
+    - `notion_blocks`   : List of Notion blocks.
+    - `journal_path`    : Journal file of this upload.
+    - `limiter`         : Rate limiter shared with other uploads.
+    - `fsync_every`     : Number of completed requests written between fsyncs.
+
+    Returns
+    -------
+    List with the IDs of the created top level blocks.
+    """
+    with Journal(journal_path, fsync_every) as journal:
+        if not journal.state.planned:
+            if journal.state.plans:
+                print(f"Discarding incomplete plan in journal {journal_path}")
+                journal.reset()
+            _plan_requests(journal, parent_id, notion_blocks)
+        elif journal.state.finished:
+            print(f"Upload in journal {journal_path} already finished")
+        else:
+            print(f"Resuming upload from journal {journal_path}: {len(journal.state.pending())} requests left")
+
+        for seq in journal.state.pending():
+            parent, children = journal.state.plans[seq]
+            response = call_with_retry(
+                notion.blocks.children.append,
+                journal.resolve(parent),
+                children        = children,
+                endpoint_class  = 'append',
+                limiter         = limiter
+            )
+            journal.complete(seq, [block['id'] for block in response.get('results', [])])
+
+        if not journal.state.finished:
+            journal.finish()
+
+        # IDs of blocks appended directly to the parent, in order
+        return [
+            block_id
+            for seq, (parent, _) in sorted(journal.state.plans.items())
+            if not isinstance(parent, BlockRef)
+            for block_id in journal.state.done[seq]
+        ]
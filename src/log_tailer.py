@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Log file tailer mirroring new lines into Notion code blocks
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file follows a growing log file (like `tail -F`) and appends its new
+    lines to a Notion page or block as code blocks.
+
+    Lines are not sent one by one: they are buffered and flushed together when
+    the buffer reaches a size (`flush_size`) or when the oldest buffered line
+    has waited for a time window (`flush_interval`). Flushes are sent from the
+    thread that reads the file, so while a request is in flight (or waiting for
+    the rate limiter) new lines accumulate and the next flush carries all of
+    them, like Nagle's algorithm. Bursts of lines become a few large appends
+    instead of one request per line.
+
+    Every flush is split in code blocks of up to 100 text objects of 2000
+    characters, and small enough to be appended alone even for non-ASCII text,
+    then in appends of up to 100 children and 500KB (`split_batches()`), sent
+    with `call_with_retry()` under a shared rate limiter. Lines of a failed
+    flush stay in the buffer and are sent again after `flush_interval`.
+    Truncated and rotated files are reopened from the start, and text without
+    line breaks is cut in lines of `MAX_LINE_LENGTH` characters.
+
+    Example
+    -------
+    >>> tailer = LogTailer(notion, page_id, "server.log")
+    >>> tailer.run(stop_event)
+    $ python log_tailer.py server.log --parent 4a1ddb9c3d08409e9775d1c49212be19
+   """
+
+from typing import Callable, Iterator
+import codecs
+import os
+import threading
+import time
+
+import blocks
+import instrumentation
+from helpers import MAX_RICH_TEXT_ITEMS, MAX_TEXT_LENGTH, add_rich_text, iter_text_chunks
+from payload_size import MAX_PAYLOAD_BYTES, PayloadSizer, split_batches
+from scheduler import RateLimiter, call_with_retry
+
+# UTF-8 bytes buffered before flushing without waiting for the time window. Text
+# is sent twice (`content` and `plain_text`) and non-ASCII characters are escaped,
+# so most flushes of this size fit in a single request
+DEFAULT_FLUSH_SIZE = MAX_PAYLOAD_BYTES // 5
+
+# Characters of text without line break sent as a line (a full code block)
+MAX_LINE_LENGTH = MAX_TEXT_LENGTH * MAX_RICH_TEXT_ITEMS
+
+# Maximum number of bytes read from the file at once
+_READ_SIZE = 1 << 20
+
+class LogTailer():
+    """
+    Follow a log file and append its new lines to Notion in batches.
+
+    Parameters
+    ----------
+    - `notion`          : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `parent_id`       : ID of the page or block the code blocks are appended to.
+    - `path`            : Path of the log file. It may not exist yet.
+    - `language`        : Coding language of the code blocks.
+    - `flush_size`      : Buffered bytes (UTF-8) that trigger a flush.
+    - `flush_interval`  : Maximum seconds a line waits in the buffer.
+    - `poll_interval`   : Seconds between reads when the file does not grow.
+    - `from_start`      : Whether to send the current content of the file too,
+    instead of only the lines written from now on.
+    - `limiter`         : Shared rate limiter. A new `RateLimiter()` is used if `None`.
+    - `encoding`        : Encoding of the log file. Invalid bytes are replaced.
+    - `clock`           : Function returning the current time in seconds.
+
+    Attributes
+    ----------
+    - `lines`           : Number of lines sent.
+    - `blocks`          : Number of code blocks appended.
+    - `requests`        : Number of append requests sent.
+    - `errors`          : Number of flushes that failed (their lines are sent again).
+    """
+
+    def __init__(
+        self,
+        notion,
+        parent_id       : str,
+        path            : str,
+        language        : str           = 'plain text',
+        flush_size      : int           = DEFAULT_FLUSH_SIZE,
+        flush_interval  : float         = 2.0,
+        poll_interval   : float         = 0.25,
+        from_start      : bool          = False,
+        limiter         : RateLimiter   = None,
+        encoding        : str           = 'utf-8',
+        clock           : Callable      = time.monotonic) -> None:
+        self.notion         = notion
+        self.parent_id      = parent_id
+        self.path           = path
+        self.language       = language
+        self.flush_size     = flush_size
+        self.flush_interval = flush_interval
+        self.poll_interval  = poll_interval
+        self.limiter        = limiter if limiter is not None else RateLimiter()
+        self.encoding       = encoding
+        self.clock          = clock
+        self.lines          = 0
+        self.blocks         = 0
+        self.requests       = 0
+        self.errors         = 0
+
+        self._file          = None
+        self._inode         = None
+        self._decoder       = None
+        self._partial       = ""        # Text after the last line break
+        self._buffer        = []        # Complete lines waiting to be sent
+        self._buffered      = 0         # UTF-8 bytes in `_buffer`
+        self._since         = None      # Time the oldest buffered line was read
+        self._retry_at      = None      # Time a failed flush can be sent again
+        self._sizer         = PayloadSizer()
+        self._open(at_end = not from_start)
+
+    def __enter__(self) -> "LogTailer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _open(
+        self,
+        at_end  : bool = False) -> bool:
+        """
+        Open the log file, at its end if `at_end`. Returns whether it exists.
+        """
+        try:
+            self._file = open(self.path, 'rb')
+        except FileNotFoundError:
+            self._file = None
+            return False
+        stat            = os.fstat(self._file.fileno())
+        self._inode     = (stat.st_dev, stat.st_ino)
+        self._decoder   = codecs.getincrementaldecoder(self.encoding)(errors = 'replace')
+        if at_end:
+            self._file.seek(0, os.SEEK_END)
+        return True
+
+    def _reopen_if_rotated(self) -> None:
+        """
+        Reopen the file from the start if it was replaced or truncated. Lines
+        left in the old file are read first.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self._file is None:
+            self._open()
+        elif (stat.st_dev, stat.st_ino) != self._inode:
+            self._read_all()
+            self._end_line()
+            self._file.close()
+            self._open()
+        elif stat.st_size < self._file.tell():
+            self._end_line()
+            self._file.seek(0)
+            self._decoder.reset()
+
+    def _read_all(self) -> None:
+        while self.read() == _READ_SIZE:
+            pass
+
+    def _end_line(self) -> None:
+        """
+        Buffer the text after the last line break as a complete line.
+        """
+        if self._partial:
+            self._add(self._partial + "\n")
+            self._partial = ""
+
+    def _add(
+        self,
+        lines   : str) -> None:
+        """
+        Buffer complete lines.
+        """
+        if self._since is None:
+            self._since = self.clock()
+        self._buffer.append(lines)
+        self._buffered += len(lines.encode('utf-8', 'surrogatepass'))
+
+    def read(self) -> int:
+        """
+        Read the new content of the file into the buffer.
+
+        Returns
+        -------
+        Number of bytes read.
+        """
+        if self._file is None:
+            return 0
+        data = self._file.read(_READ_SIZE)
+        if not data:
+            return 0
+        text = self._partial + self._decoder.decode(data)
+        end  = text.rfind("\n") + 1
+        self._partial = text[end:]
+        if end:
+            self._add(text[:end])
+        # Do not keep growing a line that never ends
+        while len(self._partial) >= MAX_LINE_LENGTH:
+            self._add(self._partial[:MAX_LINE_LENGTH] + "\n")
+            self._partial = self._partial[MAX_LINE_LENGTH:]
+        return len(data)
+
+    def due(self) -> bool:
+        """
+        Whether the buffer is full or its oldest line has waited `flush_interval`.
+        """
+        if not self._buffer:
+            return False
+        now = self.clock()
+        if self._retry_at is not None and now < self._retry_at:
+            return False
+        return self._buffered >= self.flush_size or now - self._since >= self.flush_interval
+
+    def _code_blocks(
+        self,
+        text    : str) -> Iterator[dict]:
+        """
+        Code blocks of a text with up to `MAX_RICH_TEXT_ITEMS` text objects and
+        small enough to be appended alone.
+        """
+        empty       = blocks.code(self.language, None)
+        budget      = MAX_PAYLOAD_BYTES - self._sizer.children_payload_size([empty])
+        rich_text   = []
+        size        = 0
+        for chunk in iter_text_chunks(text):
+            item        = add_rich_text(chunk)
+            item_size   = self._sizer.size(item) + self._sizer._item
+            if rich_text and (len(rich_text) == MAX_RICH_TEXT_ITEMS or size + item_size > budget):
+                yield {**empty, 'code': {**empty['code'], 'text': rich_text}}
+                rich_text   = []
+                size        = 0
+            rich_text.append(item)
+            size += item_size
+        if rich_text:
+            yield {**empty, 'code': {**empty['code'], 'text': rich_text}}
+
+    def flush(self) -> int:
+        """
+        Append the buffered lines to Notion now. If a request fails, the lines
+        not sent stay in the buffer and the error is raised.
+
+        Returns
+        -------
+        Number of lines sent.
+        """
+        if not self._buffer:
+            return 0
+        text    = "".join(self._buffer)
+        # A line break at the end would show an empty last line
+        notion_blocks   = list(self._code_blocks(text[:-1] or " "))
+        sent            = 0     # Characters of `text` sent
+        sent_blocks     = 0
+
+        try:
+            with instrumentation.stage("tailer.flush", nbytes = len(text)):
+                for batch in split_batches(notion_blocks, sizer = self._sizer):
+                    call_with_retry(
+                        self.notion.blocks.children.append, self.parent_id,
+                        children        = batch,
+                        endpoint_class  = 'append',
+                        limiter         = self.limiter
+                    )
+                    self.requests   += 1
+                    sent_blocks     += len(batch)
+                    sent            += sum(len(item['text']['content']) for block in batch for item in block['code']['text'])
+            sent = len(text)
+        finally:
+            self._sizer.clear()
+            self.blocks += sent_blocks
+            if sent < len(text):
+                self.errors     += 1
+                self._buffer    = [text[sent:]]
+                self._buffered  = len(self._buffer[0].encode('utf-8', 'surrogatepass'))
+                self._retry_at  = self.clock() + self.flush_interval
+            else:
+                self._buffer    = []
+                self._buffered  = 0
+                self._since     = None
+                self._retry_at  = None
+            lines       = text.count("\n", 0, sent)
+            self.lines  += lines
+        return lines
+
+    def poll(self) -> int:
+        """
+        Read the file once and flush if a window closed.
+
+        Returns
+        -------
+        Number of bytes read.
+        """
+        self._reopen_if_rotated()
+        read = self.read()
+        if self.due():
+            try:
+                self.flush()
+            except Exception as err:
+                print(f"Appending {self.path} lines failed, retrying in {self.flush_interval} s: {err}")
+        return read
+
+    def run(
+        self,
+        stop_event  : threading.Event   = None,
+        duration    : float             = None) -> None:
+        """
+        Follow the file until `stop_event` is set or `duration` seconds pass,
+        then flush the remaining lines.
+        """
+        stop_event  = stop_event if stop_event is not None else threading.Event()
+        deadline    = self.clock() + duration if duration is not None else None
+        while not stop_event.is_set() and (deadline is None or self.clock() < deadline):
+            if self.poll() < _READ_SIZE:
+                # Wait for more lines, but not beyond the end of the window
+                wait = self.poll_interval
+                if self._since is not None:
+                    wait = min(wait, max(0.0, self._since + self.flush_interval - self.clock()))
+                stop_event.wait(wait)
+        self._read_all()
+        self.close()
+
+    def close(self) -> None:
+        """
+        Send the buffered lines, including a last line without line break, and
+        close the file.
+        """
+        self._end_line()
+        try:
+            self.flush()
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description = "Mirror new lines of a log file into a Notion page as code blocks.")
+    parser.add_argument("path", help = "Log file to follow")
+    parser.add_argument("--parent", required = True, help = "ID of the Notion page or block to append to")
+    parser.add_argument("--language", default = 'plain text', help = "Language of the code blocks")
+    parser.add_argument("--flush-size", type = int, default = DEFAULT_FLUSH_SIZE, help = "Buffered bytes that trigger a flush")
+    parser.add_argument("--flush-interval", type = float, default = 2.0, help = "Maximum seconds a line waits before being sent")
+    parser.add_argument("--from-start", action = 'store_true', help = "Send the current content of the file too")
+    parser.add_argument("--rate", type = float, default = 3.0, help = "Maximum Notion requests per second")
+    args = parser.parse_args()
+
+    token = os.environ.get('NOTION_TOKEN')
+    if not token:
+        try:
+            from secrets import NOTION_TOKEN as token
+        except ImportError:
+            token = None
+    if not token:
+        print("Set the NOTION_TOKEN environment variable or add it to secrets.py")
+        sys.exit(1)
+
+    from notion_client import Client
+    tailer = LogTailer(
+        Client(auth = token), args.parent, args.path,
+        language        = args.language,
+        flush_size      = args.flush_size,
+        flush_interval  = args.flush_interval,
+        from_start      = args.from_start,
+        limiter         = RateLimiter(rate = args.rate, burst = max(1, int(args.rate)))
+    )
+    try:
+        tailer.run()
+    except KeyboardInterrupt:
+        tailer.close()
+    print(f"Sent {tailer.lines} lines in {tailer.blocks} code blocks and {tailer.requests} requests")
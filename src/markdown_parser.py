@@ -21,13 +21,14 @@ import re
 from typing import Any   # To split delimiters from text
 
 import blocks
-from helpers import add_annotations
+from helpers import add_annotations, coalesce_rich_text
+from instrumentation import instrumented
 
 # TODO: Add slash commands: https://cheatsheets.namaraii.com/notion.html
 
 # There is no delimiter for underline text
 # use delimiters on either side
-markdown_delimiter = [
+markdown_delimiter = (
     '**',   # Bold text
     '_',    # Italic text
     '~',    # Strikethrough text
@@ -39,7 +40,7 @@ markdown_delimiter = [
     '>',    # Toggle block
     '+',    # Bullet list item block
     '\''    # Quote block
-]
+)
 
 def _clean_markdown(
     list_str    : list[str]) -> None: 
@@ -89,6 +90,7 @@ def _markdown_splitter(
     regular_exp = '|'.join('(?={})'.format(re.escape(delim)) for delim in markdown_delimiter)
     return re.split(regular_exp, text)
 
+@instrumented("markdown.block_format")
 def _add_block_format(
     list_str        : list[str],
     block_type      : str,
@@ -204,6 +206,9 @@ def _add_block_format(
                                 )
             )
 
+    # Merge fragments with the same format and drop empty ones
+    block[block['type']]['text'] = coalesce_rich_text(block[block['type']]['text'])
+
     return block
 
 def _markdown_notation(
@@ -234,6 +239,7 @@ def _markdown_notation(
 
     return notion_block
     
+@instrumented("markdown_to_notion")
 def markdown_to_notion(
     text        : str) -> list:
     """
@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Command-line tool to convert a directory of markdown files into Notion pages
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file converts every `.md` file of a directory tree into a Notion page
+    inside a parent page:
+
+    - Files are parsed in parallel processes with `markdown_to_notion()`.
+    - Local images referenced with `![alt](path)` are uploaded to Dropbox with
+    `DropboxClient` and added as image blocks with their raw shared link.
+    - One page is created per file. Pages are appended concurrently, sharing
+    a rate limiter, and retried when throttled.
+
+    A state file (`.md2notion.json` in the source directory by default) maps
+    every file to its page and content hash. Running the tool again updates the
+    pages of modified files (replacing their content) and skips the rest.
+
+    Tokens are read from the `NOTION_TOKEN` and `DROPBOX_TOKEN` environment
+    variables, or from `secrets.py`.
+
+    Example
+    -------
+    $ python md2notion.py ./docs --parent 4a1ddb9c3d08409e9775d1c49212be19 --jobs 4
+    $ python md2notion.py ./docs --parent 4a1ddb9c3d08409e9775d1c49212be19 --dry-run
+    $ python md2notion.py ./docs --dry-run --profile profile_output
+   """
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+
+import blocks
+import pages
+import profiling
+from markdown_parser import markdown_to_notion
+from pagination import iterate_children
+from payload_size import PayloadSizer, split_batches
+from scheduler import RateLimiter, call_with_retry
+from validator import validate
+
+STATE_VERSION = 1
+
+# Image lines: ![alt](path) or ![alt](path "title")
+_image_line = re.compile(r'^\s*!\[[^\]]*\]\(\s*<?([^)\s>]+)>?(?:\s+"[^"]*")?\s*\)\s*$')
+
+class Document(NamedTuple):
+    """
+    Markdown file converted to Notion blocks.
+
+    - `path`        : Path relative to the source directory, with `/` separators.
+    - `title`       : Title of the page.
+    - `digest`      : SHA-256 of the file content.
+    - `blocks`      : List of Notion blocks.
+    - `assets`      : List of `(block index, local path)` of the image blocks
+    whose URL is the local path of a file to upload.
+    """
+    path    : str
+    title   : str
+    digest  : str
+    blocks  : list
+    assets  : list
+
+def find_markdown_files(
+    source  : str) -> list:
+    """
+    Relative paths (with `/` separators) of every `.md` file inside `source`, sorted.
+    """
+    found = []
+    for directory, directories, files in os.walk(source):
+        directories[:] = sorted(name for name in directories if not name.startswith('.'))
+        for name in files:
+            if name.lower().endswith('.md'):
+                found.append(os.path.relpath(os.path.join(directory, name), source).replace(os.sep, '/'))
+    return sorted(found)
+
+def parse_file(
+    source      : str,
+    relative    : str) -> Document:
+    """
+    Convert a markdown file to Notion blocks. Image lines become image blocks.
+
+    Parameters
+    ----------
+    - `source`      : Source directory.
+    - `relative`    : Path of the file relative to `source`.
+    """
+    path = os.path.join(source, relative)
+    with open(path, 'rb') as file:
+        data = file.read()
+    text = data.decode('utf-8')
+
+    notion_blocks   = []
+    assets          = []
+    pending         = []    # Markdown lines not converted yet
+
+    def flush() -> None:
+        if pending:
+            notion_blocks.extend(markdown_to_notion("\n".join(pending)))
+            pending.clear()
+
+    for line in text.splitlines():
+        match = _image_line.match(line)
+        if match is None:
+            pending.append(line)
+            continue
+        flush()
+        target = match.group(1)
+        if re.match(r"^[a-zA-Z][a-zA-Z0-9+.-]*://", target):
+            notion_blocks.append(blocks.image(target))
+            continue
+        local = os.path.normpath(os.path.join(os.path.dirname(path), target))
+        if not os.path.isfile(local):
+            print(f"{relative}: image {target} not found. Ignoring it")
+            continue
+        assets.append((len(notion_blocks), local))
+        notion_blocks.append(blocks.image(local))
+    flush()
+
+    title = relative[:-len('.md')] if relative.lower().endswith('.md') else relative
+    return Document(relative, title, hashlib.sha256(data).hexdigest(), notion_blocks, assets)
+
+def _file_digest(
+    path    : str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for data in iter(lambda: file.read(1 << 20), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+def _read_token(
+    name    : str) -> str:
+    """
+    Token from the environment or from `secrets.py`.
+    """
+    token = os.environ.get(name)
+    if token:
+        return token
+    try:
+        import secrets
+        return getattr(secrets, name, None)
+    except ImportError:
+        return None
+
+class State():
+    """
+    Pages and assets already uploaded, saved as JSON after every change.
+    """
+
+    def __init__(
+        self,
+        path    : str) -> None:
+        self.path   = path
+        self._lock  = threading.Lock()
+        self.pages  = {}    # relative path -> {"page_id", "sha256"} (sha256 None until uploaded)
+        self.assets = {}    # absolute path -> {"sha256", "url"}
+        if os.path.exists(path):
+            with open(path, encoding = 'utf-8') as file:
+                data = json.load(file)
+            if data.get('version') != STATE_VERSION:
+                print(f"Unsupported state file version {data.get('version')} in {path}. Starting a new one")
+            else:
+                self.pages  = data.get('pages', {})
+                self.assets = data.get('assets', {})
+
+    def set_page(self, relative : str, page_id : str, digest : str) -> None:
+        with self._lock:
+            self.pages[relative] = {'page_id': page_id, 'sha256': digest}
+            self._save()
+
+    def set_asset(self, path : str, digest : str, url : str) -> None:
+        with self._lock:
+            self.assets[path] = {'sha256': digest, 'url': url}
+            self._save()
+
+    def _save(self) -> None:
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding = 'utf-8') as file:
+            json.dump({'version': STATE_VERSION, 'pages': self.pages, 'assets': self.assets}, file, indent = 2, sort_keys = True)
+        os.replace(temporary, self.path)
+
+class Uploader():
+    """
+    Creates or updates the page of every document, sharing a rate limiter
+    and the uploaded assets.
+    """
+
+    def __init__(
+        self,
+        notion,
+        parent_id   : str,
+        state       : State,
+        limiter     : RateLimiter,
+        dropbox_dir : str,
+        source      : str) -> None:
+        self.notion         = notion
+        self.parent_id      = parent_id
+        self.state          = state
+        self.limiter        = limiter
+        self.dropbox_dir    = dropbox_dir.rstrip('/')
+        self.source         = source
+        self._dropbox       = None
+        self._lock          = threading.Lock()
+        self._asset_locks   = {}
+
+    def _dropbox_client(self):
+        with self._lock:
+            if self._dropbox is None:
+                from dropbox_sdk import DropboxClient
+                token = _read_token('DROPBOX_TOKEN')
+                if not token:
+                    raise RuntimeError("DROPBOX_TOKEN is required to upload local images")
+                self._dropbox = DropboxClient(token)
+            return self._dropbox
+
+    def asset_url(
+        self,
+        local   : str) -> str:
+        """
+        Raw shared link of a local file, uploading it only if new or modified.
+        """
+        local = os.path.abspath(local)
+        with self._lock:
+            lock = self._asset_locks.setdefault(local, threading.Lock())
+        with lock:
+            digest  = _file_digest(local)
+            known   = self.state.assets.get(local)
+            if known is not None and known['sha256'] == digest and known['url']:
+                return known['url']
+            relative    = os.path.relpath(local, os.path.abspath(self.source)).replace(os.sep, '/')
+            url         = self._dropbox_client().upload_file(local, f"{self.dropbox_dir}/{relative}")
+            if url is not None:
+                self.state.set_asset(local, digest, url)
+            return url
+
+    def upload(
+        self,
+        document    : Document) -> str:
+        """
+        Create or update the page of a document.
+
+        Returns
+        -------
+        `created`, `updated` or `unchanged`.
+        """
+        known = self.state.pages.get(document.path)
+        if known is not None and known['sha256'] == document.digest:
+            return 'unchanged'
+
+        for index, local in document.assets:
+            url = self.asset_url(local)
+            if url is None:
+                raise RuntimeError(f"Uploading image {local} failed")
+            document.blocks[index]['image']['external']['url'] = url
+
+        if known is None:
+            payload = pages.page(
+                self.parent_id,
+                {"title": pages.title(document.title)},
+                parent_type = "page_id"
+            )
+            response = call_with_retry(self.notion.pages.create, endpoint_class = 'create', limiter = self.limiter, **payload)
+            page_id  = response['id']
+            action   = 'created'
+            # Saved without digest: if an append fails, the next run updates this page
+            self.state.set_page(document.path, page_id, None)
+        else:
+            page_id = known['page_id']
+            old_ids = [block['id'] for block in iterate_children(self.notion, page_id, self.limiter)]
+            for block_id in old_ids:
+                call_with_retry(self.notion.blocks.delete, block_id, endpoint_class = 'update', limiter = self.limiter)
+            action  = 'updated'
+
+        # The sizer caches by object, so it only lives while this document is uploaded
+        for batch in split_batches(document.blocks, sizer = PayloadSizer()):
+            call_with_retry(
+                self.notion.blocks.children.append, page_id,
+                children        = batch,
+                endpoint_class  = 'append',
+                limiter         = self.limiter
+            )
+        self.state.set_page(document.path, page_id, document.digest)
+        return action
+
+def _dry_run(
+    document    : Document) -> str:
+    errors = validate(document.blocks, max_errors = 5)
+    for error in errors:
+        print(f"    {error}")
+    sizer   = PayloadSizer()
+    batches = sum(1 for _ in split_batches(document.blocks, sizer = sizer))
+    size    = sum(sizer.size(block) for block in document.blocks)
+    return f"{len(document.blocks)} blocks, {size} bytes, {batches} requests, {len(document.assets)} images" + (", INVALID" if errors else "")
+
+def main(
+    argv    : list  = None) -> int:
+    parser = argparse.ArgumentParser(
+        description = "Convert a directory of markdown files into Notion pages."
+    )
+    parser.add_argument('source', help = "Directory with .md files (searched recursively).")
+    parser.add_argument('--parent', help = "ID of the Notion page where pages are created.")
+    parser.add_argument('--jobs', type = int, default = os.cpu_count() or 1, help = "Files parsed and uploaded at the same time.")
+    parser.add_argument('--dry-run', action = 'store_true', help = "Parse and validate files without uploading anything.")
+    parser.add_argument('--state', help = "State file mapping files to pages. Default: SOURCE/.md2notion.json")
+    parser.add_argument('--dropbox-dir', default = '/md2notion', help = "Dropbox directory for local images.")
+    parser.add_argument('--rate', type = float, default = 3.0, help = "Maximum Notion requests per second.")
+    parser.add_argument('--force', action = 'store_true', help = "Update pages even if their file did not change.")
+    parser.add_argument('--profile', metavar = 'DIR', help = f"Profile the run and save the reports to DIR (or set {profiling.PROFILE_VARIABLE}).")
+    args = parser.parse_args(argv)
+
+    with profiling.Profiler(args.profile) if args.profile else profiling.profile_from_env():
+        return _run(parser, args)
+
+def _run(
+    parser  : argparse.ArgumentParser,
+    args    : argparse.Namespace) -> int:
+    if not os.path.isdir(args.source):
+        parser.error(f"{args.source} is not a directory")
+    if not args.dry_run and not args.parent:
+        parser.error("--parent is required unless --dry-run is used")
+
+    files = find_markdown_files(args.source)
+    total = len(files)
+    print(f"Found {total} markdown files in {args.source}")
+    if not total:
+        return 0
+
+    uploader = None
+    if not args.dry_run:
+        from notion_client import Client
+        token = _read_token('NOTION_TOKEN')
+        if not token:
+            parser.error("NOTION_TOKEN is required")
+        state = State(args.state or os.path.join(args.source, '.md2notion.json'))
+        if args.force:
+            for known in state.pages.values():
+                known['sha256'] = None
+        uploader = Uploader(
+            Client(auth = token), args.parent, state,
+            RateLimiter(rate = args.rate, burst = max(1, int(args.rate))),
+            args.dropbox_dir, args.source
+        )
+
+    jobs    = max(1, args.jobs)
+    failed  = 0
+    done    = 0
+    # Parse in threads while profiling: the profiler follows new threads, not processes
+    parser_pool = ThreadPoolExecutor if profiling.is_active() else ProcessPoolExecutor
+    with parser_pool(max_workers = jobs) as parsers, ThreadPoolExecutor(max_workers = jobs) as uploads:
+        parsed = {parsers.submit(parse_file, args.source, relative): relative for relative in files}
+        pending = {}
+        for future in as_completed(parsed):
+            relative = parsed[future]
+            try:
+                document = future.result()
+            except Exception as exc:
+                done   += 1
+                failed += 1
+                print(f"[{done}/{total}] failed    {relative}: {exc}", flush = True)
+                continue
+            if args.dry_run:
+                done += 1
+                print(f"[{done}/{total}] parsed    {relative}: {_dry_run(document)}", flush = True)
+                continue
+            pending[uploads.submit(uploader.upload, document)] = document
+
+        for future in as_completed(pending):
+            document    = pending[future]
+            done       += 1
+            try:
+                action = future.result()
+                print(f"[{done}/{total}] {action:<9} {document.path} ({len(document.blocks)} blocks)", flush = True)
+            except Exception as exc:
+                failed += 1
+                print(f"[{done}/{total}] failed    {document.path}: {exc}", flush = True)
+
+    print(f"Finished: {total - failed} succeeded, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
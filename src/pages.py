@@ -0,0 +1,642 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Notion pages and database rows creation for Python
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file includes Notion page property values as dictionaries for Python
+    and a function to create many pages (e.g. database rows) concurrently under
+    the Notion rate limit. They can be used with the [notion-sdk-py](https://github.com/ramnes/notion-sdk-py)
+    created by Guillaume Gelin ([ramnes](https://github.com/ramnes)).
+
+    Example
+    -------
+    >>> rows = (
+    ...     pages.page(database_id, {
+    ...         "Name"  : pages.title(name),
+    ...         "Score" : pages.number(score)
+    ...     })
+    ...     for name, score in data
+    ... )
+    >>> page_ids = pages.create_pages(notion, rows)
+   """
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+import datetime
+
+from helpers import MAX_TEXT_LENGTH, add_annotations, split_rich_text
+from scheduler import RateLimiter, call_with_retry
+
+#*************************
+#* PAGE PROPERTY VALUES
+#*************************
+def title(
+    content     : str,
+    href        : str   = None,
+    annotations : dict  = None) -> dict:
+    """
+    Create title property value. Every database has exactly one title property.
+
+    Parameters
+    ----------
+    - `content`     : Text of the title.
+    - `href`        : The URL of any link or internal Notion mention in the text, if any.
+    - `annotations` : All annotations that apply to the rich text.
+
+    Returns
+    -------
+    Dictionary with the title property value.
+    """
+    return {
+        "title": split_rich_text(content, href, annotations)
+    }
+
+def rich_text(
+    content     : str,
+    href        : str   = None,
+    annotations : dict  = None) -> dict:
+    """
+    Create rich text property value.
+
+    Parameters
+    ----------
+    - `content`     : Text of the property.
+    - `href`        : The URL of any link or internal Notion mention in the text, if any.
+    - `annotations` : All annotations that apply to the rich text.
+
+    Returns
+    -------
+    Dictionary with the rich text property value.
+    """
+    return {
+        "rich_text": split_rich_text(content, href, annotations)
+    }
+
+def number(
+    value   : float) -> dict:
+    """
+    Create number property value.
+
+    Parameters
+    ----------
+    - `value`   : Number or `None` to leave the property empty.
+
+    Returns
+    -------
+    Dictionary with the number property value.
+    """
+    return {
+        "number": value
+    }
+
+def checkbox(
+    checked : bool) -> dict:
+    """
+    Create checkbox property value.
+
+    Parameters
+    ----------
+    - `checked` : Either True or False.
+
+    Returns
+    -------
+    Dictionary with the checkbox property value.
+    """
+    return {
+        "checkbox": checked
+    }
+
+def select(
+    name    : str) -> dict:
+    """
+    Create select property value. Options that do not exist in the database
+    are created by Notion.
+
+    Parameters
+    ----------
+    - `name`    : Name of the option or `None` to leave the property empty.
+
+    Returns
+    -------
+    Dictionary with the select property value.
+    """
+    return {
+        "select": {"name": name} if name is not None else None
+    }
+
+def multi_select(
+    names   : list) -> dict:
+    """
+    Create multi-select property value.
+
+    Parameters
+    ----------
+    - `names`   : List with the names of the options.
+
+    Returns
+    -------
+    Dictionary with the multi-select property value.
+    """
+    return {
+        "multi_select": [{"name": name} for name in names]
+    }
+
+def _isoformat(
+    value) -> str:
+    """
+    Convert a `date`/`datetime` to ISO 8601. Strings and `None` are returned as they are.
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+def date(
+    start,
+    end         = None,
+    time_zone   : str = None) -> dict:
+    """
+    Create date property value.
+
+    Parameters
+    ----------
+    - `start`       : Start date as `datetime.date`, `datetime.datetime` or ISO 8601 string.
+    - `end`         : End date for date ranges, if any.
+    - `time_zone`   : IANA time zone (e.g. `Europe/Madrid`), if any.
+
+    Returns
+    -------
+    Dictionary with the date property value.
+    """
+    if start is None:
+        return {"date": None}
+
+    value = {
+        "start" : _isoformat(start),
+        "end"   : _isoformat(end)
+    }
+    if time_zone is not None:
+        value["time_zone"] = time_zone
+    return {
+        "date": value
+    }
+
+def relation(
+    page_ids    : list) -> dict:
+    """
+    Create relation property value.
+
+    Parameters
+    ----------
+    - `page_ids`    : List with the IDs of the related pages.
+
+    Returns
+    -------
+    Dictionary with the relation property value.
+    """
+    return {
+        "relation": [{"id": page_id} for page_id in page_ids]
+    }
+
+def people(
+    user_ids    : list) -> dict:
+    """
+    Create people property value.
+
+    Parameters
+    ----------
+    - `user_ids`    : List with the IDs of the Notion users.
+
+    Returns
+    -------
+    Dictionary with the people property value.
+    """
+    return {
+        "people": [{"object": "user", "id": user_id} for user_id in user_ids]
+    }
+
+def url(
+    link    : str) -> dict:
+    """
+    Create URL property value.
+
+    Parameters
+    ----------
+    - `link`    : Web address or `None` to leave the property empty.
+
+    Returns
+    -------
+    Dictionary with the URL property value.
+    """
+    return {
+        "url": link
+    }
+
+def email(
+    address : str) -> dict:
+    """
+    Create email property value.
+
+    Parameters
+    ----------
+    - `address` : Email address or `None` to leave the property empty.
+
+    Returns
+    -------
+    Dictionary with the email property value.
+    """
+    return {
+        "email": address
+    }
+
+def phone_number(
+    phone   : str) -> dict:
+    """
+    Create phone number property value.
+
+    Parameters
+    ----------
+    - `phone`   : Phone number or `None` to leave the property empty.
+
+    Returns
+    -------
+    Dictionary with the phone number property value.
+    """
+    return {
+        "phone_number": phone
+    }
+
+def files(
+    urls    : dict) -> dict:
+    """
+    Create files property value with external files (e.g. raw shared links
+    returned by `DropboxClient.upload_all_files()`).
+
+    Parameters
+    ----------
+    - `urls`    : Dictionary with the name of each file as key and its URL as value.
+
+    Returns
+    -------
+    Dictionary with the files property value.
+    """
+    return {
+        "files": [
+            {
+                "name": name,
+                "type": "external",
+                "external": {
+                    "url": link
+                }
+            }
+            for name, link in urls.items()
+        ]
+    }
+
+#*****************
+#* PAGE CREATION
+#*****************
+def page(
+    parent_id   : str,
+    properties  : dict,
+    children    : list  = None,
+    icon        : dict  = None,
+    cover       : dict  = None,
+    parent_type : str   = "database_id") -> dict:
+    """
+    Create the payload of a new Notion page, to be used as
+    `notion.pages.create(**payload)` or with `create_pages()`.
+
+    Parameters
+    ----------
+    - `parent_id`   : ID of the parent database or page.
+    - `properties`  : Dictionary with the property name as key and a property value
+    (e.g. `title()`, `number()`, `select()`) as value. Pages inside a page only
+    support the `title` property.
+    - `children`    : List of Notion blocks with the page content, if any.
+    - `icon`        : Icon object created with `helpers.add_icon()`, if any.
+    - `cover`       : Cover object created with `helpers.add_cover()`, if any.
+    - `parent_type` : Either `database_id` or `page_id`.
+
+    Returns
+    -------
+    Dictionary with the page payload.
+    """
+    payload = {
+        "parent": {
+            parent_type: parent_id
+        },
+        "properties": properties
+    }
+    if children:
+        payload["children"] = children
+    if icon is not None:
+        payload["icon"] = icon
+    if cover is not None:
+        payload["cover"] = cover
+    return payload
+
+def create_pages(
+    notion,
+    rows        : Iterable[dict],
+    jobs        : int           = 3,
+    limiter     : RateLimiter   = None,
+    window      : int           = None) -> list:
+    """
+    Create many pages (e.g. database rows) concurrently under the Notion rate limit.
+    Rows are consumed lazily, so `rows` can be a generator of any length.
+
+    Parameters
+    ----------
+    - `notion`  : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `rows`    : Iterable of page payloads created with `page()`.
+    - `jobs`    : Number of concurrent requests.
+    - `limiter` : Rate limiter shared by all requests. A new `RateLimiter()` is used if `None`.
+    - `window`  : Maximum number of rows submitted but not yet collected. Defaults to `4 * jobs`.
+
+    Returns
+    -------
+    List with the IDs of the created pages, in the same order as `rows`.
+    """
+    limiter     = limiter if limiter is not None else RateLimiter()
+    window      = window or 4 * jobs
+    page_ids    = []
+    in_flight   = deque()
+
+    def create(payload):
+        return call_with_retry(
+            notion.pages.create,
+            endpoint_class  = 'create',
+            limiter         = limiter,
+            **payload
+        )['id']
+
+    with ThreadPoolExecutor(max_workers = jobs, thread_name_prefix = "notion-pages") as executor:
+        for payload in rows:
+            in_flight.append(executor.submit(create, payload))
+            if len(in_flight) >= window:
+                page_ids.append(in_flight.popleft().result())
+        while in_flight:
+            page_ids.append(in_flight.popleft().result())
+
+    return page_ids
+
+#*****************
+#* COLUMNAR ROWS
+#*****************
+# Distinct values of a select, multi-select or checkbox column built only once
+_OPTION_CACHE_SIZE = 1024
+
+def _as_sequence(
+    values) -> Iterable:
+    """
+    Convert NumPy arrays and `array.array` to lists of Python scalars in a
+    single call. Other iterables are returned as they are. NumPy dates with
+    nanoseconds are converted to microseconds first, so they become `datetime`
+    objects instead of integers.
+    """
+    dtype = getattr(values, 'dtype', None)
+    if dtype is not None and getattr(dtype, 'kind', None) == 'M' and str(dtype) == 'datetime64[ns]':
+        values = values.astype('datetime64[us]')
+    tolist = getattr(values, 'tolist', None)
+    return tolist() if tolist is not None else values
+
+def _text_encoder(
+    key     : str) -> Callable[[Iterable], Iterator[dict]]:
+    """
+    Encoder of title and rich text columns. Every value shares the same
+    annotations dictionary, so treat the payloads as read-only.
+    """
+    annotations = add_annotations()
+
+    def encode(values : Iterable) -> Iterator[dict]:
+        for content in values:
+            if content is None:
+                yield {key: []}
+            elif len(content) * 2 <= MAX_TEXT_LENGTH:
+                yield {key: [{
+                    "type": "text",
+                    "text": {
+                        "content": content,
+                        "link": None
+                    },
+                    "annotations": annotations,
+                    "plain_text": content,
+                    "href": None
+                }]}
+            else:
+                yield {key: split_rich_text(content)}
+    return encode
+
+def _number_encoder(
+    values  : Iterable) -> Iterator[dict]:
+    # NaN (missing values of NumPy and pandas) leaves the property empty
+    return ({"number": value if value == value else None} for value in values)
+
+def _option_encoder(
+    key     : str,
+    build   : Callable) -> Callable[[Iterable], Iterator[dict]]:
+    """
+    Encoder of columns with few distinct values (select, multi-select, checkbox).
+    The property value of every distinct value is built once and shared by
+    every row with that value, so treat the payloads as read-only. Only the
+    first `_OPTION_CACHE_SIZE` distinct values are cached, so streaming a
+    column with many distinct values does not keep all of them.
+    """
+    def encode(values : Iterable) -> Iterator[dict]:
+        cache = {}
+        for value in values:
+            cache_key   = tuple(value) if isinstance(value, list) else value
+            encoded     = cache.get(cache_key)
+            if encoded is None:
+                encoded = {key: build(value)}
+                if len(cache) < _OPTION_CACHE_SIZE:
+                    cache[cache_key] = encoded
+            yield encoded
+    return encode
+
+def _date_value(
+    value) -> dict:
+    if value is None:
+        return None
+    return {"start": value if isinstance(value, str) else value.isoformat(), "end": None}
+
+def _date_encoder(
+    values  : Iterable) -> Iterator[dict]:
+    # Most dates are distinct, so they are not cached like options
+    return ({"date": _date_value(value)} for value in values)
+
+# Encoder of every property type, applied to a whole column
+COLUMN_ENCODERS = {
+    'title'         : _text_encoder("title"),
+    'rich_text'     : _text_encoder("rich_text"),
+    'number'        : _number_encoder,
+    'checkbox'      : _option_encoder("checkbox", bool),
+    'select'        : _option_encoder("select", lambda name: {"name": name} if name is not None else None),
+    'multi_select'  : _option_encoder("multi_select", lambda names: [{"name": name} for name in names or ()]),
+    'date'          : _date_encoder,
+    'url'           : lambda values: map(url, values),
+    'email'         : lambda values: map(email, values),
+    'phone_number'  : lambda values: map(phone_number, values),
+    'relation'      : lambda values: map(relation, values),
+    'people'        : lambda values: map(people, values),
+    'files'         : lambda values: map(files, values),
+}
+
+def column_encoder(
+    property_type) -> Callable[[Iterable], Iterator[dict]]:
+    """
+    Resolve the encoding of a column once.
+
+    Parameters
+    ----------
+    - `property_type`   : Either the name of a property type (a key of
+    `COLUMN_ENCODERS`, e.g. `number`, `select`, `date`) or a callable converting
+    a value to a property value (e.g. `pages.date` for date ranges).
+
+    Returns
+    -------
+    Function mapping an iterable of values to an iterator of property values.
+    """
+    if callable(property_type):
+        return lambda values: map(property_type, values)
+    if property_type not in COLUMN_ENCODERS:
+        raise ValueError(f"Unsupported property type {property_type}. Supported types are: {sorted(COLUMN_ENCODERS)}")
+    return COLUMN_ENCODERS[property_type]
+
+def properties_from_columns(
+    columns : dict,
+    types   : dict) -> Iterator[dict]:
+    """
+    Create the properties of many rows from columns of values, encoding every
+    column as a whole instead of calling a property function per value.
+
+    Parameters
+    ----------
+    - `columns` : Dictionary with the property name as key and its column as value.
+    Each column is a list, `array.array`, NumPy array or any iterable of values
+    (strings, numbers, `date`/`datetime`, lists of names for multi-select...).
+    `None` (and NaN or NaT in NumPy columns) leaves the property empty. All
+    columns should have the same length.
+    - `types`   : Dictionary with the property name as key and its type (see
+    `column_encoder()`) as value.
+
+    Returns
+    -------
+    Iterator of properties dictionaries, one per row, built lazily. Values of
+    the same select option are shared between rows, so treat them as read-only.
+    """
+    names   = list(columns)
+    encoded = [column_encoder(types[name])(_as_sequence(columns[name])) for name in names]
+    for values in zip(*encoded):
+        yield dict(zip(names, values))
+
+def rows_from_columns(
+    parent_id   : str,
+    columns     : dict,
+    types       : dict,
+    parent_type : str   = "database_id") -> Iterator[dict]:
+    """
+    Create the payloads of many database rows from columns of values. See
+    `properties_from_columns()`. Rows are built lazily, as `create_pages()`
+    consumes them.
+
+    Returns
+    -------
+    Iterator of page payloads, sharing the same read-only `parent` dictionary.
+    """
+    parent = {parent_type: parent_id}
+    for properties in properties_from_columns(columns, types):
+        yield {"parent": parent, "properties": properties}
+
+def create_rows(
+    notion,
+    database_id : str,
+    columns     : dict,
+    types       : dict,
+    jobs        : int           = 3,
+    limiter     : RateLimiter   = None) -> list:
+    """
+    Create database rows from columns of values, streaming the rows into
+    `create_pages()` while they are encoded.
+
+    Parameters
+    ----------
+    - `notion`      : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `database_id` : ID of the database.
+    - `columns`     : Columns of values by property name (see `properties_from_columns()`).
+    - `types`       : Property type by property name.
+    - `jobs`        : Number of concurrent requests.
+    - `limiter`     : Rate limiter shared by all requests. A new `RateLimiter()` is used if `None`.
+
+    Returns
+    -------
+    List with the IDs of the created pages, in the same order as the columns.
+    """
+    return create_pages(notion, rows_from_columns(database_id, columns, types), jobs, limiter)
+
+
+if __name__ == "__main__":
+    #***********************************************
+    #* BENCHMARK create_pages() AGAINST A FAKE API
+    #***********************************************
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from notion_client import Client
+    import argparse
+    import itertools
+    import json
+    import threading
+    import time
+
+    parser = argparse.ArgumentParser(description = "Benchmark create_pages() against a local fake Notion server.")
+    parser.add_argument("--rows",       type = int,     default = 500,  help = "Number of database rows to create.")
+    parser.add_argument("--latency",    type = float,   default = 0.05, help = "Simulated server latency in seconds.")
+    parser.add_argument("--rate",       type = float,   default = 1000, help = "Requests per second allowed by the rate limiter.")
+    args = parser.parse_args()
+
+    page_counter = itertools.count()
+
+    class FakeNotion(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(args.latency)
+            body = json.dumps({"object": "page", "id": f"{next(page_counter):032x}"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeNotion)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    notion = Client(auth = "secret_benchmark", base_url = f"http://127.0.0.1:{server.server_port}")
+
+    rows = [
+        page("0" * 32, {
+            "Name"      : title(f"Row {i}"),
+            "Score"     : number(i * 0.5),
+            "Status"    : select("Done" if i % 2 else "Pending"),
+            "Due"       : date(datetime.date(2022, 1, 1) + datetime.timedelta(days = i % 365)),
+        })
+        for i in range(args.rows)
+    ]
+
+    for jobs in (1, 2, 4, 8, 16):
+        start       = time.perf_counter()
+        page_ids    = create_pages(notion, rows, jobs = jobs, limiter = RateLimiter(rate = args.rate, burst = jobs))
+        elapsed     = time.perf_counter() - start
+        print(f"jobs={jobs:>2}: {len(page_ids)} pages in {elapsed:.2f}s ({len(page_ids) / elapsed:.1f} pages/s)")
+
+    server.shutdown()
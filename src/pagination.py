@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Prefetching iterators for paginated Notion endpoints
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file includes iterators over paginated Notion endpoints (database
+    queries, search and block children). As soon as a page of results arrives,
+    the request for the next page is sent while the consumer processes the
+    current one, hiding most of the latency of every `next_cursor` round trip.
+
+    Both synchronous (`notion_client.Client`) and asynchronous
+    (`notion_client.AsyncClient`) versions are provided. Rows of database
+    queries can be projected to the properties needed to reduce memory.
+
+    Example
+    -------
+    >>> for row in iterate_query(notion, database_id, properties = ["Name", "Score"]):
+    ...     print(row["properties"]["Name"])
+   """
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator
+import asyncio
+
+from scheduler import RateLimiter, async_call_with_retry, call_with_retry
+
+# Maximum page size accepted by Notion
+MAX_PAGE_SIZE = 100
+
+def project(
+    row         : dict,
+    properties  : list) -> dict:
+    """
+    Keep only some properties of a page (e.g. a database row).
+
+    Parameters
+    ----------
+    - `row`         : Page object returned by Notion.
+    - `properties`  : Names of the properties to keep.
+
+    Returns
+    -------
+    New page dictionary with the other properties removed. Other keys are shared
+    with `row`.
+    """
+    row_properties = row.get('properties', {})
+    return {
+        **row,
+        'properties': {name: row_properties[name] for name in properties if name in row_properties}
+    }
+
+def _projector(
+    properties  : list) -> Callable:
+    """
+    Return the function applied to every result: a projection or `None`.
+    """
+    if properties is None:
+        return None
+    properties = tuple(properties)
+    return lambda row: project(row, properties)
+
+#*****************
+#* SYNC ITERATORS
+#*****************
+def iterate_pages(
+    function,
+    limiter     : RateLimiter   = None,
+    **kwargs) -> Iterator[list]:
+    """
+    Iterate over the pages of results of any paginated Notion endpoint, keeping
+    the request of the next page in flight while the current one is consumed.
+
+    Parameters
+    ----------
+    - `function`    : Notion client method (e.g. `notion.databases.query`).
+    - `limiter`     : Rate limiter shared with other requests, if any.
+    - `kwargs`      : Arguments for `function` (e.g. `database_id`, `filter`).
+
+    Returns
+    -------
+    Iterator with the list of results of every page.
+    """
+    kwargs.setdefault('page_size', MAX_PAGE_SIZE)
+    cursor = kwargs.pop('start_cursor', None)
+
+    def fetch(cursor):
+        arguments = dict(kwargs, start_cursor = cursor) if cursor is not None else kwargs
+        return call_with_retry(function, endpoint_class = 'query', limiter = limiter, **arguments)
+
+    with ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "notion-prefetch") as executor:
+        future = executor.submit(fetch, cursor)
+        while future is not None:
+            response    = future.result()
+            cursor      = response.get('next_cursor') if response.get('has_more') else None
+            # Send the next request before handing the current page to the consumer
+            future      = executor.submit(fetch, cursor) if cursor else None
+            yield response.get('results', [])
+
+def iterate_results(
+    function,
+    properties  : list          = None,
+    limiter     : RateLimiter   = None,
+    **kwargs) -> Iterator[dict]:
+    """
+    Same as `iterate_pages()` but yields every result one by one.
+
+    Parameters
+    ----------
+    - `function`    : Notion client method (e.g. `notion.search`).
+    - `properties`  : Names of the page properties to keep or `None` to keep all.
+    - `limiter`     : Rate limiter shared with other requests, if any.
+    - `kwargs`      : Arguments for `function`.
+    """
+    projector = _projector(properties)
+    for results in iterate_pages(function, limiter, **kwargs):
+        if projector is None:
+            yield from results
+        else:
+            yield from map(projector, results)
+
+def iterate_query(
+    notion,
+    database_id : str,
+    properties  : list          = None,
+    limiter     : RateLimiter   = None,
+    **query) -> Iterator[dict]:
+    """
+    Iterate over all rows of a database query.
+
+    Parameters
+    ----------
+    - `notion`      : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `database_id` : ID of the database.
+    - `properties`  : Names of the properties to keep or `None` to keep all.
+    - `limiter`     : Rate limiter shared with other requests, if any.
+    - `query`       : Extra query arguments (`filter`, `sorts`...).
+    """
+    return iterate_results(notion.databases.query, properties, limiter, database_id = database_id, **query)
+
+def iterate_search(
+    notion,
+    properties  : list          = None,
+    limiter     : RateLimiter   = None,
+    **search) -> Iterator[dict]:
+    """
+    Iterate over all results of a search.
+
+    Parameters
+    ----------
+    - `notion`      : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `properties`  : Names of the page properties to keep or `None` to keep all.
+    - `limiter`     : Rate limiter shared with other requests, if any.
+    - `search`      : Search arguments (`query`, `filter`, `sort`...).
+    """
+    return iterate_results(notion.search, properties, limiter, **search)
+
+def iterate_children(
+    notion,
+    block_id    : str,
+    limiter     : RateLimiter   = None) -> Iterator[dict]:
+    """
+    Iterate over all children blocks of a page or block.
+
+    Parameters
+    ----------
+    - `notion`      : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `block_id`    : ID of the page or block.
+    - `limiter`     : Rate limiter shared with other requests, if any.
+    """
+    return iterate_results(notion.blocks.children.list, None, limiter, block_id = block_id)
+
+def fetch_tree(
+    notion,
+    block_id    : str,
+    limiter     : RateLimiter           = None,
+    executor    : ThreadPoolExecutor    = None) -> list:
+    """
+    Fetch all children blocks of a page or block with their own children,
+    stored in `block[type]['children']` like the blocks of `blocks.py`. The
+    children of every level are fetched in parallel. Child pages and databases
+    are not entered.
+
+    Parameters
+    ----------
+    - `notion`      : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `block_id`    : ID of the page or block.
+    - `limiter`     : Rate limiter shared with other requests, if any.
+    - `executor`    : Executor to fetch children in parallel. A new one with 3
+    threads is used if `None`.
+
+    Returns
+    -------
+    List of children blocks.
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max_workers = 3, thread_name_prefix = "notion-tree") as executor:
+            return fetch_tree(notion, block_id, limiter, executor)
+
+    fetch   = lambda parent_id: list(iterate_children(notion, parent_id, limiter))
+    root    = fetch(block_id)
+    level   = root
+    while level:
+        parents = [
+            block for block in level
+            if block.get('has_children') and block.get('type') not in ('child_page', 'child_database')
+        ]
+        futures = [executor.submit(fetch, block['id']) for block in parents]
+        level   = []
+        for block, future in zip(parents, futures):
+            children = future.result()
+            block.setdefault(block['type'], {})['children'] = children
+            level.extend(children)
+    return root
+
+#******************
+#* ASYNC ITERATORS
+#******************
+async def aiterate_pages(
+    function,
+    limiter     : RateLimiter   = None,
+    **kwargs) -> AsyncIterator[list]:
+    """
+    Asynchronous version of `iterate_pages()` for `notion_client.AsyncClient`.
+    """
+    kwargs.setdefault('page_size', MAX_PAGE_SIZE)
+    cursor = kwargs.pop('start_cursor', None)
+
+    def fetch(cursor):
+        arguments = dict(kwargs, start_cursor = cursor) if cursor is not None else kwargs
+        return asyncio.ensure_future(
+            async_call_with_retry(function, endpoint_class = 'query', limiter = limiter, **arguments)
+        )
+
+    task = fetch(cursor)
+    try:
+        while task is not None:
+            response    = await task
+            cursor      = response.get('next_cursor') if response.get('has_more') else None
+            # Send the next request before handing the current page to the consumer
+            task        = fetch(cursor) if cursor else None
+            yield response.get('results', [])
+    finally:
+        if task is not None and not task.done():
+            task.cancel()
+
+async def aiterate_results(
+    function,
+    properties  : list          = None,
+    limiter     : RateLimiter   = None,
+    **kwargs) -> AsyncIterator[dict]:
+    """
+    Asynchronous version of `iterate_results()`.
+    """
+    projector = _projector(properties)
+    async for results in aiterate_pages(function, limiter, **kwargs):
+        for result in results:
+            yield result if projector is None else projector(result)
+
+def aiterate_query(
+    notion,
+    database_id : str,
+    properties  : list          = None,
+    limiter     : RateLimiter   = None,
+    **query) -> AsyncIterator[dict]:
+    """
+    Asynchronous version of `iterate_query()`.
+
+    Example
+    -------
+    >>> async for row in aiterate_query(async_notion, database_id, properties = ["Name"]):
+    ...     process(row)
+    """
+    return aiterate_results(notion.databases.query, properties, limiter, database_id = database_id, **query)
+
+def aiterate_search(
+    notion,
+    properties  : list          = None,
+    limiter     : RateLimiter   = None,
+    **search) -> AsyncIterator[dict]:
+    """
+    Asynchronous version of `iterate_search()`.
+    """
+    return aiterate_results(notion.search, properties, limiter, **search)
+
+def aiterate_children(
+    notion,
+    block_id    : str,
+    limiter     : RateLimiter   = None) -> AsyncIterator[dict]:
+    """
+    Asynchronous version of `iterate_children()`.
+    """
+    return aiterate_results(notion.blocks.children.list, None, limiter, block_id = block_id)
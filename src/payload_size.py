@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" JSON payload size estimation for Notion block trees
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file computes the exact UTF-8 byte length of the JSON encoding of a
+    block tree without serializing the whole tree. Only string leaves are
+    escaped (with the same C functions used by `json`) and the rest is plain
+    arithmetic. The size of every top-level block (with its children) is
+    cached, so moving blocks between candidate batches does not measure them
+    again. Nested blocks are not cached on their own, so a stale nested size
+    can never hide inside the size of its parent.
+
+    Example
+    -------
+    >>> sizer = PayloadSizer()
+    >>> for batch in split_batches(notion_blocks, sizer = sizer):
+    ...     notion.blocks.children.append(page_id, children = batch)
+   """
+
+from json.encoder import encode_basestring, encode_basestring_ascii
+from typing import Iterator
+
+from scheduler import MAX_CHILDREN
+
+# Maximum size of a request body accepted by Notion
+MAX_PAYLOAD_BYTES = 500_000
+
+class PayloadSizer():
+    """
+    Computes `len(json.dumps(obj, ensure_ascii = ..., separators = ...).encode('utf-8'))`
+    incrementally.
+
+    Parameters
+    ----------
+    - `ensure_ascii`: Same as `json.dumps()`. `True` by default.
+    - `separators`  : Same as `json.dumps()`. `(', ', ': ')` by default. Use
+    `(',', ':')` for compact encodings.
+
+    Notes
+    -----
+    Sizes of the blocks (dictionaries with a `type` key) passed to `size()` are
+    cached by identity, including their children. Nested blocks are measured
+    as part of their top-level block, not cached on their own. Call
+    `invalidate()` with the top-level block after modifying it, or any of its
+    children, in place.
+    """
+
+    def __init__(
+        self,
+        ensure_ascii    : bool  = True,
+        separators      : tuple = None) -> None:
+        item_separator, key_separator = separators if separators is not None else (', ', ': ')
+        self.ensure_ascii   = ensure_ascii
+        self._item          = len(item_separator.encode('utf-8'))
+        self._key           = len(key_separator.encode('utf-8'))
+        self._cache         = {}    # id(block) -> (block, size)
+        # Bytes of a JSON string, including quotes and escapes
+        self.string_size    = self._ascii_string_size if ensure_ascii else self._utf8_string_size
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def clear(self) -> None:
+        """
+        Drop every cached size.
+        """
+        self._cache.clear()
+
+    def invalidate(
+        self,
+        block   : dict) -> None:
+        """
+        Forget the cached size of a top-level block passed to `size()`.
+        """
+        self._cache.pop(id(block), None)
+
+    def _ascii_string_size(
+        self,
+        value   : str) -> int:
+        return len(encode_basestring_ascii(value))
+
+    def _utf8_string_size(
+        self,
+        value   : str) -> int:
+        encoded = encode_basestring(value)
+        return len(encoded) if encoded.isascii() else len(encoded.encode('utf-8', 'surrogatepass'))
+
+    def _key_size(self, key) -> int:
+        if isinstance(key, str):
+            return self.string_size(key)
+        # `json` converts other keys to strings: true, false, null or numbers
+        if key is True or key is False or key is None:
+            return {True: 6, False: 7, None: 6}[key]
+        if isinstance(key, float):
+            return len(float.__repr__(key)) + 2
+        return len(int.__repr__(key)) + 2
+
+    def size(
+        self,
+        value) -> int:
+        """
+        Exact number of bytes of the JSON encoding of `value`.
+
+        Parameters
+        ----------
+        - `value`: Block, list of blocks, payload or any JSON serializable value.
+        """
+        value_type = type(value)
+        if value_type is str:
+            return self.string_size(value)
+        if value_type is dict:
+            if 'type' not in value:
+                return self._dict_size(value)
+            cached = self._cache.get(id(value))
+            if cached is not None and cached[0] is value:
+                return cached[1]
+            total = self._dict_size(value)
+            self._cache[id(value)] = (value, total)
+            return total
+        if value_type is list or value_type is tuple:
+            # Items of a list of blocks are top-level blocks too
+            if not value:
+                return 2
+            return 2 + (len(value) - 1) * self._item + sum(self.size(item) for item in value)
+        return self._scalar_size(value)
+
+    def _dict_size(self, value : dict) -> int:
+        if not value:
+            return 2
+
+        string_size = self.string_size
+        total       = 2 + (len(value) - 1) * self._item + len(value) * self._key
+        for key, item in value.items():
+            total += string_size(key) if type(key) is str else self._key_size(key)
+            item_type = type(item)
+            if item_type is str:
+                total += string_size(item)
+            elif item_type is dict:
+                total += self._dict_size(item)
+            elif item_type is list:
+                total += self._list_size(item)
+            else:
+                total += self._scalar_size(item)
+        return total
+
+    def _list_size(self, value : list) -> int:
+        if not value:
+            return 2
+        total = 2 + (len(value) - 1) * self._item
+        for item in value:
+            item_type = type(item)
+            if item_type is dict:
+                total += self._dict_size(item)
+            elif item_type is str:
+                total += self.string_size(item)
+            else:
+                total += self._scalar_size(item)
+        return total
+
+    def _scalar_size(self, value) -> int:
+        if value is None or value is True:
+            return 4
+        if value is False:
+            return 5
+        if isinstance(value, float):
+            if value != value:
+                return 3                                # NaN
+            if value in (float('inf'), float('-inf')):
+                return 8 if value > 0 else 9            # Infinity, -Infinity
+            return len(float.__repr__(value))
+        if isinstance(value, int):
+            return len(int.__repr__(value))
+        # Subclasses of the JSON types (e.g. `OrderedDict`)
+        if isinstance(value, str):
+            return self.string_size(value)
+        if isinstance(value, dict):
+            return self._dict_size(value)
+        if isinstance(value, (list, tuple)):
+            return self._list_size(value)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def children_payload_size(
+        self,
+        notion_blocks   : list) -> int:
+        """
+        Bytes of the payload created by `blocks.append_blocks(notion_blocks)`.
+        """
+        return self._children_overhead() + self.size(notion_blocks)
+
+    def _children_overhead(self) -> int:
+        # {"children": <list>}
+        return 2 + self.string_size("children") + self._key
+
+def split_batches(
+    notion_blocks   : list,
+    max_bytes       : int           = MAX_PAYLOAD_BYTES,
+    max_children    : int           = MAX_CHILDREN,
+    sizer           : PayloadSizer  = None) -> Iterator[list]:
+    """
+    Split a list of blocks into batches to append, keeping every payload
+    created by `blocks.append_blocks()` under `max_bytes` and `max_children`.
+
+    Parameters
+    ----------
+    - `notion_blocks`   : List of Notion blocks.
+    - `max_bytes`       : Maximum size of every payload in bytes.
+    - `max_children`    : Maximum number of blocks per batch.
+    - `sizer`           : Sizer (and cache) to use. A new `PayloadSizer()` is used if `None`.
+
+    Returns
+    -------
+    Iterator of lists of blocks. A single block larger than `max_bytes` is
+    returned alone in its batch.
+    """
+    sizer       = sizer if sizer is not None else PayloadSizer()
+    empty       = sizer._children_overhead() + 2     # {"children": []}
+    batch       = []
+    batch_size  = empty
+
+    for block in notion_blocks:
+        block_size  = sizer.size(block)
+        added       = block_size + (sizer._item if batch else 0)
+        if batch and (len(batch) >= max_children or batch_size + added > max_bytes):
+            yield batch
+            batch       = []
+            batch_size  = empty
+            added       = block_size
+        if not batch and empty + block_size > max_bytes:
+            print(f"A {block.get('type')} block of {block_size} bytes exceeds the maximum payload size of {max_bytes} bytes")
+        batch.append(block)
+        batch_size += added
+
+    if batch:
+        yield batch
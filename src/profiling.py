@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Profiling mode for sync runs
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file profiles a whole run (parsing, block building, Dropbox uploads and
+    Notion appends) and writes to a directory:
+
+    - `profile.pstats`  : `cProfile` statistics of the thread that starts the
+    profiler and of every thread started while profiling (thread pools), merged.
+    Before Python 3.12 those threads are measured in CPU time. Open it with
+    `pstats` or tools like `snakeviz`.
+    - `stacks.collapsed`: Stacks of all threads sampled periodically, in the
+    collapsed format of flamegraph tools (`flamegraph.pl`, speedscope...).
+    - `summary.txt`     : Wall and CPU time, functions with the highest time and
+    `tracemalloc` top allocators.
+
+    Profile a block of code with `profile()`, set the `NOTION_SDK_PROFILE`
+    environment variable to a directory to profile the tools using
+    `profile_from_env()` (like `md2notion.py`), or run any script with
+    `python profiling.py OUTPUT_DIR script.py [args...]`.
+
+    Example
+    -------
+    >>> with profile("profile_output"):
+    ...     notion_blocks = markdown_to_notion(text)
+    $ NOTION_SDK_PROFILE=profile_output python md2notion.py ./docs --dry-run
+   """
+
+from collections import Counter
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+# Environment variable with the output directory of `profile_from_env()`
+PROFILE_VARIABLE = 'NOTION_SDK_PROFILE'
+
+# Before Python 3.12 `cProfile` only sees the thread enabling it. Since 3.12 it
+# uses `sys.monitoring`, sees every thread and only one profiler can be active
+_PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+_active = 0
+
+def is_active() -> bool:
+    """
+    Return whether a profiler is currently running.
+    """
+    return _active > 0
+
+class _Sampler(threading.Thread):
+    """
+    Thread sampling the stacks of every other thread.
+    """
+
+    def __init__(self, interval : float) -> None:
+        super().__init__(name = "notion-profiler", daemon = True)
+        self.interval   = interval
+        self.counts     = Counter()
+        self.samples    = 0
+        self._stopped   = threading.Event()
+        self._labels    = {}    # code object -> frame label
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+            self._labels[code] = label
+        return label
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)).replace(';', ','))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+class Profiler():
+    """
+    Context manager profiling everything run inside it.
+
+    Parameters
+    ----------
+    - `output_dir`      : Directory for the reports. Created if it does not exist.
+    - `cpu`             : Whether to record `cProfile` statistics of the current
+    thread and of the threads started while profiling (every thread since
+    Python 3.12). Before 3.12, threads already running are only sampled.
+    - `memory`          : Whether to trace allocations with `tracemalloc`.
+    - `sample_interval` : Seconds between stack samples of all threads, or `None`
+    to not sample them.
+    - `top`             : Number of functions and allocators in the summary.
+
+    Attributes
+    ----------
+    - `summary`         : Text of the summary, once stopped.
+    """
+
+    def __init__(
+        self,
+        output_dir      : str,
+        cpu             : bool  = True,
+        memory          : bool  = True,
+        sample_interval : float = 0.005,
+        top             : int   = 15) -> None:
+        self.output_dir         = output_dir
+        self.cpu                = cpu
+        self.memory             = memory
+        self.sample_interval    = sample_interval
+        self.top                = top
+        self.summary            = None
+        self._profile           = None
+        self._sampler           = None
+        self._thread_profiles   = []
+        self._lock              = threading.Lock()
+
+    def _profile_thread(self, frame, event, arg) -> None:
+        """
+        Profile function of new threads: replaces itself with a `cProfile.Profile`
+        of the thread on its first call. It measures the CPU time of the thread,
+        so waiting for the GIL is not counted as time of its functions.
+        """
+        profile = cProfile.Profile(time.thread_time)
+        with self._lock:
+            self._thread_profiles.append(profile)
+        profile.enable()
+
+    def start(self) -> 'Profiler':
+        global _active
+        _active += 1
+        self._started_tracemalloc = False
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self._started_tracemalloc = True
+        if self.sample_interval:
+            self._sampler = _Sampler(self.sample_interval)
+            self._sampler.start()
+        self._wall  = time.perf_counter()
+        self._cpu   = time.process_time()
+        if self.cpu:
+            self._thread_profiles = []
+            if _PER_THREAD_PROFILES:
+                threading.setprofile(self._profile_thread)
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def stop(self) -> str:
+        global _active
+        if self._profile is not None:
+            self._profile.disable()
+            if _PER_THREAD_PROFILES:
+                threading.setprofile(None)
+        wall    = time.perf_counter() - self._wall
+        cpu     = time.process_time() - self._cpu
+        if self._sampler is not None:
+            self._sampler.stop()
+        snapshot = None
+        if self.memory and tracemalloc.is_tracing():
+            snapshot        = tracemalloc.take_snapshot()
+            _, peak         = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        _active -= 1
+
+        os.makedirs(self.output_dir, exist_ok = True)
+        lines = [f"Wall time: {wall:.3f} s    CPU time: {cpu:.3f} s"]
+
+        if self._profile is not None:
+            stream  = io.StringIO()
+            stats   = pstats.Stats(self._profile, stream = stream)
+            with self._lock:
+                for thread_profile in self._thread_profiles:
+                    stats.add(thread_profile)
+            stats.dump_stats(os.path.join(self.output_dir, "profile.pstats"))
+            if _PER_THREAD_PROFILES:
+                scope = f"{len(self._thread_profiles) + 1} profiled threads, CPU time of threads started while profiling"
+            else:
+                scope = "all threads, wall times of concurrent threads added up"
+            stats.strip_dirs()
+            for sort in ('tottime', 'cumulative'):
+                stream.seek(0)
+                stream.truncate()
+                stats.sort_stats(sort).print_stats(self.top)
+                report = stream.getvalue()
+                lines += ["", f"Functions by {sort} ({scope})", report[report.find("   ncalls"):].rstrip()]
+
+        if self._sampler is not None:
+            with open(os.path.join(self.output_dir, "stacks.collapsed"), 'w', encoding = 'utf-8') as file:
+                for stack, count in sorted(self._sampler.counts.items()):
+                    file.write(f"{stack} {count}\n")
+            lines += ["", f"{self._sampler.samples} stack samples every {self.sample_interval * 1e3:g} ms (all threads)"]
+
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            lines += ["", f"Peak traced memory: {peak / 2**20:.1f} MiB", "Top allocators (still allocated at the end)"]
+            for statistic in snapshot.statistics('lineno')[:self.top]:
+                frame = statistic.traceback[0]
+                lines.append(f"{statistic.size / 1024:>10.1f} KiB {statistic.count:>8} blocks  {os.path.basename(frame.filename)}:{frame.lineno}")
+
+        self.summary = "\n".join(lines) + "\n"
+        with open(os.path.join(self.output_dir, "summary.txt"), 'w', encoding = 'utf-8') as file:
+            file.write(self.summary)
+        return self.summary
+
+    def __enter__(self) -> 'Profiler':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+        print(f"Profile saved to {self.output_dir}", file = sys.stderr)
+
+def profile(
+    output_dir  : str   = "profile_output",
+    **options) -> Profiler:
+    """
+    Profile the code inside a `with` block. See `Profiler` for the options.
+    """
+    return Profiler(output_dir, **options)
+
+def profile_from_env(
+    variable    : str   = PROFILE_VARIABLE):
+    """
+    Return a `Profiler` writing to the directory of the environment variable
+    `variable`, or a context manager doing nothing if it is not set.
+    """
+    output_dir = os.environ.get(variable)
+    if not output_dir:
+        return contextlib.nullcontext()
+    return Profiler(output_dir)
+
+
+if __name__ == "__main__":
+    #****************************
+    #* PROFILE A WHOLE SCRIPT
+    #****************************
+    import runpy
+
+    if len(sys.argv) < 3:
+        print("Usage: python profiling.py OUTPUT_DIR script.py [args...]")
+        sys.exit(2)
+
+    output_dir, script = sys.argv[1], sys.argv[2]
+    sys.argv = sys.argv[2:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    with Profiler(output_dir) as profiler:
+        try:
+            runpy.run_path(script, run_name = "__main__")
+        except SystemExit:
+            pass
+    print(profiler.summary)
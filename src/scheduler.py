@@ -0,0 +1,527 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Retry scheduler for Notion API requests
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file includes a rate limiter and a scheduler to send requests to
+    Notion with the [notion-sdk-py](https://github.com/ramnes/notion-sdk-py)
+    client. Throttled (429) and server (5xx) errors are retried honouring the
+    `Retry-After` header or with jittered exponential backoff per endpoint class.
+
+    Appends to the same parent block are queued and, while they wait for the
+    rate limiter or a backoff, coalesced into larger requests of up to 100
+    children (the Notion limit per append).
+
+    Example
+    -------
+    >>> with RetryScheduler(notion) as scheduler:
+    ...     for notion_blocks in batches:
+    ...         scheduler.append(page_id, notion_blocks)
+   """
+
+from collections import deque
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from typing import Callable
+import asyncio
+import datetime
+import random
+import threading
+import time
+
+import instrumentation
+
+# Maximum number of children blocks per append request accepted by Notion
+MAX_CHILDREN = 100
+
+# HTTP status codes that are worth retrying
+RETRYABLE_STATUS = frozenset([409, 429, 500, 502, 503, 504])
+
+#****************
+#* RATE LIMITING
+#****************
+class RateLimiter():
+    """
+    Thread-safe token bucket. Notion allows an average of 3 requests per
+    second for every integration.
+
+    Parameters
+    ----------
+    - `rate`    : Tokens added per second.
+    - `burst`   : Maximum number of tokens stored.
+    """
+
+    def __init__(
+        self,
+        rate    : float = 3.0,
+        burst   : int   = 3) -> None:
+        self.rate           = rate
+        self.burst          = burst
+        self._tokens        = float(burst)
+        self._updated       = time.monotonic()
+        self._paused_until  = 0.0
+        self._lock          = threading.Lock()
+
+    def _refill(self, now : float) -> None:
+        self._tokens    = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated   = now
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if available.
+
+        Returns
+        -------
+        `0` if a token was taken. Otherwise, seconds to wait before retrying.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(
+        self,
+        sleep   : Callable[[float], None] = time.sleep) -> None:
+        """
+        Block until a token is available.
+        """
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            sleep(wait)
+
+    def pause(
+        self,
+        seconds : float) -> None:
+        """
+        Stop handing out tokens for `seconds` (e.g. after a `Retry-After` header).
+        """
+        with self._lock:
+            self._paused_until  = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens        = 0.0
+            # Tokens start refilling when the pause ends, not during it
+            self._updated       = self._paused_until
+
+#*********************
+#* RETRY AND BACKOFF
+#*********************
+class BackoffPolicy():
+    """
+    Jittered exponential backoff ("full jitter").
+
+    Parameters
+    ----------
+    - `base`        : Delay in seconds of the first retry before jitter.
+    - `cap`         : Maximum delay in seconds.
+    - `max_retries` : Number of retries before giving up.
+    """
+
+    def __init__(
+        self,
+        base        : float = 0.5,
+        cap         : float = 30.0,
+        max_retries : int   = 8) -> None:
+        self.base           = base
+        self.cap            = cap
+        self.max_retries    = max_retries
+
+    def delay(
+        self,
+        attempt : int) -> float:
+        """
+        Seconds to wait before retry number `attempt` (starting at 0).
+        """
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+# Backoff policies for every endpoint class
+DEFAULT_POLICIES = {
+    'append'    : BackoffPolicy(base = 0.5, cap = 30.0, max_retries = 8),
+    'create'    : BackoffPolicy(base = 0.5, cap = 30.0, max_retries = 8),
+    'update'    : BackoffPolicy(base = 0.5, cap = 30.0, max_retries = 6),
+    'query'     : BackoffPolicy(base = 0.25, cap = 10.0, max_retries = 6),
+    'default'   : BackoffPolicy(base = 1.0, cap = 60.0, max_retries = 5),
+}
+
+def parse_retry_after(
+    value   : str) -> float:
+    """
+    Parse a `Retry-After` header value.
+
+    Parameters
+    ----------
+    - `value`: Either a number of seconds or an HTTP date.
+
+    Returns
+    -------
+    Seconds to wait or `None` if the value could not be parsed.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (date - datetime.datetime.now(date.tzinfo)).total_seconds())
+
+def retry_delay(
+    error   : Exception) -> tuple:
+    """
+    Check if an error raised by the Notion client should be retried.
+
+    Parameters
+    ----------
+    - `error`: Exception raised by a Notion request.
+
+    Returns
+    -------
+    Tuple `(retryable, retry_after)` where `retry_after` are the seconds
+    requested by the server or `None`.
+    """
+    # Timeouts from notion-sdk-py (`RequestTimeoutError`) are always retried
+    if type(error).__name__ == 'RequestTimeoutError':
+        return True, None
+
+    status = getattr(error, 'status', None)
+    if status not in RETRYABLE_STATUS:
+        return False, None
+
+    headers = getattr(error, 'headers', None) or {}
+    return True, parse_retry_after(headers.get('retry-after') or headers.get('Retry-After'))
+
+def call_with_retry(
+    function        : Callable,
+    *args,
+    endpoint_class  : str           = 'default',
+    limiter         : RateLimiter   = None,
+    policies        : dict          = None,
+    sleep           : Callable      = time.sleep,
+    **kwargs):
+    """
+    Call a Notion client method retrying throttled and server errors.
+
+    Parameters
+    ----------
+    - `function`        : Notion client method (e.g. `notion.pages.create`).
+    - `args`            : Positional arguments for `function`.
+    - `endpoint_class`  : Key of the backoff policy (`append`, `create`, `update`, `query`, ...).
+    - `limiter`         : Rate limiter to take a token from before every attempt.
+    - `policies`        : Backoff policies per endpoint class. Defaults to `DEFAULT_POLICIES`.
+    - `sleep`           : Function used to wait.
+    - `kwargs`          : Keyword arguments for `function`.
+
+    Returns
+    -------
+    Whatever `function` returns.
+    """
+    policies    = policies or DEFAULT_POLICIES
+    policy      = policies.get(endpoint_class, policies['default'])
+    attempt     = 0
+
+    while True:
+        if limiter is not None:
+            limiter.acquire(sleep)
+        try:
+            return function(*args, **kwargs)
+        except Exception as err:
+            retryable, retry_after = retry_delay(err)
+            if not retryable or attempt >= policy.max_retries:
+                raise
+            wait = retry_after if retry_after is not None else policy.delay(attempt)
+            if retry_after is not None and limiter is not None:
+                limiter.pause(retry_after)
+            instrumentation.record("scheduler.retry", wait, endpoint = endpoint_class)
+            attempt += 1
+            sleep(wait)
+
+async def async_call_with_retry(
+    function        : Callable,
+    *args,
+    endpoint_class  : str           = 'default',
+    limiter         : RateLimiter   = None,
+    policies        : dict          = None,
+    **kwargs):
+    """
+    Same as `call_with_retry()` for coroutine functions such as the methods of
+    `notion_client.AsyncClient`. Waits with `asyncio.sleep()` instead of blocking.
+    """
+    policies    = policies or DEFAULT_POLICIES
+    policy      = policies.get(endpoint_class, policies['default'])
+    attempt     = 0
+
+    while True:
+        if limiter is not None:
+            wait = limiter.try_acquire()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = limiter.try_acquire()
+        try:
+            return await function(*args, **kwargs)
+        except Exception as err:
+            retryable, retry_after = retry_delay(err)
+            if not retryable or attempt >= policy.max_retries:
+                raise
+            wait = retry_after if retry_after is not None else policy.delay(attempt)
+            if retry_after is not None and limiter is not None:
+                limiter.pause(retry_after)
+            instrumentation.record("scheduler.retry", wait, endpoint = endpoint_class)
+            attempt += 1
+            await asyncio.sleep(wait)
+
+#****************************
+#* APPEND SCHEDULER
+#****************************
+class _AppendRequest():
+    """
+    Queued append of at most `MAX_CHILDREN` blocks to a parent.
+    """
+    __slots__ = ('children', 'future')
+
+    def __init__(self, children : list) -> None:
+        self.children   = children
+        self.future     = Future()
+
+class RetryScheduler():
+    """
+    Send Notion requests from worker threads under a shared rate limit.
+    Appends to the same parent are sent in order and coalesced while they wait.
+
+    Parameters
+    ----------
+    - `notion`      : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `limiter`     : Shared rate limiter. A new `RateLimiter()` is used if `None`.
+    - `policies`    : Backoff policies per endpoint class. Defaults to `DEFAULT_POLICIES`.
+    - `workers`     : Number of parents appended to concurrently.
+    - `max_children`: Maximum number of children per append request.
+    """
+
+    def __init__(
+        self,
+        notion,
+        limiter         : RateLimiter   = None,
+        policies        : dict          = None,
+        workers         : int           = 3,
+        max_children    : int           = MAX_CHILDREN) -> None:
+        self.notion         = notion
+        self.limiter        = limiter if limiter is not None else RateLimiter()
+        self.policies       = policies or DEFAULT_POLICIES
+        self.max_children   = max_children
+
+        self._pending       = {}        # parent ID -> deque of _AppendRequest (insertion ordered)
+        self._busy          = set()     # parent IDs with a request in flight
+        self._unfinished    = 0
+        self._closed        = False
+        self._condition     = threading.Condition()
+        self._workers       = [
+            threading.Thread(target = self._worker, name = f"notion-append-{i}", daemon = True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self) -> "RetryScheduler":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def call(
+        self,
+        function        : Callable,
+        *args,
+        endpoint_class  : str = 'default',
+        **kwargs):
+        """
+        Call any Notion client method from the current thread using the
+        scheduler rate limiter and backoff policies. See `call_with_retry()`.
+        """
+        return call_with_retry(
+            function, *args,
+            endpoint_class  = endpoint_class,
+            limiter         = self.limiter,
+            policies        = self.policies,
+            **kwargs
+        )
+
+    def append(
+        self,
+        parent_id   : str,
+        children    : list) -> Future:
+        """
+        Queue children blocks to be appended to a parent block or page.
+
+        Parameters
+        ----------
+        - `parent_id`   : ID of the parent page or block.
+        - `children`    : List of Notion blocks (any length).
+
+        Returns
+        -------
+        Future with the list of created blocks returned by Notion for these children.
+        """
+        chunks = [
+            _AppendRequest(children[start:start + self.max_children])
+            for start in range(0, len(children), self.max_children)
+        ]
+        result = Future()
+        if not chunks:
+            result.set_result([])
+            return result
+        result_lock = threading.Lock()
+
+        def on_chunk_done(_):
+            with result_lock:
+                if result.done() or not all(chunk.future.done() for chunk in chunks):
+                    return
+                created = []
+                for chunk in chunks:
+                    if chunk.future.exception() is not None:
+                        result.set_exception(chunk.future.exception())
+                        return
+                    created.extend(chunk.future.result())
+                result.set_result(created)
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("RetryScheduler is closed")
+            queue = self._pending.setdefault(parent_id, deque())
+            queue.extend(chunks)
+            self._unfinished += len(chunks)
+            self._condition.notify_all()
+
+        for chunk in chunks:
+            chunk.future.add_done_callback(on_chunk_done)
+        return result
+
+    def join(self) -> None:
+        """
+        Block until every queued append has finished.
+        """
+        with self._condition:
+            while self._unfinished:
+                self._condition.wait()
+
+    def close(self) -> None:
+        """
+        Wait for queued appends and stop the worker threads.
+        """
+        self.join()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def _take(self, parent_id : str, batch : list) -> None:
+        """
+        Move queued requests of a parent into `batch` while they fit in one append.
+        Must be called holding the condition lock.
+        """
+        queue   = self._pending.get(parent_id)
+        size    = sum(len(request.children) for request in batch)
+        while queue and size + len(queue[0].children) <= self.max_children:
+            request = queue.popleft()
+            size    += len(request.children)
+            batch.append(request)
+        if queue is not None and not queue:
+            del self._pending[parent_id]
+
+    def _next_parent(self) -> str:
+        """
+        Oldest parent with queued requests and no request in flight.
+        Must be called holding the condition lock.
+        """
+        for parent_id in self._pending:
+            if parent_id not in self._busy:
+                return parent_id
+        return None
+
+    def _worker(self) -> None:
+        while True:
+            with self._condition:
+                parent_id = self._next_parent()
+                while parent_id is None:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                    parent_id = self._next_parent()
+                self._busy.add(parent_id)
+                batch = []
+                self._take(parent_id, batch)
+
+            try:
+                self._send(parent_id, batch)
+            except Exception as err:
+                # Unexpected error (not from the request): fail the batch, keep the worker
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(err)
+            finally:
+                with self._condition:
+                    self._busy.discard(parent_id)
+                    self._unfinished -= len(batch)
+                    self._condition.notify_all()
+
+    def _send(self, parent_id : str, batch : list) -> None:
+        """
+        Append a batch of requests retrying throttled and server errors. Requests
+        queued for the same parent while waiting are coalesced into the batch.
+        """
+        policy  = self.policies.get('append', self.policies['default'])
+        attempt = 0
+
+        while True:
+            # Wait for the rate limiter while more appends may be queued
+            wait = self.limiter.try_acquire()
+            while wait > 0:
+                time.sleep(wait)
+                with self._condition:
+                    self._take(parent_id, batch)
+                wait = self.limiter.try_acquire()
+
+            children = [block for request in batch for block in request.children]
+            try:
+                with instrumentation.stage("scheduler.append", endpoint = "PATCH blocks/{id}/children"):
+                    response = self.notion.blocks.children.append(parent_id, children = children)
+            except Exception as err:
+                retryable, retry_after = retry_delay(err)
+                if not retryable or attempt >= policy.max_retries:
+                    for request in batch:
+                        request.future.set_exception(err)
+                    return
+                wait = retry_after if retry_after is not None else policy.delay(attempt)
+                if retry_after is not None:
+                    self.limiter.pause(retry_after)
+                instrumentation.record("scheduler.retry", wait, endpoint = 'append')
+                attempt += 1
+                time.sleep(wait)
+                with self._condition:
+                    self._take(parent_id, batch)
+                continue
+
+            instrumentation.record("scheduler.coalesced", nbytes = 0, count = len(batch))
+            results = response.get('results', []) if isinstance(response, dict) else []
+            start   = 0
+            for request in batch:
+                end = start + len(request.children)
+                request.future.set_result(results[start:end])
+                start = end
+            return
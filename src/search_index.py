@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Local full-text index of Notion pages
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file keeps an inverted index of the text of Notion pages in a SQLite
+    database (FTS5), so lookups are answered locally in milliseconds instead of
+    calling the Notion search API.
+
+    Every block with text (rich text, captions, code, equations, table cells,
+    child page titles...) is a row of the index with its page and block IDs.
+    Pages are indexed from block trees already fetched or built locally with
+    `index_page()`, or from Notion with `sync()`, which lists every page shared
+    with the integration and only fetches the pages whose `last_edited_time`
+    changed since they were indexed. Results are ranked with BM25 and include a
+    snippet with the matching terms.
+
+    Example
+    -------
+    >>> with SearchIndex("notion.db") as index:
+    ...     index.sync(notion)
+    ...     for result in index.search("release notes"):
+    ...         print(result.page_id, result.block_id, result.snippet)
+    $ python search_index.py notion.db --sync "release notes"
+   """
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, NamedTuple
+import sqlite3
+import threading
+
+from exporter import page_title, plain_text
+from pagination import fetch_tree, iterate_search
+from scheduler import RateLimiter, call_with_retry
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    page_id             TEXT PRIMARY KEY,
+    title               TEXT NOT NULL,
+    last_edited_time    TEXT
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    id                  INTEGER PRIMARY KEY,
+    page_id             TEXT NOT NULL,
+    block_id            TEXT NOT NULL,
+    block_type          TEXT NOT NULL,
+    text                TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_page ON blocks(page_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS blocks_fts USING fts5(
+    text, content = 'blocks', content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS blocks_insert AFTER INSERT ON blocks BEGIN
+    INSERT INTO blocks_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS blocks_delete AFTER DELETE ON blocks BEGIN
+    INSERT INTO blocks_fts(blocks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+class SearchResult(NamedTuple):
+    """
+    Block matching a query.
+    """
+    page_id     : str
+    block_id    : str       # Equal to `page_id` when the title matched
+    block_type  : str       # `title` when the title matched
+    title       : str       # Title of the page
+    snippet     : str       # Text around the matching terms, which are inside `[` and `]`
+    rank        : float     # BM25 score. Lower is better
+
+def block_text(
+    notion_block    : dict) -> str:
+    """
+    Searchable text of a block without its children.
+    """
+    block_type  = notion_block.get('type')
+    data        = notion_block.get(block_type) or {}
+    parts       = [plain_text(data.get(key) or []) for key in ('text', 'rich_text', 'caption')]
+    if block_type in ('child_page', 'child_database'):
+        parts.append(data.get('title', ""))
+    elif block_type == 'equation':
+        parts.append(data.get('expression', ""))
+    elif block_type == 'table_row':
+        parts.extend(plain_text(cell) for cell in data.get('cells', []))
+    elif block_type in ('bookmark', 'embed'):
+        parts.append(data.get('url') or (data.get('external') or {}).get('url') or "")
+    return " ".join(part for part in parts if part)
+
+def iter_block_texts(
+    notion_blocks   : list) -> Iterator[tuple]:
+    """
+    Iterate over the blocks of a tree (children inside `block[type]['children']`).
+
+    Returns
+    -------
+    Iterator of tuples `(block ID, block type, text)` of blocks with text.
+    """
+    stack = list(reversed(notion_blocks))
+    while stack:
+        block       = stack.pop()
+        block_type  = block.get('type')
+        text        = block_text(block)
+        if text:
+            yield block.get('id', ""), block_type, text
+        children = (block.get(block_type) or {}).get('children')
+        if children:
+            stack.extend(reversed(children))
+
+def _match_query(
+    query   : str) -> str:
+    """
+    FTS5 query matching every word of `query` (the last one as a prefix), so
+    user input never raises a syntax error.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+class SearchIndex():
+    """
+    Full-text index of Notion pages stored in a SQLite database.
+
+    Parameters
+    ----------
+    - `path`    : Path of the database file, or `:memory:`.
+    """
+
+    def __init__(
+        self,
+        path    : str   = "notion_index.db") -> None:
+        self.path           = path
+        self._connection    = sqlite3.connect(path, check_same_thread = False)
+        self._lock          = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, SCHEMA_VERSION):
+                raise ValueError(f"Index {path} has schema version {version}, expected {SCHEMA_VERSION}")
+            self._connection.executescript(_SCHEMA)
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __len__(self) -> int:
+        """
+        Number of indexed pages.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def last_edited_times(self) -> dict:
+        """
+        Dictionary `{page ID: last_edited_time}` of the indexed pages.
+        """
+        with self._lock:
+            return dict(self._connection.execute("SELECT page_id, last_edited_time FROM pages"))
+
+    def index_page(
+        self,
+        page_id             : str,
+        title               : str,
+        notion_blocks       : list,
+        last_edited_time    : str   = None) -> int:
+        """
+        Index (or index again) a page, replacing its previous blocks.
+
+        Parameters
+        ----------
+        - `page_id`             : ID of the page.
+        - `title`               : Title of the page.
+        - `notion_blocks`       : Blocks of the page with their children.
+        - `last_edited_time`    : `last_edited_time` of the page, used by `sync()`.
+
+        Returns
+        -------
+        Number of indexed blocks.
+        """
+        rows = [(page_id, page_id, 'title', title)] if title else []
+        rows.extend((page_id, block_id, block_type, text) for block_id, block_type, text in iter_block_texts(notion_blocks))
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM blocks WHERE page_id = ?", (page_id,))
+            self._connection.executemany("INSERT INTO blocks(page_id, block_id, block_type, text) VALUES (?, ?, ?, ?)", rows)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages(page_id, title, last_edited_time) VALUES (?, ?, ?)",
+                (page_id, title, last_edited_time)
+            )
+        return len(rows)
+
+    def remove_page(
+        self,
+        page_id : str) -> None:
+        """
+        Remove a page from the index.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM blocks WHERE page_id = ?", (page_id,))
+            self._connection.execute("DELETE FROM pages WHERE page_id = ?", (page_id,))
+
+    def search(
+        self,
+        query   : str,
+        limit   : int   = 20,
+        page_id : str   = None,
+        raw     : bool  = False) -> list:
+        """
+        Search blocks containing every word of a query.
+
+        Parameters
+        ----------
+        - `query`   : Words to search. The last word also matches as a prefix.
+        - `limit`   : Maximum number of results.
+        - `page_id` : Only search the blocks of this page, if given.
+        - `raw`     : Whether `query` uses the FTS5 query syntax (`OR`, `NEAR`,
+        `"phrases"`...) instead of plain words.
+
+        Returns
+        -------
+        List of `SearchResult`, best matches first.
+        """
+        match = query if raw else _match_query(query)
+        if not match:
+            return []
+        sql = """
+            SELECT blocks.page_id, blocks.block_id, blocks.block_type, pages.title,
+                   snippet(blocks_fts, 0, '[', ']', '…', 12), bm25(blocks_fts)
+            FROM blocks_fts
+            JOIN blocks ON blocks.id = blocks_fts.rowid
+            JOIN pages ON pages.page_id = blocks.page_id
+            WHERE blocks_fts MATCH ?
+        """
+        parameters = [match]
+        if page_id is not None:
+            sql += " AND blocks.page_id = ?"
+            parameters.append(page_id)
+        sql += " ORDER BY bm25(blocks_fts) LIMIT ?"
+        parameters.append(limit)
+        with self._lock:
+            return [SearchResult(*row) for row in self._connection.execute(sql, parameters)]
+
+    def sync(
+        self,
+        notion,
+        limiter     : RateLimiter   = None,
+        jobs        : int           = 3,
+        remove      : bool          = True) -> dict:
+        """
+        Update the index with the pages shared with the integration. Only pages
+        edited since they were indexed are fetched.
+
+        Parameters
+        ----------
+        - `notion`  : Notion client created with `Client(auth = NOTION_TOKEN)`.
+        - `limiter` : Shared rate limiter. A new `RateLimiter()` is used if `None`.
+        - `jobs`    : Number of pages and children fetched concurrently.
+        - `remove`  : Whether to remove pages that are no longer returned by Notion.
+
+        Returns
+        -------
+        Dictionary with the number of `indexed`, `unchanged`, `removed` and
+        `failed` pages.
+        """
+        limiter     = limiter if limiter is not None else RateLimiter()
+        indexed     = self.last_edited_times()
+        found       = set()
+        changed     = []
+        for page in iterate_search(notion, limiter = limiter, filter = {'property': 'object', 'value': 'page'}):
+            found.add(page['id'])
+            if page['id'] not in indexed or indexed[page['id']] != page.get('last_edited_time'):
+                changed.append(page)
+
+        counts = {'indexed': 0, 'unchanged': len(found) - len(changed), 'removed': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers = jobs, thread_name_prefix = "index-page") as pages_executor, \
+             ThreadPoolExecutor(max_workers = jobs, thread_name_prefix = "index-fetch") as fetch_executor:
+            futures = {
+                pages_executor.submit(fetch_tree, notion, page['id'], limiter, fetch_executor): page
+                for page in changed
+            }
+            for future in as_completed(futures):
+                page = futures[future]
+                try:
+                    notion_blocks = future.result()
+                except Exception as err:
+                    print(f"Error fetching page {page['id']}. See error for details:\n{err}")
+                    counts['failed'] += 1
+                    continue
+                self.index_page(page['id'], page_title(page), notion_blocks, page.get('last_edited_time'))
+                counts['indexed'] += 1
+
+        if remove:
+            for page_id in set(indexed) - found:
+                self.remove_page(page_id)
+                counts['removed'] += 1
+        return counts
+
+    def sync_page(
+        self,
+        notion,
+        page_id : str,
+        limiter : RateLimiter   = None) -> bool:
+        """
+        Index a single page again if it was edited since it was indexed.
+
+        Returns
+        -------
+        Whether the page was indexed.
+        """
+        page = call_with_retry(notion.pages.retrieve, page_id, endpoint_class = 'query', limiter = limiter)
+        if self.last_edited_times().get(page_id) == page.get('last_edited_time'):
+            return False
+        self.index_page(page_id, page_title(page), fetch_tree(notion, page_id, limiter), page.get('last_edited_time'))
+        return True
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(description = "Search a local full-text index of Notion pages.")
+    parser.add_argument("database", help = "Path of the index database")
+    parser.add_argument("query", nargs = '?', help = "Words to search")
+    parser.add_argument("--sync", action = 'store_true', help = "Update the index from Notion first")
+    parser.add_argument("--limit", type = int, default = 20, help = "Maximum number of results")
+    args = parser.parse_args()
+
+    with SearchIndex(args.database) as index:
+        if args.sync:
+            token = os.environ.get('NOTION_TOKEN')
+            if not token:
+                try:
+                    from secrets import NOTION_TOKEN as token
+                except ImportError:
+                    token = None
+            if not token:
+                print("Set the NOTION_TOKEN environment variable or add it to secrets.py")
+                sys.exit(1)
+            from notion_client import Client
+            counts = index.sync(Client(auth = token))
+            print(f"Indexed {counts['indexed']} pages, {counts['unchanged']} unchanged, {counts['removed']} removed, {counts['failed']} failed")
+
+        if args.query:
+            start   = time.perf_counter()
+            results = index.search(args.query, args.limit)
+            for result in results:
+                print(f"{result.title} ({result.page_id} / {result.block_id}): {result.snippet}")
+            print(f"{len(results)} results in {(time.perf_counter() - start) * 1e3:.1f} ms")
@@ -14,6 +14,9 @@
 
     Copy this file and rename it as `secrets.py`. Then include your own tokens  
     here. 
+
+    To run jobs of several workspaces from one process (see `client_pool.py`),  
+    add their tokens to `NOTION_TOKENS` and `DROPBOX_TOKENS` by workspace name.
    """
 
 #**********************
@@ -21,7 +24,17 @@
 #**********************
 NOTION_TOKEN = "secret_xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
 
+# Optional tokens of other workspaces
+NOTION_TOKENS = {
+    # "workspace": "secret_xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx",
+}
+
 #********************
 #* DROPBOX APP TOKEN
 #********************
-DROPBOX_TOKEN = "xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
\ No newline at end of file
+DROPBOX_TOKEN = "xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
+
+# Optional tokens of other workspaces
+DROPBOX_TOKENS = {
+    # "workspace": "xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx",
+}
\ No newline at end of file
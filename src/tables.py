@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Columnar table builder for Notion table blocks
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file builds Notion `table` and `table_row` blocks from columnar data
+    (lists, `array.array`, NumPy arrays) or from a streamed CSV reader. Number
+    formatting is resolved once per column and applied to the whole column.
+
+    Notion accepts up to 100 rows per request, so tables are returned as a
+    `table` block with the first rows plus an iterator of 100-row batches to
+    append to the created table. Rows are only built when their batch is
+    requested, which keeps memory bounded for very large tables.
+
+    Example
+    -------
+    >>> table = tables.from_columns(
+    ...     [names, scores],
+    ...     headers = ["Name", "Score"],
+    ...     formats = [None, ".2f"]
+    ... )
+    >>> tables.upload_table(notion, page_id, table)
+   """
+
+from itertools import islice
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+import blocks
+from helpers import add_annotations
+from scheduler import MAX_CHILDREN, RateLimiter, call_with_retry
+
+class Table(NamedTuple):
+    """
+    Table split in requests.
+
+    - `block`   : `table` Notion block with up to 100 rows, to append to a page.
+    - `batches` : Iterator of lists with up to 100 `table_row` blocks, to append
+    to the created table block.
+    """
+    block   : dict
+    batches : Iterator[list]
+
+#*********************
+#* COLUMN FORMATTING
+#*********************
+def column_formatter(
+    fmt) -> Callable[[Iterable], Iterator[str]]:
+    """
+    Resolve the formatting of a column once.
+
+    Parameters
+    ----------
+    - `fmt` : Either `None` (use `str()`), a format specification (e.g. `.2f`,
+    `,d`, `.1%`) or a callable converting a value to string.
+
+    Returns
+    -------
+    Function mapping an iterable of values to an iterator of strings.
+    """
+    if fmt is None:
+        function = str
+    elif callable(fmt):
+        function = fmt
+    else:
+        function = ('{:' + fmt + '}').format
+    return lambda values: map(function, values)
+
+def _as_sequence(
+    values) -> Iterable:
+    """
+    Convert NumPy arrays and `array.array` to lists of Python scalars in a
+    single call. Other iterables are returned as they are.
+    """
+    tolist = getattr(values, 'tolist', None)
+    return tolist() if tolist is not None else values
+
+def _cell_factory(
+    annotations : dict) -> Callable[[str], list]:
+    """
+    Create the function that converts a string into a table cell. The annotations
+    dictionary is built once and shared by every cell of the column, so treat
+    the cells as read-only.
+    """
+    annotations = add_annotations(**annotations) if annotations else add_annotations()
+
+    def cell(content : str) -> list:
+        return [{
+            "type": "text",
+            "text": {
+                "content": content,
+                "link": None
+            },
+            "annotations": annotations,
+            "plain_text": content,
+            "href": None
+        }]
+    return cell
+
+def _rows(
+    columns     : list,
+    formats     : list,
+    annotations : list) -> Iterator[dict]:
+    """
+    Build `table_row` blocks from columns of values, formatting every column
+    as a whole.
+    """
+    width   = len(columns)
+    formats = formats or [None] * width
+    styles  = annotations or [None] * width
+
+    formatted = [
+        map(_cell_factory(style), column_formatter(fmt)(_as_sequence(column)))
+        for column, fmt, style in zip(columns, formats, styles)
+    ]
+    for cells in zip(*formatted):
+        yield {
+            "object": "block",
+            "type": "table_row",
+            "table_row": {
+                "cells": list(cells)
+            }
+        }
+
+def _batched(
+    iterable    : Iterable,
+    size        : int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def _table(
+    rows                : Iterator[dict],
+    table_width         : int,
+    has_column_header   : bool,
+    has_row_header      : bool) -> Table:
+    """
+    Split rows into the `table` block (first 100 rows) and the remaining batches.
+    """
+    batches = _batched(rows, MAX_CHILDREN)
+    first   = next(batches, [])
+    return Table(
+        blocks.table(
+            table_width         = table_width,
+            rows                = first,
+            has_column_header   = has_column_header,
+            has_row_header      = has_row_header
+        ),
+        batches
+    )
+
+#*****************
+#* TABLE BUILDERS
+#*****************
+def from_columns(
+    columns         : list,
+    headers         : list  = None,
+    formats         : list  = None,
+    annotations     : list  = None,
+    has_row_header  : bool  = False) -> Table:
+    """
+    Create a Notion table from columns of values.
+
+    Parameters
+    ----------
+    - `columns`         : List of columns. Each column is a list, `array.array`,
+    NumPy array or any iterable of values. All columns should have the same length.
+    - `headers`         : Names of the columns. If given, they are added as the header row.
+    - `formats`         : Format of every column (see `column_formatter()`), or `None`.
+    - `annotations`     : Annotations of every column (keyword arguments of
+    `helpers.add_annotations()`), or `None`.
+    - `has_row_header`  : Whether the first column is the header of every row.
+
+    Returns
+    -------
+    A `Table` with the `table` block and the batches of remaining rows.
+    """
+    rows = _rows(columns, formats, annotations)
+    if headers is not None:
+        rows = _prepend(blocks.table_row(list(headers)), rows)
+    return _table(rows, len(columns), headers is not None, has_row_header)
+
+def from_csv(
+    reader          : Iterable[list],
+    header          : bool  = True,
+    formats         : list  = None,
+    converters      : list  = None,
+    annotations     : list  = None,
+    has_row_header  : bool  = False) -> Table:
+    """
+    Create a Notion table from a streamed CSV reader (or any iterable of rows).
+    Rows are read and formatted 100 at a time, column by column.
+
+    Parameters
+    ----------
+    - `reader`          : Iterable of rows, e.g. `csv.reader(open("data.csv"))`.
+    - `header`          : Whether the first row contains the names of the columns.
+    - `formats`         : Format of every column (see `column_formatter()`), or `None`.
+    - `converters`      : Function to convert the raw string of every column before
+    formatting (e.g. `float`), or `None` to keep the string.
+    - `annotations`     : Annotations of every column (keyword arguments of
+    `helpers.add_annotations()`), or `None`.
+    - `has_row_header`  : Whether the first column is the header of every row.
+
+    Returns
+    -------
+    A `Table` with the `table` block and the batches of remaining rows.
+    """
+    reader  = iter(reader)
+    first   = next(reader, None)
+    if first is None:
+        print("The CSV reader does not contain any row")
+        return None
+    width   = len(first)
+
+    def stream_rows():
+        rows = reader if header else _prepend(first, reader)
+        for chunk in _batched(rows, MAX_CHILDREN):
+            columns = [list(column) for column in zip(*chunk)]
+            if converters:
+                columns = [
+                    list(map(convert, column)) if convert is not None else column
+                    for column, convert in zip(columns, converters)
+                ]
+            yield from _rows(columns, formats, annotations)
+
+    rows = stream_rows()
+    if header:
+        rows = _prepend(blocks.table_row(list(first)), rows)
+    return _table(rows, width, header, has_row_header)
+
+def _prepend(
+    first,
+    rest    : Iterable) -> Iterator:
+    yield first
+    yield from rest
+
+def upload_table(
+    notion,
+    parent_id   : str,
+    table       : Table,
+    limiter     : RateLimiter = None) -> str:
+    """
+    Append a table to a page or block and then its remaining rows in batches
+    of 100, retrying throttled and server errors.
+
+    Parameters
+    ----------
+    - `notion`      : Notion client created with `Client(auth = NOTION_TOKEN)`.
+    - `parent_id`   : ID of the page or block.
+    - `table`       : Table created with `from_columns()` or `from_csv()`.
+    - `limiter`     : Rate limiter shared with other requests, if any.
+
+    Returns
+    -------
+    ID of the created table block.
+    """
+    response = call_with_retry(
+        notion.blocks.children.append, parent_id,
+        children        = [table.block],
+        endpoint_class  = 'append',
+        limiter         = limiter
+    )
+    table_id = response['results'][0]['id']
+    for rows in table.batches:
+        call_with_retry(
+            notion.blocks.children.append, table_id,
+            children        = rows,
+            endpoint_class  = 'append',
+            limiter         = limiter
+        )
+    return table_id
+
+
+if __name__ == "__main__":
+    #**************************************
+    #* BENCHMARK TABLE BUILDING (100k ROWS)
+    #**************************************
+    import random
+    import time
+
+    n_rows  = 100_000
+    columns = [
+        [f"item-{i}" for i in range(n_rows)],
+        [random.random() * 1000 for _ in range(n_rows)],
+        [random.randint(0, 10**6) for _ in range(n_rows)],
+        [random.random() for _ in range(n_rows)],
+    ]
+
+    start   = time.perf_counter()
+    table   = from_columns(columns, headers = ["Name", "Value", "Count", "Ratio"], formats = [None, ".2f", ",d", ".1%"])
+    n_built = len(table.block['table']['children']) + sum(len(rows) for rows in table.batches)
+    elapsed = time.perf_counter() - start
+    print(f"Built {n_built} table rows in {elapsed:.3f}s ({n_built / elapsed:,.0f} rows/s)")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Precompiled Notion block templates
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file compiles a tree of Notion blocks containing `{{name}}` placeholders
+    once, recording the path to every slot. Rendering the template with a dict
+    of values only copies the dictionaries and lists on the path to a slot. Every
+    other part of the tree is shared between all rendered copies, so rendered
+    blocks should be treated as read-only.
+
+    A string that is exactly a placeholder (e.g. `"{{checked}}"`) is replaced by
+    the value itself, which can be of any type. Placeholders inside longer
+    strings are replaced by the value converted to string.
+
+    Example
+    -------
+    >>> template = compile_template([
+    ...     blocks.heading(1, "Report for {{name}}"),
+    ...     blocks.to_do(False, "Review {{count}} items")
+    ... ])
+    >>> notion_blocks = template.render({"name": "Alice", "count": 3})
+   """
+
+import re
+
+_placeholder = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+
+# Lists longer than this are copied and patched instead of written as a literal
+_MAX_LITERAL_LIST = 64
+
+class BlockTemplate():
+    """
+    Compiled Notion block tree. Create it with `compile_template()`.
+
+    The tree is compiled into a Python function whose body is a single expression
+    that rebuilds only the dictionaries and lists on the path to a placeholder,
+    referencing every untouched subtree of the original tree.
+
+    Attributes
+    ----------
+    - `tree`    : The compiled tree (blocks with placeholders).
+    - `slots`   : Frozenset with the names of all placeholders.
+    - `source`  : Source code of the generated render function.
+    """
+
+    def __init__(
+        self,
+        tree) -> None:
+        self.tree       = tree
+        self._constants = []
+        names           = set()
+        expression      = self._emit(tree, names)
+        self.slots      = frozenset(names)
+        self.source     = f"def render(v):\n    return {expression}\n"
+
+        namespace = {'c': self._constants, '_patch': _patch}
+        exec(compile(self.source, "<notion block template>", "exec"), namespace)
+        self._render = namespace['render']
+
+    def _constant(self, value) -> str:
+        self._constants.append(value)
+        return f"c[{len(self._constants) - 1}]"
+
+    def _emit(self, node, names : set) -> str:
+        """
+        Return the expression that renders `node`. Nodes without placeholders are
+        referenced as constants.
+        """
+        if isinstance(node, str):
+            parts = _placeholder.split(node)
+            if len(parts) == 1:
+                return None
+            names.update(parts[1::2])
+            # Exact placeholder: keep the type of the value
+            if len(parts) == 3 and not parts[0] and not parts[2]:
+                return f"v[{parts[1]!r}]"
+            pieces = [
+                repr(part) if index % 2 == 0 else f"str(v[{part!r}])"
+                for index, part in enumerate(parts) if index % 2 == 1 or part
+            ]
+            return "(" + " + ".join(pieces) + ")"
+
+        if isinstance(node, dict):
+            changed = {}
+            for key, child in node.items():
+                expression = self._emit(child, names)
+                if expression is not None:
+                    changed[key] = expression
+            if not changed:
+                return None
+            items = ", ".join(
+                f"{repr(key) if isinstance(key, str) else self._constant(key)}: {expression}"
+                for key, expression in changed.items()
+            )
+            return f"{{**{self._constant(node)}, {items}}}"
+
+        if isinstance(node, list):
+            changed = {}
+            for index, child in enumerate(node):
+                expression = self._emit(child, names)
+                if expression is not None:
+                    changed[index] = expression
+            if not changed:
+                return None
+            reference = self._constant(node)
+            if len(node) <= _MAX_LITERAL_LIST:
+                items = ", ".join(changed.get(index, f"{reference}[{index}]") for index in range(len(node)))
+                return f"[{items}]"
+            items = ", ".join(f"({index}, {expression})" for index, expression in changed.items())
+            return f"_patch({reference}, ({items},))"
+
+        return None
+
+    def render(
+        self,
+        values  : dict):
+        """
+        Create a copy of the tree with every placeholder replaced.
+
+        Parameters
+        ----------
+        - `values`  : Dictionary with the placeholder names as keys.
+
+        Returns
+        -------
+        Tree with the same structure as the compiled one. Only the parts on the
+        path to a placeholder are new objects.
+        """
+        try:
+            return self._render(values)
+        except KeyError:
+            missing = self.slots.difference(values)
+            raise KeyError(f"Missing values for template placeholders: {sorted(missing)}") from None
+
+    def __call__(self, **values):
+        return self.render(values)
+
+def _patch(
+    node    : list,
+    changes : tuple) -> list:
+    """
+    Copy a long list replacing only some of its items.
+    """
+    node = node.copy()
+    for index, value in changes:
+        node[index] = value
+    return node
+
+def compile_template(
+    tree) -> BlockTemplate:
+    """
+    Compile a Notion block, a list of blocks or a payload (e.g. created with
+    `blocks.append_blocks()` or `pages.page()`) with `{{name}}` placeholders.
+
+    Parameters
+    ----------
+    - `tree`    : Notion block tree with placeholders in any string.
+
+    Returns
+    -------
+    A `BlockTemplate` to render with different values.
+    """
+    if isinstance(tree, str) or not isinstance(tree, (dict, list)):
+        print(f"Templates must be a Notion block, a list of blocks or a payload. Provided {type(tree).__name__}")
+        return None
+    return BlockTemplate(tree)
+
+
+if __name__ == "__main__":
+    #*************************************************
+    #* BENCHMARK TEMPLATE RENDERING AGAINST BUILDERS
+    #*************************************************
+    import timeit
+
+    import blocks
+    from helpers import add_annotations
+
+    def build(name, count, checked, snippet):
+        block_callout = blocks.callout(
+            icon_type   = 'emoji',
+            icon_str    = "📊",
+            content     = f"{count} new items for {name}",
+            annotations = add_annotations(bold = True)
+        )
+        return [
+            blocks.heading(1, f"Report for {name}"),
+            block_callout,
+            blocks.to_do(checked, f"Review {count} items"),
+            blocks.to_do(False, "Archive last report"),
+            blocks.paragraph("This page is generated automatically.", annotations = add_annotations(italic = True)),
+            blocks.code('python', snippet),
+            blocks.divider()
+        ]
+
+    template = compile_template(build("{{name}}", "{{count}}", "{{checked}}", "{{snippet}}"))
+    values   = {"name": "Alice", "count": 3, "checked": True, "snippet": "print('hello')"}
+    assert template.render(values) == build("Alice", 3, True, "print('hello')")
+
+    number      = 20000
+    builders    = timeit.timeit(lambda: build("Alice", 3, True, "print('hello')"), number = number)
+    rendering   = timeit.timeit(lambda: template.render(values), number = number)
+    print(f"Builders : {builders / number * 1e6:.2f} us per page")
+    print(f"Template : {rendering / number * 1e6:.2f} us per page ({builders / rendering:.1f}x faster)")
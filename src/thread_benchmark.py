@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Multithreaded stress check and scaling benchmark of the block builders
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file builds the same pages from many threads at once, sharing the
+    same annotations between all of them, and checks that every block is equal
+    to the one built by a single thread and that no dictionary is shared between
+    two blocks. It then measures how block construction scales with the number
+    of threads.
+
+    Builders only scale with threads on a free-threaded interpreter (e.g.
+    `python3.13t`). With the GIL, the benchmark shows the cost of switching
+    between threads instead.
+
+    Example
+    -------
+    $ python3.13t thread_benchmark.py
+   """
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import threading
+import time
+
+import blocks
+from helpers import add_annotations
+
+# Annotations shared by every thread
+SHARED_ANNOTATIONS = add_annotations(bold = True, color = 'blue')
+
+def build_page(
+    number  : int) -> list:
+    """
+    Build a page of Notion blocks with most of the builders.
+    """
+    block_toggle = blocks.toggle(f"Details {number}", annotations = SHARED_ANNOTATIONS)
+    for line in range(5):
+        blocks.add_children(block_toggle, blocks.bulleted_list_item(f"Item {line} of page {number}"))
+
+    return [
+        blocks.heading(1, f"Page {number}", annotations = SHARED_ANNOTATIONS),
+        blocks.paragraph(f"Paragraph of page {number}"),
+        blocks.to_do(number % 2 == 0, f"Task {number}"),
+        blocks.callout(icon_type = 'emoji', icon_str = "💡", content = f"Callout {number}"),
+        blocks.quote(f"Quote {number}", annotations = SHARED_ANNOTATIONS),
+        blocks.numbered_list_item(f"Number {number}"),
+        blocks.code('python', f"print({number})"),
+        blocks.equation(f"x^{number}"),
+        blocks.divider(),
+        block_toggle
+    ]
+
+def _containers(
+    value,
+    found   : list) -> None:
+    """
+    Add the ID of every dictionary and list inside `value` to `found`.
+    """
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            found.append(id(item))
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            found.append(id(item))
+            stack.extend(item)
+
+def stress(
+    threads     : int   = 8,
+    pages       : int   = 2000) -> bool:
+    """
+    Build `pages` pages split between `threads` threads started at the same time.
+
+    Returns
+    -------
+    `True` if every page is equal to the page built by a single thread and no
+    dictionary or list is shared between pages.
+    """
+    expected        = [build_page(number) for number in range(pages)]
+    annotations     = dict(SHARED_ANNOTATIONS)
+    barrier         = threading.Barrier(threads)
+
+    def work(first : int) -> list:
+        barrier.wait()
+        return [(number, build_page(number)) for number in range(first, pages, threads)]
+
+    with ThreadPoolExecutor(max_workers = threads) as executor:
+        results = [page for chunk in executor.map(work, range(threads)) for page in chunk]
+
+    correct = all(page == expected[number] for number, page in results)
+    found   = []
+    for _, page in results:
+        _containers(page, found)
+    unique  = len(found) == len(set(found))
+
+    print(f"Pages equal to single-threaded build : {correct}")
+    print(f"No dictionaries shared between pages : {unique}")
+    print(f"Shared annotations unchanged         : {annotations == SHARED_ANNOTATIONS}")
+    return correct and unique and annotations == SHARED_ANNOTATIONS
+
+def scaling(
+    pages           : int   = 20000,
+    max_threads     : int   = None) -> dict:
+    """
+    Measure pages built per second with 1, 2, 4... threads.
+
+    Returns
+    -------
+    Dictionary `{threads: pages per second}`.
+    """
+    max_threads = max_threads if max_threads is not None else min(os.cpu_count() or 1, 16)
+    counts      = [1]
+    while counts[-1] * 2 <= max_threads:
+        counts.append(counts[-1] * 2)
+
+    results = {}
+    for threads in counts:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers = threads) as executor:
+            for _ in executor.map(lambda first: [build_page(number) for number in range(first, pages, threads)], range(threads)):
+                pass
+        results[threads] = pages / (time.perf_counter() - start)
+        print(f"{threads:>3} threads : {results[threads]:>10.0f} pages/s ({results[threads] / results[1]:.2f}x)")
+    return results
+
+
+if __name__ == "__main__":
+    gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil_enabled else 'disabled'}, {os.cpu_count()} CPUs\n")
+    if not stress():
+        sys.exit(1)
+    print()
+    scaling()
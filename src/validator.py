@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Schema validation of Notion block trees before sending them
+
+    -------------------------------------------------------------------------
+    AUTHOR
+
+    Name:       Alberto Martín Pérez
+    Contact:    alberto.martinperez@protonmail.com
+
+    ------------------------------------------------------------------------
+    SUMMARY
+
+    This file checks blocks created with `blocks.py` (or by hand) against a
+    schema per block type before appending them, so mistakes such as an
+    unsupported `code` language, a `None` icon or children in a block type that
+    does not support them are found locally instead of spending an API call.
+
+    The schema is compiled once into frozensets and field checkers. Trees are
+    walked with an explicit stack (no recursion limit) and every error is
+    reported with its path, e.g. `[3].toggle.children[0].code.language`.
+
+    Example
+    -------
+    >>> errors = validate(notion_blocks)
+    >>> for error in errors:
+    ...     print(error)
+   """
+
+from typing import NamedTuple
+
+from blocks import SUPPORTED_LANGUAGES, SUPPORT_CHILDREN
+from helpers import MAX_RICH_TEXT_ITEMS, MAX_TEXT_LENGTH, text_length
+
+# Colors accepted by annotations and blocks
+COLORS = frozenset([
+    'default', 'gray', 'brown', 'orange', 'yellow', 'green', 'blue', 'purple', 'pink', 'red',
+    'gray_background', 'brown_background', 'orange_background', 'yellow_background',
+    'green_background', 'blue_background', 'purple_background', 'pink_background', 'red_background'
+])
+
+# Keys allowed next to the block type object
+BLOCK_KEYS = frozenset([
+    'object', 'id', 'type', 'parent', 'created_time', 'last_edited_time', 'created_by',
+    'last_edited_by', 'has_children', 'archived'
+])
+
+ANNOTATION_KEYS = frozenset(['bold', 'italic', 'strikethrough', 'underline', 'code', 'color'])
+RICH_TEXT_TYPES = frozenset(['text', 'mention', 'equation'])
+
+_text_block         = {'required': {'text': 'rich_text'}, 'optional': {'children': 'children', 'color': 'color'}}
+_heading_block      = {'required': {'text': 'rich_text'}, 'optional': {'color': 'color'}}
+_media_block        = {'required': {'type': 'media_type'}, 'optional': {'external': 'external', 'file': 'dict', 'caption': 'rich_text'}}
+
+# Schema per block type: required and optional fields of the block type object
+BLOCK_SCHEMA = {
+    'paragraph'             : _text_block,
+    'quote'                 : _text_block,
+    'bulleted_list_item'    : _text_block,
+    'numbered_list_item'    : _text_block,
+    'toggle'                : _text_block,
+    'template'              : _text_block,
+    'heading_1'             : _heading_block,
+    'heading_2'             : _heading_block,
+    'heading_3'             : _heading_block,
+    'to_do'                 : {'required': {'text': 'rich_text', 'checked': 'bool'}, 'optional': {'children': 'children', 'color': 'color'}},
+    'callout'               : {'required': {'text': 'rich_text'}, 'optional': {'icon': 'icon', 'children': 'children', 'color': 'color'}},
+    'code'                  : {'required': {'text': 'rich_text', 'language': 'language'}, 'optional': {'caption': 'rich_text'}},
+    'child_page'            : {'required': {'title': 'str'}, 'optional': {'children': 'children'}},
+    'child_database'        : {'required': {'title': 'str'}, 'optional': {'children': 'children'}},
+    'embed'                 : {'required': {'url': 'str'}, 'optional': {'caption': 'rich_text'}},
+    'link_preview'          : {'required': {'url': 'str'}, 'optional': {}},
+    'image'                 : _media_block,
+    'video'                 : _media_block,
+    'pdf'                   : _media_block,
+    # `blocks.file()` and `blocks.bookmark()` also add a `text` array
+    'file'                  : {'required': {'type': 'media_type'}, 'optional': {'external': 'external', 'file': 'dict', 'caption': 'rich_text', 'text': 'rich_text'}},
+    'bookmark'              : {'required': {}, 'optional': {'url': 'str', 'type': 'media_type', 'external': 'external', 'caption': 'rich_text', 'text': 'rich_text'}},
+    'equation'              : {'required': {'expression': 'str'}, 'optional': {}},
+    'divider'               : {'required': {}, 'optional': {}},
+    'table_of_contents'     : {'required': {}, 'optional': {'color': 'color'}},
+    'breadcrumb'            : {'required': {}, 'optional': {}},
+    'column_list'           : {'required': {}, 'optional': {'children': 'children'}},
+    'column'                : {'required': {}, 'optional': {'children': 'children'}},
+    'link_to_page'          : {'required': {'type': 'str'}, 'optional': {'page_id': 'str', 'database_id': 'str'}},
+    'synced_block'          : {'required': {'synced_from': 'synced_from'}, 'optional': {'children': 'children'}},
+    'table'                 : {'required': {'table_width': 'int', 'children': 'children'}, 'optional': {'has_column_header': 'bool', 'has_row_header': 'bool'}},
+    'table_row'             : {'required': {'cells': 'cells'}, 'optional': {}},
+}
+
+class ValidationError(NamedTuple):
+    """
+    Error found in a block tree.
+
+    - `path`    : Location of the error, e.g. `[3].toggle.children[0].code.language`.
+    - `message` : Description of the error.
+    """
+    path    : str
+    message : str
+
+    def __str__(self) -> str:
+        return f"{self.path}: {self.message}"
+
+class _CompiledType(NamedTuple):
+    required    : frozenset     # Required fields
+    checkers    : dict          # Field -> checker for every allowed field
+    allowed     : frozenset     # Allowed fields of the block type object
+    block_keys  : frozenset     # Allowed keys of the block itself
+    children    : bool          # Whether the block type supports children
+
+#*******************
+#* FIELD CHECKERS
+#*******************
+# Every checker returns `None` if the value is valid, an error message, or a
+# list of `(path suffix, message)` pairs for values with many items (rich text).
+def _check_str(value):
+    if not isinstance(value, str):
+        return f"expected a string, got {type(value).__name__}"
+
+def _check_bool(value):
+    if value is not True and value is not False:
+        return f"expected a boolean, got {type(value).__name__}"
+
+def _check_int(value):
+    if type(value) is not int or value < 1:
+        return f"expected a positive integer, got {value!r}"
+
+def _check_dict(value):
+    if not isinstance(value, dict):
+        return f"expected an object, got {type(value).__name__}"
+
+def _check_color(value):
+    if value not in COLORS:
+        return f"unsupported color {value!r}"
+
+def _check_language(value):
+    if value not in SUPPORTED_LANGUAGES:
+        return f"unsupported code language {value!r}"
+
+def _check_media_type(value):
+    if value not in ('external', 'file'):
+        return f"expected 'external' or 'file', got {value!r}"
+
+def _check_external(value):
+    if not isinstance(value, dict) or not isinstance(value.get('url'), str):
+        return "external object must contain a 'url' string"
+
+def _check_icon(value):
+    if value is None:
+        return "icon is None (was add_icon() called with an unsupported icon_type?)"
+    if not isinstance(value, dict):
+        return f"expected an icon object, got {type(value).__name__}"
+    icon_type = value.get('type')
+    if icon_type == 'emoji':
+        if not isinstance(value.get('emoji'), str):
+            return "emoji icon must contain an 'emoji' string"
+    elif icon_type == 'external':
+        return _check_external(value.get('external'))
+    elif icon_type != 'file':
+        return f"unsupported icon type {icon_type!r}"
+
+def _check_synced_from(value):
+    if value is not None and (not isinstance(value, dict) or not isinstance(value.get('block_id'), str)):
+        return "synced_from must be None or contain a 'block_id' string"
+
+def _check_children(value):
+    if type(value) is not list:
+        return f"expected a list of blocks, got {type(value).__name__}"
+
+def _check_rich_text(value):
+    if type(value) is not list:
+        return f"expected a list of rich text objects, got {type(value).__name__}"
+    if len(value) > MAX_RICH_TEXT_ITEMS:
+        return f"{len(value)} rich text objects (maximum {MAX_RICH_TEXT_ITEMS})"
+    problems = None
+    for index, item in enumerate(value):
+        message = _rich_text_error(item)
+        if message is not None:
+            problems = problems or []
+            problems.append((f"[{index}]", message))
+    return problems
+
+def _check_cells(value):
+    if type(value) is not list:
+        return f"expected a list of cells, got {type(value).__name__}"
+    problems = None
+    for cell_index, cell in enumerate(value):
+        cell_problems = _check_rich_text(cell)
+        if cell_problems is None:
+            continue
+        problems = problems or []
+        if type(cell_problems) is str:
+            problems.append((f"[{cell_index}]", cell_problems))
+        else:
+            problems.extend((f"[{cell_index}]{suffix}", message) for suffix, message in cell_problems)
+    return problems
+
+def _rich_text_error(item) -> str:
+    """
+    Check a single rich text object.
+    """
+    if type(item) is not dict:
+        return f"expected a rich text object, got {type(item).__name__}"
+    item_type = item.get('type', 'text')
+    if item_type == 'text':
+        text = item.get('text')
+        if type(text) is not dict or type(text.get('content')) is not str:
+            return "text object must contain a 'content' string"
+        if len(text['content']) * 2 > MAX_TEXT_LENGTH and text_length(text['content']) > MAX_TEXT_LENGTH:
+            return f"text content has {text_length(text['content'])} characters (maximum {MAX_TEXT_LENGTH})"
+        link = text.get('link')
+        if link is not None and (type(link) is not dict or type(link.get('url')) is not str):
+            return "text link must be None or contain a 'url' string"
+    elif item_type not in RICH_TEXT_TYPES:
+        return f"unsupported rich text type {item_type!r}"
+    annotations = item.get('annotations')
+    if annotations is not None:
+        if type(annotations) is not dict:
+            return "annotations must be an object"
+        if not annotations.keys() <= ANNOTATION_KEYS:
+            return f"unknown annotations {sorted(annotations.keys() - ANNOTATION_KEYS)}"
+        if annotations.get('color', 'default') not in COLORS:
+            return f"unsupported color {annotations['color']!r}"
+    return None
+
+_CHECKERS = {
+    'str'           : _check_str,
+    'bool'          : _check_bool,
+    'int'           : _check_int,
+    'dict'          : _check_dict,
+    'color'         : _check_color,
+    'language'      : _check_language,
+    'media_type'    : _check_media_type,
+    'external'      : _check_external,
+    'icon'          : _check_icon,
+    'synced_from'   : _check_synced_from,
+    'children'      : _check_children,
+    'rich_text'     : _check_rich_text,
+    'cells'         : _check_cells,
+}
+
+def compile_schema(
+    schema  : dict = BLOCK_SCHEMA) -> dict:
+    """
+    Compile a block schema into frozensets and field checkers.
+
+    Parameters
+    ----------
+    - `schema`  : Dictionary with the block type as key and a dictionary with
+    `required` and `optional` fields (field name -> kind) as value.
+
+    Returns
+    -------
+    Dictionary with the compiled schema of every block type.
+    """
+    compiled = {}
+    for block_type, fields in schema.items():
+        checkers = {
+            field: _CHECKERS[kind]
+            for field, kind in {**fields['optional'], **fields['required']}.items()
+        }
+        compiled[block_type] = _CompiledType(
+            required    = frozenset(fields['required']),
+            checkers    = checkers,
+            allowed     = frozenset(checkers),
+            block_keys  = BLOCK_KEYS | {block_type},
+            children    = 'children' in checkers and block_type in SUPPORT_CHILDREN
+        )
+    return compiled
+
+_COMPILED_SCHEMA = compile_schema()
+
+#*************
+#* VALIDATION
+#*************
+def validate(
+    tree,
+    schema      : dict  = None,
+    max_errors  : int   = None) -> list:
+    """
+    Validate a Notion block, a list of blocks or a children payload
+    (created with `blocks.append_blocks()`).
+
+    Parameters
+    ----------
+    - `tree`        : Block tree to validate.
+    - `schema`      : Schema compiled with `compile_schema()`. Defaults to `BLOCK_SCHEMA`.
+    - `max_errors`  : Stop after this number of errors, or `None` to report all.
+
+    Returns
+    -------
+    List of `ValidationError`. Empty if the tree is valid.
+    """
+    schema  = schema if schema is not None else _COMPILED_SCHEMA
+    errors  = []
+
+    if isinstance(tree, dict) and 'children' in tree and 'type' not in tree:
+        stack = [("children", tree['children'])]
+    elif isinstance(tree, list):
+        stack = [("", tree)]
+    else:
+        stack = [("", [tree])]
+
+    # Every stack entry is a list of sibling blocks with the path of the list.
+    # Paths are only built when an error is found or a block has children.
+    while stack:
+        list_path, siblings = stack.pop()
+        if not isinstance(siblings, list):
+            errors.append(ValidationError(list_path or "<root>", f"expected a list of blocks, got {type(siblings).__name__}"))
+            continue
+
+        for index, block in enumerate(siblings):
+            if max_errors is not None and len(errors) >= max_errors:
+                return errors[:max_errors]
+
+            if type(block) is not dict:
+                errors.append(ValidationError(f"{list_path}[{index}]", f"expected a block object, got {type(block).__name__}"))
+                continue
+            block_type  = block.get('type')
+            compiled    = schema.get(block_type)
+            if compiled is None:
+                errors.append(ValidationError(f"{list_path}[{index}]", f"unsupported block type {block_type!r}"))
+                continue
+            content = block.get(block_type)
+            if type(content) is not dict:
+                errors.append(ValidationError(f"{list_path}[{index}].{block_type}", f"missing {block_type!r} object"))
+                continue
+
+            keys = content.keys()
+            if not block.keys() <= compiled.block_keys:
+                unknown = sorted(block.keys() - compiled.block_keys)
+                errors.append(ValidationError(f"{list_path}[{index}]", f"unexpected keys {unknown}"))
+            if not keys >= compiled.required:
+                for field in sorted(compiled.required - keys):
+                    errors.append(ValidationError(f"{list_path}[{index}].{block_type}", f"missing required field {field!r}"))
+
+            checkers = compiled.checkers
+            for field, value in content.items():
+                checker = checkers.get(field)
+                if checker is None:
+                    if field == 'children':
+                        errors.append(ValidationError(f"{list_path}[{index}].{block_type}.children", f"{block_type} blocks do not support children"))
+                    else:
+                        errors.append(ValidationError(f"{list_path}[{index}].{block_type}.{field}", f"unexpected field for {block_type} blocks"))
+                    continue
+                problems = checker(value)
+                if problems is None:
+                    continue
+                if type(problems) is str:
+                    errors.append(ValidationError(f"{list_path}[{index}].{block_type}.{field}", problems))
+                else:
+                    errors.extend(
+                        ValidationError(f"{list_path}[{index}].{block_type}.{field}{suffix}", message)
+                        for suffix, message in problems
+                    )
+
+            children = content.get('children')
+            if children and compiled.children and type(children) is list:
+                content_path = f"{list_path}[{index}].{block_type}"
+                if block_type == 'table':
+                    _check_table(content, content_path, errors)
+                stack.append((f"{content_path}.children", children))
+
+    return errors if max_errors is None else errors[:max_errors]
+
+def _check_table(
+    content : dict,
+    path    : str,
+    errors  : list) -> None:
+    """
+    Check that table children are rows with `table_width` cells.
+    """
+    width = content.get('table_width')
+    for index, row in enumerate(content['children']):
+        if not isinstance(row, dict) or row.get('type') != 'table_row':
+            errors.append(ValidationError(f"{path}.children[{index}]", "table children must be table_row blocks"))
+            continue
+        cells = row.get('table_row', {}).get('cells')
+        if isinstance(cells, list) and len(cells) != width:
+            errors.append(ValidationError(f"{path}.children[{index}].table_row.cells", f"expected {width} cells, got {len(cells)}"))
+
+def check(
+    tree) -> bool:
+    """
+    Validate a block tree and print every error found.
+
+    Parameters
+    ----------
+    - `tree`: Block, list of blocks or children payload.
+
+    Returns
+    -------
+    `True` if the tree is valid.
+    """
+    errors = validate(tree)
+    for error in errors:
+        print(f"Invalid Notion block at {error}")
+    return not errors